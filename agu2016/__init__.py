@@ -0,0 +1,9 @@
+"""Shared helpers for the Dakotathon experiments with Hydrotrend.
+
+The study scripts in each experiment directory describe an experiment
+as a dict of Dakota and Hydrotrend parameters; the modules in this
+package configure, run and post-process those experiments. Modules
+that run experiments require PyMT and Dakotathon; modules that only
+read results require NumPy.
+
+"""
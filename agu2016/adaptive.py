@@ -0,0 +1,275 @@
+"""Sample an experiment until its statistics converge.
+
+A sampling study with a fixed number of samples may run far more
+evaluations than are needed for its statistics to settle, or too few.
+An adaptive run starts from a small Latin hypercube design and doubles
+it in batches until the statistics of a response meet a tolerance:
+
+ci_width
+  The width of the 95% confidence interval of the mean, relative to
+  the mean.
+exceedance_tolerance
+  The half-width of the 95% confidence interval of the probability
+  that the response exceeds its first response level.
+
+Each batch keeps the design a Latin hypercube: every stratum of the
+current design is split in two, one half already holds a sample, and
+the new samples fill the other halves (Tong, 2006). The batches are
+run through a batch scheduler (see `agu2016.batch`), and when the
+statistics converge, or the sample limit is reached, Dakota computes
+the statistics of all the samples with ``-post_run``, as for a batch
+run of the fixed design.
+
+"""
+import os
+
+import numpy as np
+
+from .batch import make_jobs, collect_results, post_run
+from .dakota_input import get_keyword_values, set_keyword_values
+from .statistics import exceedance, t_interval, wilson_interval
+from .tabular import write_tabular_file
+
+
+def latin_hypercube(n, dimensions, rng):
+    """Draw a Latin hypercube design on the unit hypercube.
+
+    Parameters
+    ----------
+    n : int
+      The number of samples.
+    dimensions : int
+      The number of variables.
+    rng : RandomState
+      The random number generator.
+
+    Returns
+    -------
+    ndarray
+      The samples, with shape ``(n, dimensions)``.
+
+    """
+    strata = np.array([rng.permutation(n) for _ in range(dimensions)]).T
+    return (strata + rng.uniform(size=(n, dimensions))) / n
+
+
+def extend_latin_hypercube(design, rng):
+    """Double a Latin hypercube design, keeping its samples.
+
+    Parameters
+    ----------
+    design : ndarray
+      A Latin hypercube design of ``n`` samples on the unit hypercube.
+    rng : RandomState
+      The random number generator.
+
+    Returns
+    -------
+    ndarray
+      The ``n`` new samples, which with `design` form a Latin hypercube
+      design of ``2n`` samples.
+
+    """
+    n, dimensions = design.shape
+    strata = 2 * n
+    new = np.empty_like(design)
+    for j in range(dimensions):
+        occupied = np.floor(design[:, j] * strata).astype(int)
+        empty = np.setdiff1d(np.arange(strata), occupied)
+        new[:, j] = (rng.permutation(empty) + rng.uniform(size=n)) / strata
+    return new
+
+
+def uniform_variables(input_file):
+    """Get the uniform uncertain variables of a Dakota input file.
+
+    Returns
+    -------
+    tuple
+      The variable descriptors and their lower and upper bounds.
+
+    """
+    descriptors = get_keyword_values(input_file, 'variables', 'descriptors')
+    lower = get_keyword_values(input_file, 'variables', 'lower_bounds')
+    upper = get_keyword_values(input_file, 'variables', 'upper_bounds')
+    if get_keyword_values(input_file, 'variables',
+                          'uniform_uncertain') is None:
+        raise ValueError('adaptive sampling needs uniform_uncertain '
+                         'variables')
+    return (descriptors, np.array(lower, dtype=float),
+            np.array(upper, dtype=float))
+
+
+def sample_statistics(values, level=None):
+    """Compute the statistics that decide whether sampling has converged.
+
+    Parameters
+    ----------
+    values : array_like
+      The response values.
+    level : float, optional
+      The response level whose exceedance probability is estimated.
+
+    Returns
+    -------
+    dict
+      The number of samples, mean, standard deviation and 95%
+      confidence interval of the mean (Student's t, as Dakota reports),
+      and, with a level, the exceedance probability and the half-width
+      of its 95% (Wilson score) confidence interval.
+
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    lower, upper = t_interval(values)
+    result = {
+        'samples': n,
+        'mean': float(values.mean()),
+        'std_dev': float(values.std(ddof=1)),
+        'ci_lower': float(lower),
+        'ci_upper': float(upper),
+        }
+    if level is not None:
+        p = float(exceedance(values, level))
+        lower, upper = wilson_interval(p, n)
+        result['exceedance'] = p
+        result['exceedance_half_width'] = float(upper - lower) / 2.
+    return result
+
+
+def has_converged(statistics, ci_width=None, exceedance_tolerance=None):
+    """Check the statistics of a sample against the tolerances."""
+    converged = True
+    if ci_width is not None:
+        width = statistics['ci_upper'] - statistics['ci_lower']
+        converged &= width <= ci_width * abs(statistics['mean'])
+    if exceedance_tolerance is not None:
+        converged &= (statistics['exceedance_half_width'] <=
+                      exceedance_tolerance)
+    return bool(converged)
+
+
+def run_adaptive(input_file, scheduler, run_directory='.',
+                 output_file='dakota.out', tabular_file='dakota.dat',
+                 initial_samples=20, max_samples=None, ci_width=None,
+                 exceedance_tolerance=None, response=0):
+    """Run a sampling experiment in batches until it converges.
+
+    Parameters
+    ----------
+    input_file : str
+      The Dakota input file, relative to the run directory.
+    scheduler : LocalScheduler or QueueScheduler
+      The scheduler that runs the evaluations.
+    run_directory : str, optional
+      The directory where Dakota is run.
+    output_file : str, optional
+      The Dakota output file with the statistics of the experiment.
+    tabular_file : str, optional
+      The tabular file of samples and responses.
+    initial_samples : int, optional
+      The number of samples in the first batch, no more than the
+      ``samples`` of the method.
+    max_samples : int, optional
+      The most samples to run (default is the ``samples`` of the
+      method, the size of the fixed design).
+    ci_width : float, optional
+      The tolerance on the width of the confidence interval of the
+      mean, relative to the mean.
+    exceedance_tolerance : float, optional
+      The tolerance on the half-width of the confidence interval of
+      the probability of exceeding the first response level.
+    response : int, optional
+      The index of the response function whose statistics are checked.
+
+    Returns
+    -------
+    dict
+      The statistics after each batch, whether they converged, and the
+      number of evaluations run and saved compared with the fixed
+      design.
+
+    """
+    if ci_width is None and exceedance_tolerance is None:
+        raise ValueError('adaptive sampling needs ci_width or '
+                         'exceedance_tolerance')
+    input_path = os.path.join(run_directory, input_file)
+    fixed_samples = int(get_keyword_values(input_path, 'method',
+                                           'samples')[0])
+    if int(initial_samples) > fixed_samples:
+        raise ValueError('initial_samples ({}) is more than the {} samples '
+                         'of the fixed design'.format(initial_samples,
+                                                      fixed_samples))
+    if max_samples is None:
+        max_samples = fixed_samples
+    seed = get_keyword_values(input_path, 'method', 'seed')
+    rng = np.random.RandomState(int(seed[0]) if seed else None)
+    levels = get_keyword_values(input_path, 'method', 'response_levels')
+    level = float(levels[0]) if levels else None
+    if exceedance_tolerance is not None and level is None:
+        raise ValueError('exceedance_tolerance needs a response level')
+
+    descriptors, lower, upper = uniform_variables(input_path)
+    design = np.empty((0, len(descriptors)))
+    batch = latin_hypercube(int(initial_samples), len(descriptors), rng)
+    responses = []
+    history = []
+    while True:
+        eval_ids = np.arange(len(design), len(design) + len(batch)) + 1
+        jobs = make_jobs(input_path, eval_ids, descriptors,
+                         lower + batch * (upper - lower),
+                         run_directory=run_directory)
+        scheduler.run(jobs)
+        responses.append(collect_results(jobs))
+        design = np.vstack([design, batch])
+
+        values = np.vstack(responses)
+        history.append(sample_statistics(values[:, response], level=level))
+        converged = has_converged(history[-1], ci_width=ci_width,
+                                  exceedance_tolerance=exceedance_tolerance)
+        if converged or 2 * len(design) > max_samples:
+            break
+        batch = extend_latin_hypercube(design, rng)
+
+    n = len(design)
+    eval_ids = np.arange(n) + 1
+    response_descriptors = get_keyword_values(input_path, 'responses',
+                                              'response_descriptors')
+    table = np.hstack([lower + design * (upper - lower), values])
+
+    # Have Dakota compute its statistics from the samples that were run.
+    set_keyword_values(input_path, 'method', 'samples', [n], quote=False)
+    evaluations_file = 'evaluations.dat'
+    write_tabular_file(os.path.join(run_directory, evaluations_file),
+                       eval_ids, descriptors + response_descriptors, table)
+    post_run(input_file, evaluations_file, output_file=output_file,
+             run_directory=run_directory)
+    write_tabular_file(os.path.join(run_directory, tabular_file),
+                       eval_ids, descriptors + response_descriptors, table)
+
+    return {
+        'history': history,
+        'converged': converged,
+        'samples': n,
+        'fixed_samples': fixed_samples,
+        'runs_saved': fixed_samples - n,
+        }
+
+
+def format_adaptive_report(report):
+    """Format the report of an adaptive run for the console."""
+    lines = []
+    for statistics in report['history']:
+        line = ('{samples:>6} samples: mean = {mean:.6g}, '
+                '95% CI = [{ci_lower:.6g}, {ci_upper:.6g}]').format(
+                    **statistics)
+        if 'exceedance' in statistics:
+            line += ', P(exceed) = {exceedance:.4g} +/- ' \
+                    '{exceedance_half_width:.2g}'.format(**statistics)
+        lines.append(line)
+    lines.append('{} after {} samples; the fixed design has {} '
+                 '({} runs saved)'.format(
+                     'Converged' if report['converged'] else 'Not converged',
+                     report['samples'], report['fixed_samples'],
+                     report['runs_saved']))
+    return '\n'.join(lines)
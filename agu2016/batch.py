@@ -0,0 +1,397 @@
+"""Run the evaluations of a Dakota experiment as batch jobs.
+
+Rather than have Dakota fork every evaluation on the host where it
+runs, a batch run splits the experiment into three steps:
+
+1. ``dakota -pre_run`` writes the sample matrix of the method to a
+   tabular file without running any evaluations;
+2. each sample is submitted as a job to a scheduler, which runs the
+   analysis driver in the sample's own ``run.N`` directory, exactly as
+   Dakota would, and the ``results.out`` files are collected back;
+3. the samples and their responses are written to `dakota.dat`, and
+   ``dakota -post_run`` reads them to compute the method's statistics
+   in `dakota.out`.
+
+Schedulers are pluggable: `LocalScheduler` runs jobs in a pool of
+local processes, standing in for a cluster scheduler, and
+`QueueScheduler` submits them to a batch queue such as Slurm or PBS on
+nodes that share the run directory.
+
+"""
+import os
+import json
+import subprocess
+import time
+import multiprocessing
+
+import numpy as np
+
+from .dakota_input import get_keyword_values
+from .driver import DRIVER_CONFIG_FILE
+from .params import write_params_file, read_results_file
+from .staging import stage_evaluations
+from .tabular import read_samples, write_tabular_file
+
+
+class Job(object):
+
+    """An evaluation of the analysis driver in its own directory.
+
+    Parameters
+    ----------
+    eval_id : int
+      The evaluation id.
+    directory : str
+      The directory in which to run the evaluation.
+    command : list of str
+      The analysis driver command, without the parameters and results
+      file arguments.
+    params_file : str, optional
+      The name of the parameters file.
+    results_file : str, optional
+      The name of the results file.
+
+    """
+
+    def __init__(self, eval_id, directory, command,
+                 params_file='params.in', results_file='results.out'):
+        self.eval_id = eval_id
+        self.directory = directory
+        self.command = list(command)
+        self.params_file = params_file
+        self.results_file = results_file
+
+    @property
+    def results_path(self):
+        return os.path.join(self.directory, self.results_file)
+
+    def is_done(self):
+        """Check whether the job has written its results file."""
+        return os.path.isfile(self.results_path)
+
+    def __repr__(self):
+        return 'Job({!r}, {!r})'.format(self.eval_id, self.directory)
+
+
+def execute_job(job):
+    """Run the analysis driver of a job and wait for it to finish."""
+    subprocess.check_call(job.command + [job.params_file, job.results_file],
+                          cwd=job.directory)
+    return job.eval_id
+
+
+class LocalScheduler(object):
+
+    """Run batch jobs in a pool of local processes.
+
+    Parameters
+    ----------
+    processes : int, optional
+      The number of jobs to run at once (default is the number of
+      cores).
+
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or multiprocessing.cpu_count()
+
+    def run(self, jobs):
+        """Run jobs and wait for all of them to finish."""
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            pending = [pool.apply_async(execute_job, (job,)) for job in jobs]
+            for result in pending:
+                result.get()
+        finally:
+            pool.close()
+            pool.join()
+
+
+JOB_SCRIPT = """#!/bin/sh
+cd {directory}
+{command} {params_file} {results_file}
+"""
+
+# How to request a walltime from the submit commands of common queues.
+WALLTIME_OPTIONS = {
+    'sbatch': ['--time={}'],
+    'qsub': ['-l', 'walltime={}'],
+}
+
+
+def parse_walltime(walltime):
+    """Convert a walltime like '1:30:00' or 5400 to seconds.
+
+    Examples
+    --------
+    >>> parse_walltime('1:30:00')
+    5400
+    >>> parse_walltime('45:00')
+    2700
+    >>> parse_walltime(60)
+    60
+
+    """
+    if isinstance(walltime, (int, float)):
+        return int(walltime)
+    seconds = 0
+    for field in walltime.split(':'):
+        seconds = 60 * seconds + int(field)
+    return seconds
+
+
+def format_walltime(seconds):
+    """Format seconds as a walltime, ``HH:MM:SS``."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{:02d}:{:02d}:{:02d}'.format(hours, minutes, seconds)
+
+
+class QueueScheduler(object):
+
+    """Submit batch jobs to a cluster queue.
+
+    Each job is written as a shell script in its run directory and
+    submitted with the queue's submit command. The run directory must
+    be on a file system shared with the compute nodes; the scheduler
+    waits for the jobs' results files to appear there.
+
+    Parameters
+    ----------
+    submit_command : str or list of str, optional
+      The command that submits a job script (default is Slurm's
+      ``sbatch``; use ``qsub`` for PBS).
+    poll_interval : float, optional
+      Seconds between checks for finished jobs.
+    walltime : str or int, optional
+      The longest a job may run, as ``HH:MM:SS`` or seconds (default
+      is a day). It's requested from ``sbatch`` and ``qsub``, which
+      kill jobs that run longer.
+    timeout : float, optional
+      Seconds to wait for all jobs before giving up (default is twice
+      the walltime, as long for the jobs to wait in the queue as to
+      run). A job that is lost, or killed before it writes its results
+      file, would otherwise be waited for forever.
+
+    """
+
+    def __init__(self, submit_command='sbatch', poll_interval=10.,
+                 walltime='24:00:00', timeout=None):
+        if isinstance(submit_command, str):
+            submit_command = submit_command.split()
+        self.submit_command = submit_command
+        self.poll_interval = poll_interval
+        self.walltime = parse_walltime(walltime)
+        self.timeout = 2 * self.walltime if timeout is None else timeout
+
+    def submit(self, job):
+        """Write a job script and submit it to the queue."""
+        script = os.path.join(job.directory, 'job.sh')
+        with open(script, 'w') as fp:
+            fp.write(JOB_SCRIPT.format(
+                directory=os.path.abspath(job.directory),
+                command=' '.join(job.command), params_file=job.params_file,
+                results_file=job.results_file))
+        options = WALLTIME_OPTIONS.get(
+            os.path.basename(self.submit_command[0]), [])
+        subprocess.check_call(
+            self.submit_command +
+            [option.format(format_walltime(self.walltime))
+             for option in options] + [script])
+
+    def run(self, jobs):
+        """Submit jobs and wait for all of them to finish."""
+        for job in jobs:
+            self.submit(job)
+
+        start = time.time()
+        pending = list(jobs)
+        while pending:
+            pending = [job for job in pending if not job.is_done()]
+            if pending:
+                if time.time() - start > self.timeout:
+                    raise RuntimeError(
+                        'timed out after {:.0f} s waiting for {} jobs; '
+                        'evaluations without a {}: {}'.format(
+                            self.timeout, len(pending),
+                            pending[0].results_file,
+                            ', '.join(str(job.eval_id)
+                                      for job in pending)))
+                time.sleep(self.poll_interval)
+
+
+SCHEDULERS = {
+    'local': LocalScheduler,
+    'queue': QueueScheduler,
+}
+
+
+def get_scheduler(spec):
+    """Create a scheduler from its experiment specification.
+
+    Parameters
+    ----------
+    spec : str or dict
+      The name of a scheduler ('local' or 'queue'), or a dict with the
+      name under 'scheduler' and the scheduler's parameters.
+
+    """
+    if isinstance(spec, str):
+        spec = {'scheduler': spec}
+    spec = dict(spec)
+    name = spec.pop('scheduler', 'local')
+    try:
+        return SCHEDULERS[name](**spec)
+    except KeyError:
+        raise ValueError('unknown batch scheduler: {}'.format(name))
+
+
+def pre_run(input_file, samples_file='samples.dat', run_directory='.'):
+    """Have Dakota write the samples of an experiment without running them.
+
+    Returns
+    -------
+    tuple
+      The evaluation ids, variable descriptors and sample matrix, as
+      returned by `read_samples`.
+
+    """
+    subprocess.check_call(['dakota', '-i', input_file,
+                           '-pre_run', '::' + samples_file],
+                          cwd=run_directory)
+    return read_samples(os.path.join(run_directory, samples_file))
+
+
+def post_run(input_file, tabular_file, output_file='dakota.out',
+             run_directory='.'):
+    """Have Dakota compute the statistics of already evaluated samples."""
+    subprocess.check_call(['dakota', '-i', input_file, '-o', output_file,
+                           '-post_run', tabular_file + '::'],
+                          cwd=run_directory)
+
+
+def make_jobs(input_file, eval_ids, descriptors, samples, run_directory='.'):
+    """Stage the run directories of a batch of evaluations.
+
+    The analysis driver, its analysis components, the names of the
+    parameters and results files, and the work directory names are
+    taken from the interface block of the Dakota input file, so jobs
+    are run just as Dakota would run them. If the driver is this
+    package's, the model configuration files of all of the jobs are
+    rendered, and their auxiliary files staged, here at once (see
+    `agu2016.staging`).
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file.
+    eval_ids : array_like of int
+      The evaluation ids of the samples.
+    descriptors : list of str
+      The variable descriptors.
+    samples : array_like
+      The sample matrix, with one row per evaluation.
+    run_directory : str, optional
+      The directory in which to create the run directories.
+
+    Returns
+    -------
+    list of Job
+      The staged jobs.
+
+    """
+    def keyword(block, name, default=None):
+        values = get_keyword_values(input_file, block, name)
+        return values if values is not None else default
+
+    driver = keyword('interface', 'analysis_driver')[0]
+    components = keyword('interface', 'analysis_components', [])
+    params_file = keyword('interface', 'parameters_file', ['params.in'])[0]
+    results_file = keyword('interface', 'results_file', ['results.out'])[0]
+    work_directory = keyword('interface', 'named', ['run'])[0]
+    response_descriptors = keyword('responses', 'response_descriptors')
+
+    jobs = []
+    for eval_id, values in zip(eval_ids, samples):
+        directory = os.path.join(run_directory,
+                                 '{}.{}'.format(work_directory, eval_id))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        write_params_file(os.path.join(directory, params_file),
+                          descriptors, values, response_descriptors,
+                          analysis_components=components,
+                          analysis_driver=driver, eval_id=eval_id)
+        jobs.append(Job(eval_id, directory, driver.split(),
+                        params_file=params_file, results_file=results_file))
+
+    if components and os.path.basename(components[0]) == DRIVER_CONFIG_FILE:
+        with open(components[0], 'r') as fp:
+            config = json.load(fp)
+        stage_evaluations(config, [job.directory for job in jobs],
+                          descriptors, samples)
+    return jobs
+
+
+def collect_results(jobs):
+    """Read the responses of finished jobs.
+
+    Returns
+    -------
+    ndarray
+      The response values, with one row per job.
+
+    """
+    failed = [job.eval_id for job in jobs if not job.is_done()]
+    if failed:
+        raise RuntimeError('evaluations did not finish: {}'.format(failed))
+    return np.array([read_results_file(job.results_path) for job in jobs])
+
+
+def run_batch(input_file, scheduler, run_directory='.',
+              output_file='dakota.out', tabular_file='dakota.dat'):
+    """Run a Dakota experiment with its evaluations as batch jobs.
+
+    Parameters
+    ----------
+    input_file : str
+      The Dakota input file, relative to the run directory.
+    scheduler : LocalScheduler or QueueScheduler
+      The scheduler that runs the jobs.
+    run_directory : str, optional
+      The directory where Dakota is run and the evaluation directories
+      are created.
+    output_file : str, optional
+      The Dakota output file with the statistics of the experiment.
+    tabular_file : str, optional
+      The tabular file of samples and responses.
+
+    Returns
+    -------
+    ndarray
+      The response values, with one row per evaluation.
+
+    """
+    eval_ids, descriptors, samples = pre_run(input_file,
+                                             run_directory=run_directory)
+
+    input_path = os.path.join(run_directory, input_file)
+    jobs = make_jobs(input_path, eval_ids, descriptors, samples,
+                     run_directory=run_directory)
+    scheduler.run(jobs)
+    responses = collect_results(jobs)
+
+    descriptors = descriptors + get_keyword_values(input_path, 'responses',
+                                                   'response_descriptors')
+    values = np.hstack([samples, responses])
+
+    # Dakota may write its own tabular file during the post-run, so
+    # give it a copy of the results to read.
+    evaluations_file = 'evaluations.dat'
+    write_tabular_file(os.path.join(run_directory, evaluations_file),
+                       eval_ids, descriptors, values)
+    post_run(input_file, evaluations_file, output_file=output_file,
+             run_directory=run_directory)
+    write_tabular_file(os.path.join(run_directory, tabular_file),
+                       eval_ids, descriptors, values)
+
+    return responses
@@ -0,0 +1,226 @@
+"""A content-addressed cache of model evaluations.
+
+Studies that run the same model with the same inputs, such as the
+1000-year Cs and RI studies, which share a hypsometry file, a seed and
+overlapping T-P bounds, can share evaluations. An evaluation is keyed
+on the exact inputs of the run: the rendered model configuration file,
+the contents of the auxiliary files and the run duration. The cache
+stores the full daily output series of every variable that's been
+requested for a key, so a study whose points are already cached only
+has to recompute its response statistics.
+
+The cache is a directory tree, usually on a file system shared by the
+studies::
+
+  <cache>/<key[:2]>/<key>/manifest.json
+  <cache>/<key[:2]>/<key>/<output variable>.npy
+
+Files are written to a temporary name and renamed into place, so
+evaluations running at the same time can share a cache.
+
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+
+def evaluation_key(config_text, auxiliary_files=(), run_duration=None,
+                   component=None):
+    """Compute the cache key of a model evaluation.
+
+    Parameters
+    ----------
+    config_text : str
+      The contents of the rendered model configuration file.
+    auxiliary_files : list of str, optional
+      Paths to the auxiliary input files of the model.
+    run_duration : float, optional
+      The run duration of the model.
+    component : str, optional
+      The name of the model component.
+
+    Returns
+    -------
+    str
+      A hex digest that identifies the evaluation's inputs.
+
+    """
+    digest = hashlib.sha256()
+    digest.update('component={}\n'.format(component).encode('utf-8'))
+    digest.update('run_duration={}\n'.format(run_duration).encode('utf-8'))
+    digest.update(config_text.encode('utf-8'))
+    for path in sorted(auxiliary_files, key=os.path.basename):
+        digest.update('\n{}\n'.format(os.path.basename(path)).encode('utf-8'))
+        with open(path, 'rb') as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+class EvaluationCache(object):
+
+    """Cached output series of model evaluations.
+
+    Parameters
+    ----------
+    path : str
+      The root directory of the cache; it's created if needed.
+
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def entry(self, key):
+        """Get the directory of a cache entry."""
+        return os.path.join(self.path, key[:2], key)
+
+    def _series_file(self, key, name):
+        return os.path.join(self.entry(key), name + '.npy')
+
+    def get(self, key, names):
+        """Get the cached output series of an evaluation.
+
+        Parameters
+        ----------
+        key : str
+          The evaluation key.
+        names : list of str
+          The output variables that are needed.
+
+        Returns
+        -------
+        dict or None
+          The series of each variable, memory-mapped from the cache,
+          or None if any of them isn't cached.
+
+        """
+        files = [self._series_file(key, name) for name in names]
+        if not all(os.path.isfile(path) for path in files):
+            return None
+        return dict((name, np.load(path, mmap_mode='r'))
+                    for name, path in zip(names, files))
+
+    def put(self, key, series, metadata=None):
+        """Add the output series of an evaluation to the cache.
+
+        Parameters
+        ----------
+        key : str
+          The evaluation key.
+        series : dict
+          The output series, keyed by variable name.
+        metadata : dict, optional
+          Information about the evaluation, such as its variables,
+          stored in the entry's manifest.
+
+        """
+        entry = self.entry(key)
+        if not os.path.isdir(entry):
+            try:
+                os.makedirs(entry)
+            except OSError:
+                if not os.path.isdir(entry):
+                    raise
+        for name, values in series.items():
+            self._atomic_write(self._series_file(key, name),
+                               lambda fp: np.save(fp, np.asarray(values)))
+        if metadata is not None:
+            text = json.dumps(metadata, indent=2, sort_keys=True)
+            self._atomic_write(os.path.join(entry, 'manifest.json'),
+                               lambda fp: fp.write(text.encode('utf-8')))
+
+    def spool(self, key, names, metadata=None):
+        """Start writing the output series of a running evaluation.
+
+        Returns
+        -------
+        SeriesSpool
+          Append the values of each time step to the spool and commit
+          it when the run is done.
+
+        """
+        return SeriesSpool(self, key, names, metadata=metadata)
+
+    def _atomic_write(self, path, write):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                write(fp)
+            os.rename(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+
+class SeriesSpool(object):
+
+    """Write output series to the cache a time step at a time.
+
+    Values are buffered in chunks and appended to temporary files, so
+    a running evaluation can be cached without holding its series in
+    memory.
+
+    Parameters
+    ----------
+    cache : EvaluationCache
+      The cache to write to.
+    key : str
+      The evaluation key.
+    names : list of str
+      The output variables, in the order their values are appended.
+    metadata : dict, optional
+      Information about the evaluation, stored in its manifest.
+    chunk_size : int, optional
+      The number of time steps to buffer between writes.
+
+    """
+
+    def __init__(self, cache, key, names, metadata=None, chunk_size=8192):
+        self.cache = cache
+        self.key = key
+        self.names = list(names)
+        self.metadata = metadata
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.chunk = []
+        self.files = [tempfile.TemporaryFile() for _ in self.names]
+
+    def append(self, values):
+        """Append the values of the output variables at a time step."""
+        self.chunk.append(values)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.chunk:
+            chunk = np.array(self.chunk, dtype=float)
+            for fp, column in zip(self.files, chunk.T):
+                fp.write(column.tobytes())
+            self.count += len(self.chunk)
+            self.chunk = []
+
+    def commit(self):
+        """Move the spooled series into the cache."""
+        self.flush()
+        entry = self.cache.entry(self.key)
+        if not os.path.isdir(entry):
+            os.makedirs(entry)
+
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(float)),
+                  'fortran_order': False, 'shape': (self.count, )}
+        for name, spooled in zip(self.names, self.files):
+            def write(fp):
+                np.lib.format.write_array_header_1_0(fp, header)
+                spooled.seek(0)
+                shutil.copyfileobj(spooled, fp)
+            self.cache._atomic_write(self.cache._series_file(self.key, name),
+                                     write)
+            spooled.close()
+        if self.metadata is not None:
+            self.cache.put(self.key, {}, metadata=self.metadata)
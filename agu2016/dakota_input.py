@@ -0,0 +1,179 @@
+"""Read, edit and write Dakota input files.
+
+Dakotathon writes `dakota.in` from the experiment's `dakota.yaml`, but
+it only exposes a subset of the Dakota keywords. The functions here
+let the experiments adjust the generated input file before Dakota is
+run. An input file is represented as a list of ``(name, lines)``
+blocks, where ``name`` is the top-level keyword (``environment``,
+``method``, ``variables``, ``interface`` or ``responses``) and
+``lines`` are the lines that follow it.
+
+"""
+import shlex
+
+
+BLOCK_KEYWORDS = ('environment', 'method', 'model', 'variables',
+                  'interface', 'responses')
+
+
+def read_input_file(input_file):
+    """Read a Dakota input file into a list of blocks.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to a Dakota input file.
+
+    Returns
+    -------
+    list of tuple
+      The ``(name, lines)`` blocks of the input file. Lines before
+      the first block (comments, usually) are stored under ``None``.
+
+    """
+    blocks = [(None, [])]
+    with open(input_file, 'r') as fp:
+        for line in fp:
+            line = line.rstrip('\n')
+            if line.strip() in BLOCK_KEYWORDS and not line.startswith(' '):
+                blocks.append((line.strip(), []))
+            else:
+                blocks[-1][1].append(line)
+    return blocks
+
+
+def write_input_file(input_file, blocks):
+    """Write a list of blocks to a Dakota input file.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file.
+    blocks : list of tuple
+      The ``(name, lines)`` blocks to write.
+
+    """
+    with open(input_file, 'w') as fp:
+        for name, lines in blocks:
+            if name is not None:
+                fp.write(name + '\n')
+            for line in lines:
+                fp.write(line + '\n')
+
+
+def get_block(blocks, name):
+    """Get the lines of the named block."""
+    for block_name, lines in blocks:
+        if block_name == name:
+            return lines
+    raise KeyError('no {} block in input file'.format(name))
+
+
+def find_keyword(lines, keyword):
+    """Get the index of the line that starts with a keyword, or -1."""
+    for i, line in enumerate(lines):
+        tokens = line.split()
+        if tokens and tokens[0] == keyword:
+            return i
+    return -1
+
+
+def get_keyword_values(input_file, block, keyword):
+    """Get the values assigned to a keyword in a Dakota input file.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file.
+    block : str
+      The block holding the keyword, e.g. ``'interface'``.
+    keyword : str
+      The keyword, e.g. ``'analysis_driver'``.
+
+    Returns
+    -------
+    list of str or None
+      The values, with quotes removed, or None if the keyword isn't set.
+
+    """
+    lines = get_block(read_input_file(input_file), block)
+    position = find_keyword(lines, keyword)
+    if position < 0:
+        return None
+    line = lines[position]
+    if '=' in line:
+        return shlex.split(line.partition('=')[2])
+    return shlex.split(line)[1:]
+
+
+def set_keyword_values(input_file, block, keyword, values, quote=True):
+    """Set the values assigned to a keyword in a Dakota input file.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file, which is edited in place.
+    block : str
+      The block holding the keyword.
+    keyword : str
+      The keyword, which must already be in the block.
+    values : list of str
+      The new values.
+    quote : bool, optional
+      If True (the default), write the values in quotes, as for
+      strings; use False for numbers.
+
+    """
+    blocks = read_input_file(input_file)
+    lines = get_block(blocks, block)
+    position = find_keyword(lines, keyword)
+    if position < 0:
+        raise KeyError('no {} keyword in {} block'.format(keyword, block))
+    indent = lines[position][:len(lines[position]) -
+                             len(lines[position].lstrip())]
+    if quote:
+        values = ["'{}'".format(value) for value in values]
+    lines[position] = '{}{} = {}'.format(
+        indent, keyword, ' '.join(str(value) for value in values))
+    write_input_file(input_file, blocks)
+
+
+def insert_keywords(input_file, block, keywords, after=None):
+    """Insert keyword lines into a block of a Dakota input file.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file, which is edited in place.
+    block : str
+      The block to edit, e.g. ``'interface'``.
+    keywords : list of str
+      The lines to insert, without leading indentation.
+    after : str, optional
+      Insert the lines after the line starting with this keyword
+      (default is the end of the block).
+
+    """
+    blocks = read_input_file(input_file)
+    lines = get_block(blocks, block)
+    position = find_keyword(lines, after) if after else -1
+    if position < 0:
+        while lines and not lines[-1].strip():
+            lines.pop()
+        lines.extend(['  ' + keyword for keyword in keywords])
+        lines.append('')
+    else:
+        indent = lines[position][:len(lines[position]) -
+                                 len(lines[position].lstrip())]
+        for i, keyword in enumerate(keywords):
+            lines.insert(position + 1 + i, indent + '  ' + keyword)
+    write_input_file(input_file, blocks)
+
+
+def remove_keywords(input_file, block, keywords):
+    """Remove the lines starting with any of the keywords from a block."""
+    blocks = read_input_file(input_file)
+    lines = get_block(blocks, block)
+    lines[:] = [line for line in lines
+                if not line.split() or line.split()[0] not in keywords]
+    write_input_file(input_file, blocks)
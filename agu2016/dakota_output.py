@@ -0,0 +1,560 @@
+"""Read results from Dakota output files.
+
+A Dakota output file, `dakota.out`, holds a log of every evaluation,
+followed by the final results of the method: moments, confidence
+intervals, level mappings, PDF histograms and, for polynomial chaos,
+Sobol' indices. The log can be very long, so the final results are
+found by indexing the section headings from the end of the file back
+to the function evaluation summary that precedes them; the evaluation
+log is never read. A running experiment's evaluations can be followed
+as Dakota appends them to the file.
+
+Print the statistics of an experiment, or follow a running one, with::
+
+  $ python -m agu2016.dakota_output dakota.out
+  $ python -m agu2016.dakota_output --follow dakota.out
+
+"""
+import re
+import sys
+import time
+import argparse
+
+import numpy as np
+
+
+WALL_CLOCK = re.compile(r'Total wall clock\s*=\s*(\S+)')
+
+EVALUATION_SUMMARY = '<<<<< Function evaluation summary'
+SECTIONS = {
+    'moments': 'Moment-based statistics for each response function',
+    'confidence_intervals': '95% confidence intervals for each response '
+                            'function',
+    'level_mappings': 'Level mappings for each response function',
+    'pdf': 'Probability Density Function (PDF) histograms for each '
+           'response function',
+    'sobol': "Sobol' indices",
+    'pce_coefficients': 'Coefficients of Polynomial Chaos Expansion',
+    'correlations': 'Simple Correlation Matrix among all inputs and outputs',
+}
+
+NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[-+]?(?:inf|nan)'
+EVALUATION_BEGIN = re.compile(r'^Begin\s+(\S+)\s+Evaluation\s+(\d+)')
+PARAMETERS_BEGIN = re.compile(r'^Parameters for evaluation (\d+):')
+RESPONSES_BEGIN = re.compile(r'^Active response data for (?:(\S+) )?'
+                             r'evaluation (\d+):')
+VALUE_LINE = re.compile(r'^\s*({})\s+(\S+)\s*$'.format(NUMBER))
+
+
+def read_wall_clock(output_file):
+    """Get the total wall clock time of a Dakota run.
+
+    Parameters
+    ----------
+    output_file : str
+      Path to a Dakota output file, usually `dakota.out`.
+
+    Returns
+    -------
+    float or None
+      The wall clock time in seconds, or None if the run hasn't
+      finished.
+
+    Notes
+    -----
+    Dakota reports the time at the end of the file, so the file is read
+    backwards, and only as far as the evaluation log.
+
+    """
+    with open(output_file, 'rb') as fp:
+        for _, line in reverse_lines(fp):
+            text = line.decode('utf-8', 'replace')
+            match = WALL_CLOCK.search(text)
+            if match:
+                return float(match.group(1))
+            if (text.startswith(EVALUATION_SUMMARY) or
+                    EVALUATION_BEGIN.match(text) or
+                    RESPONSES_BEGIN.match(text)):
+                break
+    return None
+
+
+def reverse_lines(fp, block_size=1 << 20):
+    """Read the lines of a binary file from its end.
+
+    Yields
+    ------
+    tuple
+      The byte offset of each line and the line, without its newline.
+
+    """
+    fp.seek(0, 2)
+    position = fp.tell()
+    remainder = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        fp.seek(position)
+        lines = (fp.read(size) + remainder).split(b'\n')
+        remainder = lines[0]
+        offset = position + len(remainder) + 1
+        located = []
+        for line in lines[1:]:
+            located.append((offset, line))
+            offset += len(line) + 1
+        for item in reversed(located):
+            yield item
+    yield 0, remainder
+
+
+def index_sections(output_file):
+    """Find the final result sections of a Dakota output file.
+
+    The file is read backwards from its end until the function
+    evaluation summary, so the cost doesn't depend on the length of
+    the evaluation log.
+
+    Parameters
+    ----------
+    output_file : str
+      Path to a Dakota output file.
+
+    Returns
+    -------
+    dict
+      The byte offset of the heading line of each section found,
+      keyed by section name (see `SECTIONS`). Sections that occur
+      once per response function, such as Sobol' indices, map to a
+      list of offsets.
+
+    """
+    index = {}
+    with open(output_file, 'rb') as fp:
+        for offset, line in reverse_lines(fp):
+            text = line.decode('utf-8', 'replace')
+            if text.startswith(EVALUATION_SUMMARY):
+                index['evaluation_summary'] = offset
+                break
+            for name, heading in SECTIONS.items():
+                if heading in text:
+                    if name == 'sobol':
+                        index.setdefault(name, []).insert(0, offset)
+                    else:
+                        index[name] = offset
+    return index
+
+
+def _section_lines(fp, offset, end=None):
+    """Read the lines of a section after its heading.
+
+    The section ends at the byte offset `end` or, if not given, at the
+    first blank line.
+
+    """
+    fp.seek(offset)
+    fp.readline()
+    lines = []
+    while end is None or fp.tell() < end:
+        line = fp.readline()
+        if not line:
+            break
+        line = line.decode('utf-8', 'replace').rstrip()
+        if not line and end is None:
+            break
+        lines.append(line)
+    return lines
+
+
+def _section_end(index, offset):
+    """Get the offset of the section that follows one in the index."""
+    offsets = []
+    for value in index.values():
+        offsets.extend(value if isinstance(value, list) else [value])
+    following = [value for value in offsets if value > offset]
+    return min(following) if following else None
+
+
+def _numbers(tokens):
+    return [float(token) for token in tokens]
+
+
+def parse_moments(lines):
+    """Parse the moment-based statistics of each response function.
+
+    Both the sampling layout, one line per function, and the polynomial
+    chaos layout, with 'expansion' and 'integration' lines under each
+    function, are understood; for the latter, the integration moments
+    are returned.
+
+    """
+    keys = ('mean', 'std_dev', 'skewness', 'kurtosis')
+    moments = {}
+    descriptor = None
+    for line in lines[1:]:
+        tokens = line.split()
+        if tokens[0] in ('expansion:', 'integration:'):
+            if descriptor is not None and (tokens[0] == 'integration:' or
+                                           descriptor not in moments):
+                moments[descriptor] = dict(zip(keys, _numbers(tokens[1:])))
+        elif len(tokens) == 1:
+            descriptor = tokens[0]
+        else:
+            moments[tokens[0]] = dict(zip(keys, _numbers(tokens[1:])))
+    return moments
+
+
+def parse_confidence_intervals(lines):
+    """Parse the 95% confidence intervals of each response function."""
+    keys = ('lower_mean', 'upper_mean', 'lower_std_dev', 'upper_std_dev')
+    return dict((tokens[0], dict(zip(keys, _numbers(tokens[1:]))))
+                for tokens in (line.split() for line in lines[1:]))
+
+
+def _parse_tables(lines, heading):
+    """Parse tables of numbers that follow a heading per response."""
+    pattern = re.compile(r'^{} (?:for )?(.+):$'.format(heading))
+    tables, rows = {}, None
+    for line in lines:
+        match = pattern.match(line.strip())
+        if match:
+            rows = tables.setdefault(match.group(1), [])
+            continue
+        tokens = line.split()
+        if rows is None or not tokens:
+            continue
+        try:
+            rows.append(_numbers(tokens))
+        except ValueError:
+            continue
+    return tables
+
+
+def parse_level_mappings(lines):
+    """Parse the CDF level mappings of each response function.
+
+    Returns
+    -------
+    dict
+      The ``(response level, probability level)`` pairs of each
+      response function.
+
+    """
+    tables = _parse_tables(lines, r'Cumulative Distribution Function \(CDF\)')
+    return dict((name, [tuple(row[:2]) for row in rows])
+                for name, rows in tables.items())
+
+
+def parse_pdf(lines):
+    """Parse the PDF histograms of each response function.
+
+    Returns
+    -------
+    dict
+      An array of (bin lower, bin upper, density) rows for each
+      response function.
+
+    """
+    return dict((name, np.array(rows))
+                for name, rows in _parse_tables(lines, 'PDF').items())
+
+
+def parse_sobol(lines, heading):
+    """Parse the Sobol' indices of a response function.
+
+    Returns
+    -------
+    tuple
+      The response descriptor, and a dict with the main and total
+      indices of each variable and the interaction indices of each
+      group of variables.
+
+    """
+    descriptor = heading.split(" Sobol' indices")[0].strip()
+    indices = {'main': {}, 'total': {}, 'interaction': {}}
+    interactions = False
+    for line in lines:
+        tokens = line.split()
+        if tokens[0] == 'Main':
+            continue
+        if tokens[0] == 'Interaction':
+            interactions = True
+        elif interactions:
+            indices['interaction'][tuple(tokens[1:])] = float(tokens[0])
+        else:
+            indices['main'][tokens[2]] = float(tokens[0])
+            indices['total'][tokens[2]] = float(tokens[1])
+    return descriptor, indices
+
+
+def read_statistics(output_file, index=None):
+    """Read the final statistics from a Dakota output file.
+
+    Parameters
+    ----------
+    output_file : str
+      Path to a Dakota output file.
+    index : dict, optional
+      The section index of the file, from `index_sections`.
+
+    Returns
+    -------
+    dict
+      The moments, confidence intervals, level mappings, PDF
+      histograms and Sobol' indices found in the file, each keyed by
+      response descriptor.
+
+    """
+    if index is None:
+        index = index_sections(output_file)
+    parsers = {
+        'moments': parse_moments,
+        'confidence_intervals': parse_confidence_intervals,
+    }
+
+    statistics = {}
+    with open(output_file, 'rb') as fp:
+        for name, parse in parsers.items():
+            if name in index:
+                statistics[name] = parse(_section_lines(fp, index[name]))
+
+        # Level mappings and histograms have a table per response
+        # function, so run to the next section.
+        for name, parse in (('level_mappings', parse_level_mappings),
+                            ('pdf', parse_pdf)):
+            if name in index:
+                statistics[name] = parse(_section_lines(
+                    fp, index[name], end=_section_end(index, index[name])))
+
+        for offset in index.get('sobol', []):
+            fp.seek(offset)
+            heading = fp.readline().decode('utf-8', 'replace')
+            descriptor, indices = parse_sobol(_section_lines(fp, offset),
+                                              heading)
+            statistics.setdefault('sobol', {})[descriptor] = indices
+    return statistics
+
+
+def statistics_of(statistics, response, responses=None):
+    """Get the statistics of one response, from `read_statistics`.
+
+    Statistics are matched to the response by its descriptor or, as a
+    study may label its responses differently in `dakota.dat` and
+    `dakota.out` (e.g. ``n_Cs40`` for a threshold count of Cs), by its
+    position among the study's `responses`, but only from a section
+    with as many responses; otherwise the section is left out.
+
+    Examples
+    --------
+    >>> statistics = {'moments': {'n_Cs40': {'mean': 2.}}}
+    >>> statistics_of(statistics, 'Cs', responses=['Cs'])
+    {'moments': {'mean': 2.0}}
+    >>> statistics_of(statistics, 'Cs', responses=['Qs', 'Cs'])
+    {}
+
+    """
+    responses = list(responses or [])
+    found = {}
+    for name, section in statistics.items():
+        if response in section:
+            found[name] = section[response]
+        elif (isinstance(section, dict) and response in responses and
+              len(section) == len(responses)):
+            found[name] = list(section.values())[responses.index(response)]
+    return found
+
+
+def level_at_probability(mappings, probability):
+    """Get the response level mapped to a probability level, or None."""
+    for response, prob in mappings:
+        if np.isclose(prob, probability):
+            return response
+    return None
+
+
+def probability_at_level(mappings, level):
+    """Get the probability level mapped to a response level, or None."""
+    for response, prob in mappings:
+        if np.isclose(response, level):
+            return prob
+    return None
+
+
+class EvaluationLog(object):
+
+    """Parse the evaluation log of a Dakota output file as it grows.
+
+    Feed lines to the log with `feed`; it returns the evaluations whose
+    responses are complete. Lines garbled by interleaved output, as
+    happens when Dakota's timing report lands in the middle of the log,
+    are skipped.
+
+    """
+
+    def __init__(self):
+        self.finished = False
+        self._eval_id = None
+        self._variables = {}
+        self._responses = None
+        self._parameters = {}
+
+    def feed(self, line):
+        """Parse a line of the log.
+
+        Returns
+        -------
+        tuple or None
+          The evaluation id, variables and responses of an evaluation
+          whose responses were completed by the line.
+
+        """
+        line = line.rstrip()
+        if line.startswith(EVALUATION_SUMMARY):
+            self.finished = True
+            return self._close()
+
+        match = PARAMETERS_BEGIN.match(line)
+        if match:
+            self._eval_id = int(match.group(1))
+            self._variables = self._parameters.setdefault(self._eval_id, {})
+            return None
+
+        match = RESPONSES_BEGIN.match(line)
+        if match:
+            done = self._close()
+            self._eval_id = int(match.group(2))
+            self._variables = None
+            self._responses = {}
+            return done
+
+        match = VALUE_LINE.match(line)
+        if match:
+            if self._responses is not None:
+                self._responses[match.group(2)] = float(match.group(1))
+            elif self._variables is not None:
+                self._variables[match.group(2)] = float(match.group(1))
+            return None
+
+        if not line or EVALUATION_BEGIN.match(line):
+            return self._close()
+        return None
+
+    def _close(self):
+        if not self._responses:
+            return None
+        evaluation = (self._eval_id, self._parameters.pop(self._eval_id, {}),
+                      self._responses)
+        self._responses = None
+        self._variables = None
+        return evaluation
+
+
+def follow_evaluations(output_file, poll_interval=1., from_start=True):
+    """Follow the evaluations of a running experiment.
+
+    Parameters
+    ----------
+    output_file : str
+      Path to the Dakota output file of the running experiment.
+    poll_interval : float, optional
+      Seconds to wait for Dakota to write more output.
+    from_start : bool, optional
+      If False, only report evaluations written after the call.
+
+    Yields
+    ------
+    tuple
+      The evaluation id, variables and responses of each evaluation as
+      it finishes, until Dakota writes its evaluation summary.
+
+    """
+    log = EvaluationLog()
+    with open(output_file, 'r') as fp:
+        if not from_start:
+            fp.seek(0, 2)
+        partial = ''
+        while not log.finished:
+            line = fp.readline()
+            if not line:
+                time.sleep(poll_interval)
+                continue
+            if not line.endswith('\n'):
+                partial += line
+                continue
+            evaluation = log.feed(partial + line)
+            partial = ''
+            if evaluation is not None:
+                yield evaluation
+
+
+class RunningStatistics(object):
+
+    """Running count, mean and standard deviation of responses."""
+
+    def __init__(self):
+        self.count = {}
+        self.mean = {}
+        self.m2 = {}
+
+    def update(self, responses):
+        for name, value in responses.items():
+            n = self.count.get(name, 0) + 1
+            delta = value - self.mean.get(name, 0.)
+            self.count[name] = n
+            self.mean[name] = self.mean.get(name, 0.) + delta / n
+            self.m2[name] = self.m2.get(name, 0.) + \
+                delta * (value - self.mean[name])
+
+    def std_dev(self, name):
+        n = self.count[name]
+        return np.sqrt(self.m2[name] / (n - 1)) if n > 1 else float('nan')
+
+    def summary(self):
+        return '\n'.join(
+            '{}: n = {}, mean = {:.6g}, std dev = {:.6g}'.format(
+                name, self.count[name], self.mean[name], self.std_dev(name))
+            for name in sorted(self.count))
+
+
+def format_statistics(statistics):
+    """Format the final statistics of an experiment for the console."""
+    lines = []
+    for name, moments in sorted(statistics.get('moments', {}).items()):
+        lines.append(name)
+        lines.append('  mean = {mean:.6g}, std dev = {std_dev:.6g}'.format(
+            **moments))
+        ci = statistics.get('confidence_intervals', {}).get(name)
+        if ci:
+            lines.append('  95% CI of mean = [{lower_mean:.6g}, '
+                         '{upper_mean:.6g}]'.format(**ci))
+        for response, prob in statistics.get('level_mappings', {}).get(
+                name, []):
+            lines.append('  P(R <= {:.6g}) = {:.4g}'.format(response, prob))
+    for name, indices in sorted(statistics.get('sobol', {}).items()):
+        lines.append("{} Sobol' indices".format(name))
+        for variable in sorted(indices['main']):
+            lines.append('  {}: main = {:.4g}, total = {:.4g}'.format(
+                variable, indices['main'][variable],
+                indices['total'][variable]))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Print the statistics of a Dakota experiment.')
+    parser.add_argument('output_file', help='Dakota output file')
+    parser.add_argument('--follow', action='store_true',
+                        help='report statistics as evaluations finish')
+    args = parser.parse_args()
+
+    if args.follow:
+        running = RunningStatistics()
+        for eval_id, _, responses in follow_evaluations(args.output_file):
+            running.update(responses)
+            print('Evaluation {}'.format(eval_id))
+            print(running.summary())
+            sys.stdout.flush()
+    print(format_statistics(read_statistics(args.output_file)))
+
+
+if __name__ == '__main__':
+    main()
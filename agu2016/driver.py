@@ -0,0 +1,369 @@
+"""The analysis driver of the Hydrotrend experiments.
+
+Dakota runs the driver in each evaluation's ``run.N`` directory with::
+
+  $ python -m agu2016.driver params.in results.out
+
+The driver renders the model configuration file from the experiment's
+template with the variable values in the parameters file, stages the
+auxiliary files, unless the directory was already staged with the rest
+of a batch (see `agu2016.staging`), runs the model (or finds its
+output in the evaluation cache), computes the response functions from
+the output series (see `agu2016.responses`) and writes them to the
+results file. With streaming responses, the response functions are
+instead reduced as the model steps (see `agu2016.reducers`),
+Hydrotrend's ASCII output is turned off, and the output series are
+kept only in the evaluation cache, if there is one. With binary
+output, Hydrotrend's ASCII output is replaced by a memory-mapped
+series file (see `agu2016.series`), and the responses are computed
+from views into it. Finally, the run directories are pruned by the
+experiment's retention policy, if it has one (see
+`agu2016.retention`). With a warm start, the model is restored from a
+spin-up snapshot rather than run from its start (see
+`agu2016.warmstart`), which doesn't work with binary output. The time
+taken by each phase of the evaluation, and the snapshot distance of a
+warm start, are written to `timing.json` (see `agu2016.monitor`), and
+its responses are recorded so that a resumed experiment doesn't run it
+again (see `agu2016.restart`). With the experiment's ``profiling``
+option, the evaluation is profiled too (see `agu2016.profiling`).
+
+The driver is configured by a JSON file written in the run directory
+of the experiment, which Dakota passes as the analysis component. With
+the experiment's ``workers`` option, `run_evaluation` is called by
+long-lived worker processes instead, and Dakota forks a thin client
+(see `agu2016.workers`).
+
+"""
+import os
+import sys
+import json
+
+from .cache import EvaluationCache, evaluation_key
+from .models import collect_series, iter_model, run_model, run_model_to_file
+from .monitor import PhaseTimer
+from .params import read_params_file, write_results_file
+from .profiling import EvaluationProfile
+from .reducers import make_reducer
+from .responses import compute_responses
+from .restart import evaluation_digest, read_completion, write_completion
+from .retention import RetentionPolicy, apply_retention
+from .staging import (compile_template, is_staged, model_config_text,
+                      share_inputs, stage_directory, STAGING_MODES)
+from .warmstart import WarmStart, check_component
+
+
+DRIVER_CONFIG_FILE = 'driver.json'
+SERIES_FILE = os.path.join('HYDRO_OUTPUT', 'hydrotrend.bin')
+
+
+def driver_command():
+    """Get the command Dakota uses to run the driver."""
+    return '{} -m {}'.format(sys.executable, __name__)
+
+
+def write_driver_config(run_directory, dakota_parameters, experiment,
+                        options, functions, config_file='HYDRO.IN'):
+    """Write the configuration of the driver for an experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The run directory of the experiment, where the template and
+      auxiliary files are found.
+    dakota_parameters : dict
+      The Dakota parameters of the experiment.
+    experiment : dict
+      The experiment parameters.
+    options : dict
+      The experiment options handled by this package.
+    functions : list of tuple
+      The ``(descriptor, statistic, label)`` of each response function.
+    config_file : str, optional
+      The name of the model configuration file rendered from the
+      template.
+
+    Returns
+    -------
+    str
+      Path to the driver configuration file.
+
+    """
+    run_directory = os.path.abspath(run_directory)
+    cache = options.get('evaluation_cache')
+    warm_start = options.get('warm_start')
+    if warm_start:
+        if options.get('output_format') == 'binary':
+            raise ValueError('warm_start does not work with binary output')
+        check_component(dakota_parameters['component'])
+        warm_start = dict(warm_start)
+        warm_start['store'] = os.path.abspath(
+            warm_start.get('store', os.path.join(run_directory, 'spinup')))
+        warm_start.pop('validate', None)
+    profiling = options.get('profiling') or None
+    if profiling is True:
+        profiling = {}
+    staging = options.get('staging', 'link')
+    if staging not in STAGING_MODES:
+        raise ValueError('unknown staging mode: {}'.format(staging))
+    auxiliary_files = as_list(dakota_parameters.get('auxiliary_files'))
+    shared_inputs = None
+    if staging != 'copy':
+        shared_inputs = share_inputs(run_directory, auxiliary_files)
+    config = {
+        'run_directory': run_directory,
+        'component': dakota_parameters['component'],
+        'template_file': dakota_parameters['template_file'],
+        'config_file': config_file,
+        'auxiliary_files': auxiliary_files,
+        'staging': staging,
+        'shared_inputs': shared_inputs,
+        'run_duration': experiment.get('run_duration'),
+        'response_functions': [[descriptor, statistic]
+                               for descriptor, statistic, _ in functions],
+        'response_levels': as_list(dakota_parameters.get('response_levels')),
+        'evaluation_cache': cache and os.path.abspath(cache),
+        'streaming_responses': bool(options.get('streaming_responses')),
+        'output_format': options.get('output_format', 'ascii'),
+        'output_variables': as_list(options.get('output_variables')),
+        'retention': options.get('retention'),
+        'warm_start': warm_start,
+        'profiling': profiling,
+        }
+    path = os.path.join(run_directory, DRIVER_CONFIG_FILE)
+    with open(path, 'w') as fp:
+        json.dump(config, fp, indent=2, sort_keys=True)
+    return path
+
+
+def as_list(value):
+    """Wrap a scalar experiment parameter in a list."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def render_template(template_file, variables):
+    """Substitute variable values into a model configuration template."""
+    return compile_template(template_file).render(variables)
+
+
+def stream_responses(config, functions, names, spool=None, rows=None):
+    """Run the model, reducing its output to responses as it steps.
+
+    Parameters
+    ----------
+    config : dict
+      The driver configuration.
+    functions : list of tuple
+      The ``(descriptor, statistic)`` of each response function.
+    names : list of str
+      The output variables to get from the model.
+    spool : SeriesSpool, optional
+      A spool to write the output series to the evaluation cache.
+    rows : iterable of list, optional
+      The output of the model at each step, if not from a cold run of
+      the model, e.g. from a warm start.
+
+    Returns
+    -------
+    list of float
+      The value of each response function.
+
+    """
+    threshold = (config['response_levels'] or [None])[0]
+    reducers = [(names.index(descriptor), make_reducer(stat, threshold))
+                for descriptor, stat in functions]
+    if rows is None:
+        rows = iter_model(config['component'], config['config_file'],
+                          os.getcwd(), names)
+    for values in rows:
+        for column, reducer in reducers:
+            reducer.update(values[column])
+        if spool is not None:
+            spool.append(values)
+    if spool is not None:
+        spool.commit()
+    return [float(reducer.result()) for _, reducer in reducers]
+
+
+def reduce_series(functions, series, threshold=None):
+    """Compute response functions from output series with reducers."""
+    values = []
+    for descriptor, stat in functions:
+        reducer = make_reducer(stat, threshold)
+        for value in series[descriptor].tolist():
+            reducer.update(value)
+        values.append(float(reducer.result()))
+    return values
+
+
+def run_evaluation(params_file, results_file):
+    """Run an evaluation in the current directory.
+
+    Parameters
+    ----------
+    params_file : str
+      The Dakota parameters file.
+    results_file : str
+      The results file to write.
+
+    """
+    timer = PhaseTimer()
+    params = read_params_file(params_file)
+    with open(params['analysis_components'][0], 'r') as fp:
+        config = json.load(fp)
+
+    if config.get('profiling') is None:
+        evaluate(params_file, results_file, params, config, timer)
+        return
+    with EvaluationProfile(**config['profiling']) as profile:
+        evaluated = evaluate(params_file, results_file, params, config,
+                             timer)
+    if evaluated:
+        profile.write()
+
+
+def evaluate(params_file, results_file, params, config, timer):
+    """Run an evaluation in the current directory, once configured.
+
+    Parameters
+    ----------
+    params_file : str
+      The Dakota parameters file.
+    results_file : str
+      The results file to write.
+    params : dict
+      The contents of the parameters file.
+    config : dict
+      The driver configuration.
+    timer : PhaseTimer
+      The timer of the phases of the evaluation.
+
+    Returns
+    -------
+    bool
+      False if the evaluation was finished by an earlier attempt, and
+      its results were written without running it.
+
+    """
+    run_directory = config['run_directory']
+    with timer.phase('render'):
+        text = render_template(
+            os.path.join(run_directory, config['template_file']),
+            params['variables'])
+
+    digest = evaluation_digest(params, text, config)
+    values = read_completion(os.curdir, digest)
+    if values is not None:
+        write_results_file(results_file, values,
+                           params['response_descriptors'])
+        return False
+
+    with timer.phase('stage'):
+        config_text = model_config_text(config, text)
+        if not is_staged(os.curdir, config_text):
+            stage_directory(os.curdir, config, config_text)
+        auxiliary_files = [os.path.join(run_directory, name)
+                           for name in config['auxiliary_files']]
+
+    functions = config['response_functions']
+    names = sorted(set(descriptor for descriptor, _ in functions))
+    threshold = (config['response_levels'] or [None])[0]
+    binary_output = config['output_format'] == 'binary'
+
+    cache, series = None, None
+    if config['evaluation_cache']:
+        cache = EvaluationCache(config['evaluation_cache'])
+        key = evaluation_key(text, auxiliary_files, config['run_duration'],
+                             config['component'])
+        metadata = {
+            'component': config['component'],
+            'run_duration': config['run_duration'],
+            'variables': params['variables'],
+            }
+        with timer.phase('model'):
+            series = cache.get(key, names)
+
+    warm = None
+    if series is None and config.get('warm_start'):
+        warm = WarmStart(config, params['variables'], names)
+
+    if series is None and binary_output:
+        path = os.path.abspath(SERIES_FILE)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        outputs = names + [name for name in config['output_variables']
+                           if name not in names]
+        with timer.phase('model'):
+            series = run_model_to_file(config['component'],
+                                       config['config_file'], os.getcwd(),
+                                       outputs, path).as_dict()
+            if cache is not None:
+                cache.put(key, series, metadata=metadata)
+
+    if series is not None and config['streaming_responses']:
+        # Use the same estimators as a streaming run, so responses don't
+        # depend on whether the evaluation was found in the cache.
+        with timer.phase('responses'):
+            values = reduce_series(functions, series, threshold=threshold)
+    elif series is not None:
+        with timer.phase('responses'):
+            values = compute_responses(functions, series,
+                                       threshold=threshold)
+    elif config['streaming_responses']:
+        # The responses are reduced as the model steps, so the time
+        # is counted as model time. A warm start may not reproduce a
+        # cold run, so its output isn't cached.
+        spool, rows = None, None
+        if warm is not None:
+            rows = warm.steps()
+        elif cache is not None:
+            spool = cache.spool(key, names, metadata=metadata)
+        with timer.phase('model'):
+            values = stream_responses(config, functions, names,
+                                      spool=spool, rows=rows)
+    elif warm is not None:
+        with timer.phase('model'):
+            series = collect_series(warm.steps(), names)
+            if cache is not None and warm.exact:
+                cache.put(key, series, metadata=metadata)
+        with timer.phase('responses'):
+            values = compute_responses(functions, series,
+                                       threshold=threshold)
+    else:
+        with timer.phase('model'):
+            series = run_model(config['component'], config['config_file'],
+                               os.getcwd(), names)
+            if cache is not None:
+                cache.put(key, series, metadata=metadata)
+        with timer.phase('responses'):
+            values = compute_responses(functions, series,
+                                       threshold=threshold)
+
+    if warm is not None:
+        timer.details['warm_start'] = warm.details
+
+    with timer.phase('results'):
+        write_results_file(results_file, values,
+                           params['response_descriptors'])
+        write_completion(os.curdir, digest, values)
+
+        if config['retention'] is not None:
+            apply_retention(run_directory,
+                            RetentionPolicy(**config['retention']),
+                            eval_directory=os.getcwd())
+    timer.write(params_file=params_file)
+    return True
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m {} params_file results_file'.format(
+            __name__))
+    run_evaluation(sys.argv[1], sys.argv[2])
+
+
+if __name__ == '__main__':
+    main()
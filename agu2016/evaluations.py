@@ -0,0 +1,151 @@
+"""Inspect the run directories of Dakota evaluations.
+
+Dakotathon configures the fork interface with ``work_directory named
+'run' directory_tag``, so every evaluation runs in its own, isolated
+directory, ``run.1``, ``run.2``, and so on, holding the parameters file
+written by Dakota and the results file written by the analysis driver.
+
+"""
+import os
+import re
+
+from .dakota_output import read_wall_clock
+
+
+PARAMETERS_FILE = 'params.in'
+RESULTS_FILE = 'results.out'
+TIMING_FILE = 'timing.json'
+COMPLETION_FILE = 'evaluation.json'
+PROFILE_FILE = 'profile.json'
+
+
+def list_run_directories(run_directory, work_directory='run'):
+    """Find the evaluation directories of a Dakota experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota was run.
+    work_directory : str, optional
+      The name given to the work directories (default is 'run').
+
+    Returns
+    -------
+    list of tuple
+      The ``(eval_id, path)`` pairs of the evaluation directories,
+      sorted by evaluation id.
+
+    """
+    pattern = re.compile(re.escape(work_directory) + r'\.(\d+)$')
+    dirs = []
+    for name in os.listdir(run_directory):
+        match = pattern.match(name)
+        path = os.path.join(run_directory, name)
+        if match and os.path.isdir(path):
+            dirs.append((int(match.group(1)), path))
+    return sorted(dirs)
+
+
+def evaluation_wall_time(eval_directory):
+    """Get the wall time of a finished evaluation, in seconds.
+
+    Dakota writes the parameters file when it starts an evaluation
+    and the analysis driver writes the results file when it's done,
+    so the difference of their modification times is the time the
+    evaluation took, including the fork.
+
+    Returns
+    -------
+    float or None
+      The wall time, or None if the evaluation hasn't finished.
+
+    """
+    params_file = os.path.join(eval_directory, PARAMETERS_FILE)
+    results_file = os.path.join(eval_directory, RESULTS_FILE)
+    try:
+        return os.path.getmtime(results_file) - os.path.getmtime(params_file)
+    except OSError:
+        return None
+
+
+def speedup_report(run_directory, evaluation_concurrency=1,
+                   output_file='dakota.out', serial_output_file=None,
+                   started=None):
+    """Report the speedup from running evaluations concurrently.
+
+    The time a serial run would have taken is estimated as the sum of
+    the wall times of the individual evaluations. If the output file
+    of a serial run of the same experiment is given, its wall clock
+    time is used instead.
+
+    Only the evaluations the driver ran since the run `started` are
+    counted: those replayed from a restart file or from an earlier
+    attempt's recorded responses don't write a new timing file, and
+    ``run.N`` directories left by earlier attempts have older ones.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota was run.
+    evaluation_concurrency : int, optional
+      The number of concurrent evaluations used in the run.
+    output_file : str, optional
+      The Dakota output file of the run.
+    serial_output_file : str, optional
+      The Dakota output file of a serial run of the experiment.
+    started : float, optional
+      When the run started, in seconds since the epoch (default is
+      to count every evaluation with a timing file).
+
+    Returns
+    -------
+    dict
+      The number of evaluations, the serial and concurrent wall clock
+      times, the speedup and the parallel efficiency.
+
+    """
+    times = []
+    for _, path in list_run_directories(run_directory):
+        try:
+            timed = os.path.getmtime(os.path.join(path, TIMING_FILE))
+        except OSError:
+            continue
+        if started is not None and timed < started:
+            continue
+        wall_time = evaluation_wall_time(path)
+        if wall_time is not None:
+            times.append(wall_time)
+
+    if serial_output_file is None:
+        serial_time = sum(times)
+    else:
+        serial_time = read_wall_clock(serial_output_file)
+    wall_clock = read_wall_clock(os.path.join(run_directory, output_file))
+
+    report = {
+        'evaluations': len(times),
+        'evaluation_concurrency': evaluation_concurrency,
+        'serial_time': serial_time,
+        'wall_clock': wall_clock,
+        'speedup': None,
+        'efficiency': None,
+        }
+    if wall_clock and serial_time:
+        report['speedup'] = serial_time / wall_clock
+        report['efficiency'] = report['speedup'] / evaluation_concurrency
+    return report
+
+
+def format_speedup_report(report):
+    """Format a speedup report for the console."""
+    lines = ['Evaluations: {evaluations}'.format(**report),
+             'Evaluation concurrency: {evaluation_concurrency}'.format(
+                 **report)]
+    if report['speedup'] is None:
+        lines.append('Speedup: unavailable (run did not finish)')
+    else:
+        lines += ['Serial time: {serial_time:.2f} s'.format(**report),
+                  'Wall clock: {wall_clock:.2f} s'.format(**report),
+                  'Speedup: {speedup:.2f}x'.format(**report),
+                  'Efficiency: {efficiency:.0%}'.format(**report)]
+    return '\n'.join(lines)
@@ -0,0 +1,643 @@
+"""Configure and run a Dakotathon experiment.
+
+An experiment is a dict of Dakota and model parameters, as described
+in the study scripts. In addition to the parameters understood by
+Dakotathon, an experiment may set:
+
+evaluation_concurrency
+  The number of model evaluations to run at once on the local host.
+  Use an integer, or 'auto' for the number of cores. If not given,
+  evaluations are run one at a time with a blocking fork.
+
+evaluation_cache
+  A directory, usually shared by studies, where the output series of
+  every Hydrotrend evaluation are cached by the exact inputs of the
+  run (see `agu2016.cache`). Evaluations found in the cache aren't
+  run again; only their response statistics are computed.
+
+streaming_responses
+  If True, compute the response statistics as the model steps, in
+  constant memory, and don't write Hydrotrend's ASCII output files.
+  Medians and quantiles are estimated with a streaming sketch.
+
+output_format
+  'ascii' (the default) to keep Hydrotrend's ASCII output files, or
+  'binary' to write the output series of each evaluation to a
+  memory-mapped series file, `HYDRO_OUTPUT/hydrotrend.bin`, from
+  which the responses are read (see `agu2016.series`).
+
+output_variables
+  Output variables to write to the series file in addition to the
+  response descriptors.
+
+retention
+  A policy for what to keep of the evaluations' run directories, in
+  place of Dakotathon's ``directory_save`` and ``file_save``, which
+  keep everything: by default only the parameters and results files,
+  optionally with the compressed output of the most extreme
+  evaluations, within a disk budget (see `agu2016.retention`).
+
+staging
+  How each evaluation gets the auxiliary files: 'link' (the default)
+  to hard link them from a read-only copy shared by the evaluations,
+  falling back to symbolic links and then copies where the file system
+  doesn't allow it, 'symlink' for symbolic links, or 'copy' to copy
+  them (see `agu2016.staging`).
+
+warm_start
+  Restore each evaluation's model from a snapshot of its state after
+  a spin-up period, rather than running it from the start (see
+  `agu2016.warmstart`). A dict with 'spinup_years', and optionally the
+  'store' of snapshots (default `spinup` in the run directory),
+  'max_distance', the largest relative difference of the variables
+  for which a snapshot is used (default 0.05, or None for any
+  snapshot, so that every evaluation shares one spin-up), and
+  'validate', the number of warm started evaluations to compare with
+  cold runs when the experiment is done. The output of the spin-up
+  years comes from the snapshot's point, and counts toward responses
+  such as the maximum over the run. The model must be able to save and
+  restore its state, and the output_format must not be 'binary'.
+
+progress_interval
+  Seconds between progress reports while the experiment runs
+  (default 30), or 0 for none. The number of evaluations completed,
+  their wall times, the time spent in the model and in overhead, and
+  an estimate of the time remaining are written to `progress.json` in
+  the run directory and printed (see `agu2016.monitor`).
+
+resume
+  If True (the default), resume an earlier attempt of the experiment
+  that was interrupted: the model isn't set up again if its
+  parameters are unchanged, Dakota replays the evaluations in the
+  earlier attempt's restart file, and
+  evaluations the driver finished are not run again (see
+  `agu2016.restart`). Set to False to run every evaluation.
+
+vectorized_driver
+  Evaluate all of the points of the method at once, in this process,
+  with a Python function of the matrix of points, rather than forking
+  the analysis driver for each point (see `agu2016.vectorized`). Use
+  the name of a driver, such as 'rosenbrock', or 'module:function'.
+
+adaptive_sampling
+  Grow the Latin hypercube design of a sampling study in batches until
+  its statistics converge, rather than running a fixed number of
+  samples (see `agu2016.adaptive`). A dict with a tolerance,
+  'ci_width' or 'exceedance_tolerance', and optionally
+  'initial_samples', 'max_samples' and 'response'. The batches are
+  run with the batch_scheduler, by default 'local'.
+
+surrogate
+  Estimate the exceedance probability of the first response level,
+  and the recurrence interval of threshold counts, from a polynomial
+  chaos surrogate fitted to a small design of model runs and refined
+  near the level (see `agu2016.surrogate`). A dict of the parameters
+  of `run_surrogate`, such as 'initial_samples', 'order' and
+  'surrogate_samples'; the model runs use the batch_scheduler, by
+  default 'local'.
+
+screening
+  Rank the uncertain inputs by their elementary effects on a response
+  from a small design of Morris trajectories, rather than run the
+  method, and fix the inputs with little effect at nominal values
+  (see `agu2016.screening`). A dict of the parameters of
+  `run_screening`, such as 'trajectories' or a 'budget' of model runs,
+  and 'keep' or 'threshold'. The ranking and the reduced experiment
+  for a follow-up study are written to `screening.json`; the model
+  runs use the batch_scheduler, by default 'local'.
+
+polynomial_chaos
+  How a polynomial chaos study computes the coefficients of its
+  expansion, in place of Dakotathon's tensor-product quadrature: a
+  dict with a 'sparse_grid_level', a nested 'quadrature_order', or an
+  'expansion_order' or 'sample_budget' for regression, and their
+  settings (see `agu2016.pce`). With nested rules, running the study
+  again at a higher level or order only runs the new points.
+
+workers
+  Run the evaluations in a pool of long-lived worker processes that
+  import the driver and load the model once, rather than in a fresh
+  process each, with Dakota forking a thin client that hands each
+  evaluation to the pool (see `agu2016.workers`). Use True for as many
+  workers as evaluations run at once, an integer, or 'auto' for the
+  number of cores.
+
+results_store
+  A directory, usually shared by studies, of a columnar store with a
+  row for every evaluation of every study: its variables, responses,
+  phase timings and run directory (see `agu2016.store`). Finished
+  evaluations are appended at each progress report and when the
+  experiment is done.
+
+profiling
+  Profile each evaluation: sample its Python call stacks and time the
+  calls of the model's ``initialize``, ``update``, ``get_value`` and
+  ``finalize``, writing `profile.json` in its run directory (see
+  `agu2016.profiling`). Use True, or a dict with the 'interval' in
+  seconds between samples. When the experiment is done, the profiles
+  are merged into a report of the hot paths, printed, and their
+  stacks are written to `profile.folded` for flame graph tools.
+
+batch_scheduler
+  Run the evaluations as batch jobs instead of having Dakota fork
+  them (see `agu2016.batch`). Use 'local' to run them in a pool of
+  local processes, 'queue' to submit them to a cluster queue, or a
+  dict with the scheduler name under 'scheduler' and its parameters,
+  e.g. ``{'scheduler': 'queue', 'submit_command': 'qsub'}``.
+
+"""
+import os
+import time
+import multiprocessing
+
+from dakotathon.utils import configure_parameters
+
+from .adaptive import run_adaptive, format_adaptive_report
+from .batch import get_scheduler, run_batch
+from .dakota_input import insert_keywords, set_keyword_values
+from .driver import DRIVER_CONFIG_FILE, driver_command, write_driver_config
+from .responses import response_functions
+from .restart import (experiment_fingerprint, previous_restart,
+                      previous_setup, record_setup, run_dakota,
+                      setup_fingerprint)
+from .retention import RetentionPolicy, apply_retention
+from .screening import (run_screening, format_screening_report,
+                        write_reduced_experiment)
+from .surrogate import run_surrogate, format_surrogate_report
+from .vectorized import run_vectorized
+from .warmstart import validate_warm_start, format_validation_report
+from .evaluations import speedup_report, format_speedup_report
+from .monitor import ProgressMonitor, expected_evaluations
+from .pce import set_coefficient_estimation
+from .profiling import profile_study, format_profile_report
+from .store import ResultsStore, ingest_study
+from .workers import WorkerPool, client_command, shared_workers_file
+
+
+EXPERIMENT_OPTIONS = ('evaluation_concurrency', 'batch_scheduler',
+                      'evaluation_cache', 'streaming_responses',
+                      'output_format', 'output_variables', 'retention',
+                      'progress_interval', 'resume', 'adaptive_sampling',
+                      'surrogate', 'vectorized_driver', 'warm_start',
+                      'staging', 'polynomial_chaos', 'workers',
+                      'results_store', 'screening', 'profiling')
+
+
+def split_experiment(experiment):
+    """Separate the options handled here from the Dakotathon parameters.
+
+    Parameters
+    ----------
+    experiment : dict
+      The experiment parameters.
+
+    Returns
+    -------
+    tuple of dict
+      The parameters to pass to Dakotathon and the experiment options.
+
+    """
+    parameters, options = {}, {}
+    for key, value in experiment.items():
+        if key in EXPERIMENT_OPTIONS:
+            options[key] = value
+        else:
+            parameters[key] = value
+    return parameters, options
+
+
+def get_evaluation_concurrency(experiment):
+    """Get the number of concurrent evaluations requested by an experiment.
+
+    Parameters
+    ----------
+    experiment : dict
+      The experiment parameters.
+
+    Returns
+    -------
+    int
+      The number of evaluations to run at once.
+
+    """
+    _, options = split_experiment(experiment)
+    concurrency = options.get('evaluation_concurrency') or 1
+    if concurrency == 'auto':
+        concurrency = multiprocessing.cpu_count()
+    concurrency = int(concurrency)
+    if concurrency < 1:
+        raise ValueError('evaluation_concurrency must be at least 1')
+    return concurrency
+
+
+def set_evaluation_concurrency(input_file, concurrency):
+    """Configure a Dakota input file for asynchronous evaluations.
+
+    Each evaluation already runs in its own tagged work directory, so
+    evaluations that run at once don't share files.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file.
+    concurrency : int
+      The number of evaluations to run at once.
+
+    """
+    if concurrency > 1:
+        insert_keywords(input_file, 'interface',
+                        ['asynchronous',
+                         '  evaluation_concurrency = {}'.format(concurrency)],
+                        after='fork')
+
+
+LEVELS = ('response_levels', 'probability_levels')
+
+
+def set_response_functions(parameters, functions):
+    """Set up the Dakota responses of an experiment's response functions.
+
+    Each response function gets its own Dakota response descriptor.
+    When there are several functions, response and probability levels
+    given as a flat list apply to every function; a list of lists
+    gives the levels of each function.
+
+    Parameters
+    ----------
+    parameters : dict
+      The Dakotathon parameters of the experiment.
+    functions : list of tuple
+      The ``(descriptor, statistic, label)`` of each response function.
+
+    Returns
+    -------
+    tuple
+      The updated parameters, and the number of levels of each kind
+      for each response function, to be set in the Dakota input file.
+
+    """
+    parameters = dict(parameters)
+    parameters['response_descriptors'] = [label for _, _, label in functions]
+    parameters['response_statistics'] = [stat for _, stat, _ in functions]
+
+    counts = {}
+    for key in LEVELS:
+        levels = parameters.get(key)
+        if not levels or len(functions) == 1:
+            continue
+        if not isinstance(levels[0], (list, tuple)):
+            levels = [levels] * len(functions)
+        if len(levels) != len(functions):
+            raise ValueError('{} must be given for each response '
+                             'function'.format(key))
+        parameters[key] = [level for group in levels for level in group]
+        counts[key] = [len(group) for group in levels]
+    return parameters, counts
+
+
+def set_level_counts(input_file, counts):
+    """Set the number of levels of each response function."""
+    for key, values in counts.items():
+        line = 'num_{} = {}'.format(key, ' '.join(map(str, values)))
+        insert_keywords(input_file, 'method', [line], after=key)
+
+
+def use_driver(input_file, driver_config, workers=False):
+    """Have Dakota run evaluations with the driver of this package.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file.
+    driver_config : str
+      Path to the driver configuration file.
+    workers : bool, optional
+      If True, run the thin client of a worker pool in place of the
+      driver.
+
+    """
+    command = client_command() if workers else driver_command()
+    set_keyword_values(input_file, 'interface', 'analysis_driver',
+                       [command])
+    set_keyword_values(input_file, 'interface', 'analysis_components',
+                       [driver_config])
+
+    # Let the driver import this package from the evaluation directories.
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = os.environ.get('PYTHONPATH')
+    os.environ['PYTHONPATH'] = (package_root + os.pathsep + path if path
+                                else package_root)
+
+
+class _NullContext(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def monitor_progress(run_directory, input_file, options, concurrency=1):
+    """Get a progress monitor for a run of an experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    input_file : str
+      The Dakota input file, relative to the run directory.
+    options : dict
+      The experiment options handled by this package.
+    concurrency : int, optional
+      The number of evaluations run at once.
+
+    Returns
+    -------
+    ProgressMonitor
+      A monitor to use as a context manager around the run, which does
+      nothing if the experiment's progress_interval is 0.
+
+    """
+    interval = options.get('progress_interval', 30.)
+    if not interval:
+        return _NullContext()
+    on_update = None
+    if options.get('results_store'):
+        store = ResultsStore(options['results_store'])
+
+        def on_update(report):
+            ingest_study(store, run_directory, input_file=input_file,
+                         timed=True)
+
+    total = expected_evaluations(os.path.join(run_directory, input_file))
+    return ProgressMonitor(run_directory, total=total,
+                           concurrency=concurrency, interval=interval,
+                           on_update=on_update)
+
+
+def worker_pool(run_directory, dakota_parameters, options, concurrency=1):
+    """Get the pool of worker processes for a run of an experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    dakota_parameters : dict
+      The Dakota parameters of the experiment.
+    options : dict
+      The experiment options handled by this package.
+    concurrency : int, optional
+      The number of evaluations run at once.
+
+    Returns
+    -------
+    WorkerPool
+      A pool to use as a context manager around the run, or a context
+      that does nothing if the experiment doesn't use workers, or they
+      are shared with other studies and already running.
+
+    """
+    workers = options.get('workers')
+    if (not workers or 'component' not in dakota_parameters or
+            shared_workers_file()):
+        return _NullContext()
+    if workers is True:
+        processes = concurrency
+    elif workers == 'auto':
+        processes = multiprocessing.cpu_count()
+    else:
+        processes = int(workers)
+    return WorkerPool(run_directory, processes=processes,
+                      components=[dakota_parameters['component']])
+
+
+def validate_experiment(run_directory, options):
+    """Compare warm-started evaluations with cold runs, if requested."""
+    samples = (options.get('warm_start') or {}).get('validate')
+    if samples:
+        report = validate_warm_start(run_directory, samples=samples)
+        print(format_validation_report(report))
+
+
+def setup_experiment(dakota, experiment, model=None):
+    """Set up a model and Dakota for an experiment.
+
+    The model, if given, is set up in the current directory and its
+    configuration file is renamed to be used as the Dakota template
+    file. If the experiment is resumed and an earlier attempt set up
+    the same model with the same parameters, the model isn't set up
+    again, and the template file it made is used. A template that no
+    setup recorded, such as the one archived with a study's results,
+    is replaced.
+
+    Parameters
+    ----------
+    dakota : Dakota component
+      A Dakotathon method, such as `Sampling`.
+    experiment : dict
+      The experiment parameters.
+    model : Component, optional
+      The model to run in each evaluation.
+
+    Returns
+    -------
+    dict
+      The Dakota parameters of the experiment.
+
+    """
+    parameters, options = split_experiment(experiment)
+    dakota_parameters, model_parameters = configure_parameters(parameters)
+
+    if model is None:
+        dakota_parameters.setdefault('run_directory', '.')
+    else:
+        cfg_file = 'HYDRO.IN'  # get from pymt eventually
+        dakota_tmpl_file = cfg_file + '.dtmpl'
+        fingerprint = setup_fingerprint(type(model).__name__,
+                                        model_parameters)
+        if options.get('resume', True) and previous_setup(
+                os.getcwd(), dakota_tmpl_file, fingerprint):
+            dakota_parameters['run_directory'] = os.getcwd()
+        else:
+            dakota_parameters['run_directory'] = model.setup(
+                os.getcwd(), **model_parameters)
+            os.rename(cfg_file, dakota_tmpl_file)
+            record_setup(os.getcwd(), dakota_tmpl_file, fingerprint)
+        dakota_parameters['template_file'] = dakota_tmpl_file
+
+    dakota.setup(dakota_parameters['run_directory'], **dakota_parameters)
+
+    return dakota_parameters
+
+
+def run_experiment(dakota, experiment, model=None,
+                   config_file='dakota.yaml'):
+    """Set up and run a Dakotathon experiment.
+
+    Parameters
+    ----------
+    dakota : Dakota component
+      A Dakotathon method, such as `Sampling`.
+    experiment : dict
+      The experiment parameters.
+    model : Component, optional
+      The model to run in each evaluation.
+    config_file : str, optional
+      The Dakota configuration file written by the setup step.
+
+    Returns
+    -------
+    str
+      The directory where Dakota was run.
+
+    """
+    parameters, options = split_experiment(experiment)
+    concurrency = get_evaluation_concurrency(experiment)
+    functions = None
+    if model is not None:
+        functions = response_functions(parameters['response_descriptors'],
+                                       parameters['response_statistics'],
+                                       parameters.get('response_levels'))
+        parameters, level_counts = set_response_functions(parameters,
+                                                          functions)
+    dakota_parameters = setup_experiment(dakota, dict(parameters, **options),
+                                         model=model)
+    run_directory = dakota_parameters['run_directory']
+    input_file = dakota_parameters.get('input_file', 'dakota.in')
+
+    dakota.initialize(config_file)
+    if options.get('polynomial_chaos'):
+        set_coefficient_estimation(os.path.join(run_directory, input_file),
+                                   options['polynomial_chaos'])
+    if model is not None:
+        driver_config = write_driver_config(run_directory, dakota_parameters,
+                                            parameters, options, functions)
+        use_driver(os.path.join(run_directory, input_file), driver_config,
+                   workers=bool(options.get('workers')))
+        set_level_counts(os.path.join(run_directory, input_file),
+                         level_counts)
+
+    with worker_pool(run_directory, dakota_parameters, options, concurrency):
+        try:
+            run_method(dakota, dakota_parameters, parameters, options,
+                       concurrency, functions=functions)
+        finally:
+            dakota.finalize()
+    if options.get('retention') and model is not None:
+        apply_retention(run_directory,
+                        RetentionPolicy(**options['retention']))
+    if options.get('results_store'):
+        ingest_study(ResultsStore(options['results_store']), run_directory,
+                     input_file=input_file,
+                     tabular_file=dakota_parameters.get('data_file',
+                                                        'dakota.dat'))
+    if options.get('screening'):
+        write_reduced_experiment(run_directory, experiment)
+    if options.get('profiling') and model is not None:
+        print(format_profile_report(profile_study(run_directory)))
+    return run_directory
+
+
+def run_method(dakota, dakota_parameters, parameters, options,
+               concurrency=1, functions=None):
+    """Run the method of an experiment that has been set up.
+
+    Parameters
+    ----------
+    dakota : Dakota component
+      A Dakotathon method, initialized. It's left to the caller to
+      finalize.
+    dakota_parameters : dict
+      The Dakota parameters of the experiment.
+    parameters : dict
+      The Dakotathon parameters of the experiment.
+    options : dict
+      The experiment options handled by this package.
+    concurrency : int, optional
+      The number of evaluations to run at once.
+    functions : list of tuple, optional
+      The ``(descriptor, statistic, label)`` of each response function
+      of the model, if there is one.
+
+    """
+    run_directory = dakota_parameters['run_directory']
+    input_file = dakota_parameters.get('input_file', 'dakota.in')
+    output_file = dakota_parameters.get('output_file', 'dakota.out')
+    if options.get('vectorized_driver'):
+        run_vectorized(input_file, options['vectorized_driver'],
+                       run_directory=run_directory, output_file=output_file,
+                       tabular_file=dakota_parameters.get('data_file',
+                                                          'dakota.dat'))
+        return
+    if options.get('adaptive_sampling'):
+        scheduler = get_scheduler(options.get('batch_scheduler') or 'local')
+        with monitor_progress(run_directory, input_file, options,
+                              concurrency):
+            report = run_adaptive(
+                input_file, scheduler, run_directory=run_directory,
+                output_file=output_file,
+                tabular_file=dakota_parameters.get('data_file', 'dakota.dat'),
+                **options['adaptive_sampling'])
+        print(format_adaptive_report(report))
+        return
+    if options.get('surrogate'):
+        scheduler = get_scheduler(options.get('batch_scheduler') or 'local')
+        surrogate = dict(options['surrogate'])
+        if functions is not None and functions[surrogate.get('response', 0)][
+                1].startswith('threshold_count'):
+            surrogate.setdefault('run_duration', parameters['run_duration'])
+        with monitor_progress(run_directory, input_file, options,
+                              concurrency):
+            report = run_surrogate(
+                input_file, scheduler, run_directory=run_directory,
+                output_file=output_file,
+                tabular_file=dakota_parameters.get('data_file', 'dakota.dat'),
+                **surrogate)
+        print(format_surrogate_report(report))
+        return
+    if options.get('screening'):
+        scheduler = get_scheduler(options.get('batch_scheduler') or 'local')
+        with monitor_progress(run_directory, input_file, options,
+                              concurrency):
+            report = run_screening(
+                input_file, scheduler, run_directory=run_directory,
+                tabular_file=dakota_parameters.get('data_file', 'dakota.dat'),
+                **options['screening'])
+        print(format_screening_report(report))
+        return
+    if options.get('batch_scheduler'):
+        with monitor_progress(run_directory, input_file, options,
+                              concurrency):
+            run_batch(input_file, get_scheduler(options['batch_scheduler']),
+                      run_directory=run_directory, output_file=output_file,
+                      tabular_file=dakota_parameters.get('data_file',
+                                                         'dakota.dat'))
+        validate_experiment(run_directory, options)
+        return
+
+    # The concurrency depends on the host, so it's left out of the
+    # fingerprint of the experiment.
+    restart_file = None
+    if options.get('resume', True):
+        fingerprint = experiment_fingerprint(
+            run_directory, [DRIVER_CONFIG_FILE,
+                            dakota_parameters.get('template_file', '')],
+            input_file=input_file)
+        restart_file = previous_restart(run_directory, fingerprint)
+
+    set_evaluation_concurrency(os.path.join(run_directory, input_file),
+                               concurrency)
+    started = time.time()
+    with monitor_progress(run_directory, input_file, options, concurrency):
+        if restart_file is None:
+            dakota.update()
+        else:
+            run_dakota(run_directory, input_file, output_file,
+                       read_restart=restart_file)
+
+    if concurrency > 1:
+        report = speedup_report(run_directory, concurrency,
+                                output_file=output_file, started=started)
+        print(format_speedup_report(report))
+    validate_experiment(run_directory, options)
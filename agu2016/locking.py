@@ -0,0 +1,34 @@
+"""Locks on files, shared by the processes of an experiment.
+
+Evaluations running at once, on one host or on the nodes of a batch
+queue that share the run directory, update the same files, such as
+the retention record of an experiment (see `agu2016.retention`) or the
+manifest of a results store (see `agu2016.store`). A `FileLock`
+serializes them.
+
+"""
+import fcntl
+
+
+class FileLock(object):
+
+    """Hold an exclusive lock on a file, shared by processes and hosts.
+
+    Parameters
+    ----------
+    path : str
+      The lock file; it's created if needed.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self._fp = open(self.path, 'a')
+        fcntl.flock(self._fp, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self._fp, fcntl.LOCK_UN)
+        self._fp.close()
@@ -0,0 +1,195 @@
+"""Run the models of an experiment and collect their output series."""
+import importlib
+
+import numpy as np
+
+from .profiling import active_profile
+from .series import SeriesFile, SeriesWriter
+
+
+def load_component(name):
+    """Get a component class by name.
+
+    Parameters
+    ----------
+    name : str
+      The name of a PyMT component, e.g. 'Hydrotrend', or the
+      ``'module:Class'`` path of a class with the same interface, such
+      as a stand-in for benchmarks.
+
+    """
+    if ':' in name:
+        module, _, name = name.partition(':')
+        return getattr(importlib.import_module(module), name)
+    # Import here, so evaluations found in a cache don't need PyMT.
+    from pymt import components
+    return getattr(components, name)
+
+
+class ModelRun(object):
+
+    """A model initialized in a run directory.
+
+    Parameters
+    ----------
+    component : str
+      The name of the PyMT component.
+    config_file : str
+      The model configuration file, in the run directory.
+    run_directory : str
+      The directory where the model is run.
+
+    """
+
+    def __init__(self, component, config_file, run_directory):
+        self.model = load_component(component)()
+        profile = active_profile()
+        if profile is not None:
+            self.model = profile.instrument(self.model)
+        self.model.initialize(config_file, run_directory)
+
+    def units(self, name):
+        """Get the units of an output variable."""
+        return self.model.get_var_units(name)
+
+    @property
+    def time_step(self):
+        return self.model.get_time_step()
+
+    @property
+    def time_units(self):
+        return self.model.get_time_units()
+
+    @property
+    def current_time(self):
+        return self.model.get_current_time()
+
+    def get_state(self):
+        """Get the state of the model, to restart it from later.
+
+        Only components with ``get_state`` and ``set_state`` methods
+        can be restarted.
+
+        """
+        return self.model.get_state()
+
+    def set_state(self, state):
+        """Restart the model from a state got with `get_state`."""
+        self.model.set_state(state)
+
+    def steps(self, names, until=None):
+        """Run the model, yielding output at each step.
+
+        Parameters
+        ----------
+        names : list of str
+          The output variables to get.
+        until : float, optional
+          Stop at this time, leaving the model to be run on, rather
+          than at the end time.
+
+        Yields
+        ------
+        list of float
+          The values of the output variables after each time step.
+
+        """
+        end = self.model.get_end_time()
+        if until is not None:
+            end = min(until, end)
+        try:
+            while self.model.get_current_time() < end:
+                self.model.update()
+                yield [np.ravel(self.model.get_value(name))[0]
+                       for name in names]
+        finally:
+            if until is None:
+                self.model.finalize()
+
+
+def iter_model(component, config_file, run_directory, names):
+    """Run a model to its end time, yielding output at each step.
+
+    See `ModelRun.steps`.
+
+    """
+    return ModelRun(component, config_file, run_directory).steps(names)
+
+
+def run_model(component, config_file, run_directory, names):
+    """Run a model to its end time, collecting output at each step.
+
+    Parameters
+    ----------
+    component : str
+      The name of the PyMT component.
+    config_file : str
+      The model configuration file, in the run directory.
+    run_directory : str
+      The directory where the model is run.
+    names : list of str
+      The output variables to collect.
+
+    Returns
+    -------
+    dict
+      The time series of each output variable.
+
+    """
+    return collect_series(iter_model(component, config_file, run_directory,
+                                     names), names)
+
+
+def collect_series(rows, names):
+    """Collect the output of a model run, step by step, into series.
+
+    Parameters
+    ----------
+    rows : iterable of list
+      The values of the output variables at each step.
+    names : list of str
+      The output variables.
+
+    Returns
+    -------
+    dict
+      The time series of each output variable.
+
+    """
+    series = [[] for _ in names]
+    for values in rows:
+        for column, value in zip(series, values):
+            column.append(value)
+    return dict((name, np.array(column))
+                for name, column in zip(names, series))
+
+
+def run_model_to_file(component, config_file, run_directory, names, path):
+    """Run a model to its end time, writing its output to a series file.
+
+    Parameters
+    ----------
+    component : str
+      The name of the PyMT component.
+    config_file : str
+      The model configuration file, in the run directory.
+    run_directory : str
+      The directory where the model is run.
+    names : list of str
+      The output variables to write.
+    path : str
+      Path to the series file (see `agu2016.series`).
+
+    Returns
+    -------
+    SeriesFile
+      The series file, memory-mapped for reading.
+
+    """
+    run = ModelRun(component, config_file, run_directory)
+    with SeriesWriter(path, names, units=[run.units(name) for name in names],
+                      time_step=run.time_step,
+                      time_units=run.time_units) as writer:
+        for values in run.steps(names):
+            writer.append(values)
+    return SeriesFile(path)
@@ -0,0 +1,411 @@
+"""Monitor the progress of a running experiment.
+
+The analysis driver records how long each phase of an evaluation took
+in a timing file, `timing.json`, in the evaluation's ``run.N``
+directory:
+
+render
+  Rendering the model configuration file from the template.
+stage
+  Copying the auxiliary files, such as ``HYDRO0.HYPS``.
+model
+  Running the model, or reading its output from the evaluation cache.
+responses
+  Computing the response functions from the output.
+results
+  Writing the results file, and applying the retention policy.
+
+The time from Dakota writing the parameters file to the driver
+starting, which is the cost of the fork and of starting Python, is
+recorded as the ``fork`` phase. The peak memory of the driver is
+recorded too.
+
+While an experiment runs, a `ProgressMonitor` periodically scans the
+run directories and writes the number of evaluations completed, the
+distribution of their wall times, the split of time between the model
+and the overhead of the other phases, and an estimate of the time
+remaining to a JSON file, `progress.json`, in the run directory of the
+experiment, and prints a summary to the console. Check on a running
+experiment from another shell with::
+
+  $ python -m agu2016.monitor path/to/run_directory
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import threading
+
+import numpy as np
+
+from .dakota_input import get_keyword_values, read_input_file, get_block
+from .evaluations import (list_run_directories, PARAMETERS_FILE,
+                          RESULTS_FILE, TIMING_FILE)
+from .pce import expected_points
+
+
+PROGRESS_FILE = 'progress.json'
+PHASES = ('fork', 'render', 'stage', 'model', 'responses', 'results')
+
+
+class PhaseTimer(object):
+
+    """Time the phases of an evaluation.
+
+    Examples
+    --------
+    >>> timer = PhaseTimer()
+    >>> with timer.phase('render'):
+    ...     pass
+    >>> sorted(timer.timings)
+    ['render']
+
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.timings = {}
+        self.details = {}
+        reset_peak_memory()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def write(self, timing_file=TIMING_FILE, params_file=PARAMETERS_FILE):
+        """Write the phase timings of the evaluation.
+
+        Any `details` of the evaluation, such as how it was warm
+        started, are written with them.
+
+        Parameters
+        ----------
+        timing_file : str, optional
+          The timing file to write.
+        params_file : str, optional
+          The parameters file written by Dakota, whose modification
+          time marks the start of the evaluation.
+
+        """
+        timings = dict(self.timings)
+        try:
+            timings['fork'] = max(self.started -
+                                  os.path.getmtime(params_file), 0.)
+        except OSError:
+            pass
+        record = {
+            'started': self.started,
+            'finished': time.time(),
+            'phases': timings,
+            'peak_memory': peak_memory(),
+            }
+        record.update(self.details)
+        with open(timing_file, 'w') as fp:
+            json.dump(record, fp, indent=2, sort_keys=True)
+
+
+def reset_peak_memory():
+    """Start measuring the peak memory of this process afresh.
+
+    Linux allows this, so that each evaluation run by a long-lived
+    worker, or by a process forked from a large one, has its own peak.
+
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as fp:
+            fp.write('5')
+    except (IOError, OSError):
+        pass
+
+
+def peak_memory():
+    """Get the peak resident memory of this process, in bytes.
+
+    On Linux, this is the high-water mark of the process's own
+    resident memory, since it started or since `reset_peak_memory`.
+    ``ru_maxrss`` isn't used there, as it's carried over from the
+    parent across fork and exec, so a driver forked by a large process
+    would report the parent's memory.
+
+    """
+    try:
+        with open('/proc/self/status', 'r') as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _Phase(object):
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        timings = self._timer.timings
+        timings[self._name] = (timings.get(self._name, 0.) +
+                               time.time() - self._start)
+
+
+def expected_evaluations(input_file):
+    """Get the number of evaluations a Dakota study will run.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file.
+
+    Returns
+    -------
+    int or None
+      The number of evaluations, if it can be known from the method
+      block: the samples of a sampling study, the steps of a vector
+      parameter study, or the quadrature or regression points of a
+      polynomial chaos expansion.
+
+    """
+    def value(keyword):
+        values = get_keyword_values(input_file, 'method', keyword)
+        return int(values[0]) if values else None
+
+    blocks = read_input_file(input_file)
+    names = [line.split()[0] for line in get_block(blocks, 'method')
+             if line.strip()]
+    if 'sampling' in names:
+        return value('samples')
+    if 'vector_parameter_study' in names:
+        steps = value('num_steps')
+        return steps + 1 if steps is not None else None
+    if 'polynomial_chaos' in names:
+        return expected_points(input_file)
+    return None
+
+
+def read_timing(eval_directory):
+    """Read the phase timings of an evaluation, or None if not written."""
+    try:
+        with open(os.path.join(eval_directory, TIMING_FILE), 'r') as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class ProgressScanner(object):
+
+    """Gather the progress of the evaluations of an experiment.
+
+    Finished evaluations are read once and remembered, so each scan
+    only reads the timing files of newly finished evaluations.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    total : int, optional
+      The number of evaluations the study will run.
+    concurrency : int, optional
+      The number of evaluations run at once.
+    started : float, optional
+      When the experiment started, in seconds since the epoch; the
+      default is now.
+
+    """
+
+    def __init__(self, run_directory, total=None, concurrency=1,
+                 started=None):
+        self.run_directory = run_directory
+        self.total = total
+        self.concurrency = concurrency
+        self.started = time.time() if started is None else started
+        self._finished = {}
+
+    def scan(self):
+        """Scan the run directories.
+
+        Returns
+        -------
+        dict
+          The progress of the experiment.
+
+        """
+        running = 0
+        for eval_id, path in list_run_directories(self.run_directory):
+            if eval_id in self._finished:
+                continue
+            if not os.path.isfile(os.path.join(path, RESULTS_FILE)):
+                running += 1
+                continue
+            timing = read_timing(path)
+            if timing is not None:
+                self._finished[eval_id] = timing
+            else:
+                running += 1
+        return self.report(running)
+
+    def report(self, running=0):
+        elapsed = time.time() - self.started
+        timings = list(self._finished.values())
+        completed = len(timings)
+
+        wall_times = np.array([
+            timing['finished'] - timing['started'] +
+            timing['phases'].get('fork', 0.) for timing in timings])
+        phases = dict((name, float(sum(timing['phases'].get(name, 0.)
+                                       for timing in timings)))
+                      for name in PHASES)
+        total_time = sum(phases.values())
+
+        report = {
+            'updated': time.time(),
+            'elapsed': elapsed,
+            'completed': completed,
+            'running': running,
+            'total': self.total,
+            'throughput': completed / elapsed if elapsed > 0 else None,
+            'wall_time': None,
+            'phases': phases,
+            'overhead_fraction': (1. - phases['model'] / total_time
+                                  if total_time > 0 else None),
+            'eta': None,
+            }
+        if completed:
+            report['wall_time'] = {
+                'mean': float(wall_times.mean()),
+                'min': float(wall_times.min()),
+                'median': float(np.median(wall_times)),
+                'p90': float(np.percentile(wall_times, 90)),
+                'max': float(wall_times.max()),
+                }
+            if self.total is not None:
+                remaining = max(self.total - completed, 0)
+                report['eta'] = (remaining * wall_times.mean() /
+                                 max(self.concurrency, 1))
+        return report
+
+
+def write_progress(run_directory, report, progress_file=PROGRESS_FILE):
+    """Write a progress report to the run directory, atomically."""
+    path = os.path.join(run_directory, progress_file)
+    with open(path + '.tmp', 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    os.rename(path + '.tmp', path)
+    return path
+
+
+def format_progress(report):
+    """Format a progress report for the console."""
+    total = report['total'] if report['total'] is not None else '?'
+    lines = ['Evaluations: {} of {} done, {} running, {:.0f} s elapsed'.format(
+        report['completed'], total, report['running'], report['elapsed'])]
+    if report['wall_time'] is not None:
+        lines.append('Wall time: mean {mean:.2f} s, median {median:.2f} s, '
+                     'p90 {p90:.2f} s, max {max:.2f} s'.format(
+                         **report['wall_time']))
+        phases = report['phases']
+        lines.append('Time: ' + ', '.join(
+            '{} {:.2f} s'.format(name, phases[name]) for name in PHASES) +
+            ' (overhead {:.0%})'.format(report['overhead_fraction'] or 0.))
+    if report['eta'] is not None:
+        lines.append('ETA: {:.0f} s'.format(report['eta']))
+    return '\n'.join(lines)
+
+
+class ProgressMonitor(object):
+
+    """Report the progress of an experiment while it runs.
+
+    Use the monitor as a context manager around the call that runs
+    Dakota; it scans the run directories in a background thread every
+    `interval` seconds, and once more when the run finishes.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    total : int, optional
+      The number of evaluations the study will run.
+    concurrency : int, optional
+      The number of evaluations run at once.
+    interval : float, optional
+      Seconds between progress reports.
+    stream : file, optional
+      Where to print progress summaries, or None for no summaries.
+    on_update : callable, optional
+      A function called with each progress report, such as one that
+      stores the newly finished evaluations.
+
+    """
+
+    def __init__(self, run_directory, total=None, concurrency=1,
+                 interval=30., stream=sys.stdout, on_update=None):
+        self.scanner = ProgressScanner(run_directory, total=total,
+                                       concurrency=concurrency)
+        self.interval = interval
+        self.stream = stream
+        self.on_update = on_update
+        self._stop = threading.Event()
+        self._thread = None
+
+    def update(self):
+        report = self.scanner.scan()
+        write_progress(self.scanner.run_directory, report)
+        if self.stream is not None:
+            self.stream.write(format_progress(report) + '\n')
+            self.stream.flush()
+        if self.on_update is not None:
+            self.on_update(report)
+        return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.update()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.update()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report the progress of a running experiment.')
+    parser.add_argument('run_directory', nargs='?', default=os.curdir,
+                        help='the run directory of the experiment')
+    parser.add_argument('--input-file', default='dakota.in',
+                        help='the Dakota input file')
+    args = parser.parse_args()
+
+    input_file = os.path.join(args.run_directory, args.input_file)
+    scanner = ProgressScanner(args.run_directory,
+                              total=expected_evaluations(input_file),
+                              started=os.path.getmtime(input_file))
+    report = scanner.scan()
+    print(format_progress(report))
+
+
+if __name__ == '__main__':
+    main()
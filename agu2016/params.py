@@ -0,0 +1,123 @@
+"""Read and write the files exchanged by Dakota and an analysis driver.
+
+For each evaluation, Dakota writes a parameters file holding the
+values of the variables, the response descriptors and the analysis
+components, runs the analysis driver, and reads the response values
+back from a results file.
+
+"""
+
+
+from collections import OrderedDict
+
+
+def read_params_file(params_file):
+    """Read a Dakota parameters file in the standard format.
+
+    Parameters
+    ----------
+    params_file : str
+      Path to the parameters file.
+
+    Returns
+    -------
+    dict
+      The variables (an ordered dict of name and value), the response
+      descriptors, the analysis components and the evaluation id.
+
+    """
+    with open(params_file, 'r') as fp:
+        lines = [line.split() for line in fp if line.strip()]
+
+    def section(start):
+        count = int(lines[start][0])
+        return lines[start + 1:start + 1 + count], start + 1 + count
+
+    variables, i = section(0)
+    functions, i = section(i)
+    _, i = section(i)
+    components, i = section(i)
+
+    return {
+        'variables': OrderedDict((name, float(value))
+                                 for value, name in variables),
+        'response_descriptors': [label.split(':', 1)[1]
+                                 for _, label in functions],
+        'analysis_components': [tokens[0] for tokens in components],
+        'eval_id': lines[i][0] if i < len(lines) else None,
+        }
+
+
+def write_params_file(params_file, descriptors, values, response_descriptors,
+                      analysis_components=(), analysis_driver='', eval_id=1):
+    """Write a Dakota parameters file in the standard format.
+
+    Parameters
+    ----------
+    params_file : str
+      Path to the parameters file.
+    descriptors : list of str
+      The variable names.
+    values : list of float
+      The variable values.
+    response_descriptors : list of str
+      The names of the responses to compute.
+    analysis_components : list of str, optional
+      The analysis components passed to the analysis driver.
+    analysis_driver : str, optional
+      The name of the analysis driver.
+    eval_id : int, optional
+      The evaluation id.
+
+    """
+    lines = ['{:>36} variables'.format(len(descriptors))]
+    lines += ['{:>36.16e} {}'.format(value, name)
+              for name, value in zip(descriptors, values)]
+    lines.append('{:>36} functions'.format(len(response_descriptors)))
+    lines += ['{:>36} ASV_{}:{}'.format(1, i + 1, name)
+              for i, name in enumerate(response_descriptors)]
+    lines.append('{:>36} derivative_variables'.format(len(descriptors)))
+    lines += ['{:>36} DVV_{}:{}'.format(i + 1, i + 1, name)
+              for i, name in enumerate(descriptors)]
+    lines.append('{:>36} analysis_components'.format(len(analysis_components)))
+    lines += ['{:>36} AC_{}:{}'.format(component, i + 1, analysis_driver)
+              for i, component in enumerate(analysis_components)]
+    lines.append('{:>36} eval_id'.format(eval_id))
+    with open(params_file, 'w') as fp:
+        fp.write('\n'.join(lines) + '\n')
+
+
+def read_results_file(results_file):
+    """Read the response values from a Dakota results file.
+
+    Returns
+    -------
+    list of float
+      The response values, in the order they were written.
+
+    """
+    values = []
+    with open(results_file, 'r') as fp:
+        for line in fp:
+            tokens = line.split()
+            if tokens:
+                values.append(float(tokens[0]))
+    return values
+
+
+def write_results_file(results_file, values, response_descriptors):
+    """Write response values to a Dakota results file.
+
+    Parameters
+    ----------
+    results_file : str
+      Path to the results file.
+    values : list of float
+      The response values.
+    response_descriptors : list of str
+      The names of the responses.
+
+    """
+    with open(results_file, 'w') as fp:
+        for value, name in zip(values, response_descriptors):
+            fp.write('{:.16e} {}\n'.format(value, name))
@@ -0,0 +1,195 @@
+"""Choose how a polynomial chaos expansion estimates its coefficients.
+
+Dakotathon's `PolynomialChaos` computes the coefficients of the
+expansion by tensor-product quadrature, with ``quadrature_order``
+points in each variable, so the number of model runs, the order to the
+power of the number of uncertain variables, grows quickly as uncertain
+Hydrotrend inputs are added. The ``polynomial_chaos`` option of an
+experiment rewrites the method block for one of:
+
+sparse_grid_level
+  Smolyak sparse grid quadrature of the given level. Nested rules are
+  used unless ``'nested': False``.
+quadrature_order
+  Tensor-product quadrature, as Dakotathon writes it, but with nested
+  rules if ``'nested': True``.
+expansion_order
+  Regression: a least squares fit of a total-order expansion to
+  ``collocation_points`` random samples, or ``collocation_ratio``
+  times the number of terms of the expansion (default 2). A
+  ``'solver'``, such as 'lasso' or 'orthogonal_matching_pursuit', may
+  replace least squares, and ``'import_points'`` names a tabular file
+  of evaluations from an earlier attempt to include in the fit.
+sample_budget
+  Regression with the highest expansion order whose collocation
+  points, ``collocation_ratio`` times its number of terms, fit in the
+  budget of model runs.
+
+With nested rules, the points of a grid are among the points of the
+grids of higher levels or orders, so an expansion can be refined by
+running the study again with a higher level: the evaluations of the
+earlier attempt are replayed from its restart file (see
+`agu2016.restart`), and only the new points are run.
+
+"""
+import math
+
+from .dakota_input import (get_block, get_keyword_values, insert_keywords,
+                           read_input_file, remove_keywords)
+
+
+PCE_KEYWORDS = ('quadrature_order', 'sparse_grid_level', 'nested',
+                'non_nested', 'expansion_order', 'collocation_points',
+                'collocation_ratio', 'least_squares',
+                'orthogonal_matching_pursuit', 'basis_pursuit',
+                'basis_pursuit_denoising', 'least_angle_regression',
+                'lasso', 'import_build_points_file')
+APPROACHES = ('sparse_grid_level', 'quadrature_order', 'expansion_order',
+              'sample_budget')
+
+
+def expansion_terms(dimensions, order):
+    """The number of terms of a total-order expansion.
+
+    Examples
+    --------
+    >>> expansion_terms(2, 4)
+    15
+
+    """
+    terms = 1
+    for k in range(1, dimensions + 1):
+        terms = terms * (order + k) // k
+    return terms
+
+
+def collocation_count(dimensions, order, ratio=2.):
+    """The number of regression points of an expansion."""
+    return int(math.ceil(ratio * expansion_terms(dimensions, order)))
+
+
+def budget_expansion_order(dimensions, budget, ratio=2.):
+    """Get the highest expansion order whose regression fits a budget.
+
+    Parameters
+    ----------
+    dimensions : int
+      The number of uncertain variables.
+    budget : int
+      The most model runs to use.
+    ratio : float, optional
+      The number of collocation points per term of the expansion.
+
+    Examples
+    --------
+    >>> budget_expansion_order(2, 50)
+    5
+    >>> budget_expansion_order(5, 50)
+    2
+
+    """
+    order = 0
+    while collocation_count(dimensions, order + 1, ratio) <= budget:
+        order += 1
+    if order == 0:
+        raise ValueError('a budget of {} model runs is too small for a '
+                         'first order expansion'.format(budget))
+    return order
+
+
+def uncertain_dimensions(input_file):
+    """Get the number of uncertain variables of a Dakota input file."""
+    return sum(int(line.partition('=')[2]) for line in
+               get_block(read_input_file(input_file), 'variables')
+               if line.partition('=')[0].strip().endswith('_uncertain'))
+
+
+def coefficient_keywords(settings, dimensions):
+    """Get the method keywords for the coefficients of an expansion.
+
+    Parameters
+    ----------
+    settings : dict
+      The experiment's ``polynomial_chaos`` option.
+    dimensions : int
+      The number of uncertain variables.
+
+    Returns
+    -------
+    list of str
+      The keyword lines, without indentation.
+
+    """
+    approaches = [name for name in APPROACHES if name in settings]
+    if len(approaches) != 1:
+        raise ValueError('polynomial_chaos needs one of {}'.format(
+            ', '.join(APPROACHES)))
+    approach = approaches[0]
+
+    if approach in ('sparse_grid_level', 'quadrature_order'):
+        nested = settings.get('nested', approach == 'sparse_grid_level')
+        return ['{} = {}'.format(approach, settings[approach]),
+                'nested' if nested else 'non_nested']
+
+    ratio = settings.get('collocation_ratio', 2.)
+    if approach == 'sample_budget':
+        order = budget_expansion_order(dimensions, settings['sample_budget'],
+                                       ratio=ratio)
+        keywords = ['expansion_order = {}'.format(order),
+                    'collocation_points = {}'.format(
+                        collocation_count(dimensions, order, ratio))]
+    else:
+        keywords = ['expansion_order = {}'.format(settings['expansion_order'])]
+        if 'collocation_points' in settings:
+            keywords.append('collocation_points = {}'.format(
+                settings['collocation_points']))
+        else:
+            keywords.append('collocation_ratio = {}'.format(ratio))
+    keywords.append(settings.get('solver', 'least_squares'))
+    if settings.get('import_points'):
+        keywords.append("import_build_points_file = '{}' annotated".format(
+            settings['import_points']))
+    return keywords
+
+
+def set_coefficient_estimation(input_file, settings):
+    """Rewrite the method block of a polynomial chaos study.
+
+    Parameters
+    ----------
+    input_file : str
+      Path to the Dakota input file, which is edited in place.
+    settings : dict
+      The experiment's ``polynomial_chaos`` option.
+
+    """
+    keywords = coefficient_keywords(settings, uncertain_dimensions(input_file))
+    remove_keywords(input_file, 'method', PCE_KEYWORDS)
+    insert_keywords(input_file, 'method', keywords, after='polynomial_chaos')
+
+
+def expected_points(input_file):
+    """Get the number of model runs of a polynomial chaos study.
+
+    Returns
+    -------
+    int or None
+      The number of points, if it's known from the method block: the
+      points of tensor quadrature with non-nested rules, or the
+      collocation points of a regression.
+
+    """
+    def value(keyword, kind=int):
+        values = get_keyword_values(input_file, 'method', keyword)
+        return kind(values[0]) if values else None
+
+    dimensions = uncertain_dimensions(input_file)
+    if value('collocation_points'):
+        return value('collocation_points')
+    if value('collocation_ratio', float) and value('expansion_order'):
+        return collocation_count(dimensions, value('expansion_order'),
+                                 value('collocation_ratio', float))
+    nested = get_keyword_values(input_file, 'method', 'nested') is not None
+    if value('quadrature_order') and not nested:
+        return value('quadrature_order') ** dimensions
+    return None
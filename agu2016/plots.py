@@ -0,0 +1,505 @@
+"""Make the plots of the results of the studies.
+
+Every study directory with a `dakota.dat` is plotted by one entry
+point, rather than by a script run by hand in each directory::
+
+  $ python -m agu2016.plots                 # every study under .
+  $ python -m agu2016.plots hydrotrend-Cs-sampling-study
+
+For each study, `dakota.dat` and the final statistics in `dakota.out`
+are read once, the response is interpolated onto a grid of the first
+two variables, and the figures (a stacked surface plot, a contour plot
+and a histogram of the response with its CDF and statistics) are drawn
+by a pool of worker processes with matplotlib's non-interactive Agg
+backend. The styles of the figures of each study are in
+`STUDY_STYLES`; a study without one is plotted over the range of its
+data.
+
+The gridded response is cached, in memory and in a file,
+``.grid.<key>.npz``, in the study directory, keyed by the data and the
+grid, so figures can be restyled without interpolating again.
+
+"""
+import os
+import hashlib
+import argparse
+import multiprocessing
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from scipy.interpolate import griddata
+
+from .dakota_output import (read_statistics, statistics_of,
+                            probability_at_level, level_at_probability)
+from .statistics import t_interval
+from .store import ResultsStore
+from .tabular import read_dat_file, response_descriptors
+
+
+FIGURES = ('surface', 'contour', 'histogram')
+GRID_SHAPE = (20, 20)
+
+DEFAULT_STYLE = {
+    'figures': FIGURES,
+    'x_range': None,
+    'y_range': None,
+    'z_range': None,
+    'x_label': None,
+    'y_label': None,
+    'z_label': None,
+    'cmap': 'viridis',
+    'title': None,
+    'histogram_title': None,
+    'title_size': None,
+    'label_size': None,
+    'contour_levels': 11,
+    'contour_extend': 'neither',
+    'contour_vmin': None,
+    'histogram_range': None,
+    'histogram_ylim': None,
+    'histogram_color': 0.4,
+    'marker_color': 0.4,
+    'marker_width': None,
+    'cdf_width': None,
+    'threshold': None,
+    'transform': None,
+    'statistics': 'dakota',
+    'median_recurrence': False,
+    'run_duration': None,
+    }
+
+HYDROTREND_LABELS = {
+    'x_label': r'$T\ [^{o}C]$',
+    'y_label': r'$P\ [m\ yr^{-1}]$',
+    }
+
+STUDY_STYLES = {
+    'hydrotrend-Cs-sampling-study': dict(
+        HYDROTREND_LABELS,
+        x_range=[10., 20.], y_range=[1., 2.], z_range=[10., 45.],
+        z_label=r'$max(C_s)\ [kg\ m^{-3}]$', cmap='PuOr_r',
+        title='Hydrotrend: T-P samples and max($C_s$) response',
+        histogram_title='Hydrotrend: max($C_s$) response distribution',
+        contour_levels=8, contour_extend='both', contour_vmin=0.1,
+        histogram_range=[0., 50.], histogram_ylim=[0., 0.1],
+        marker_color=0.3, marker_width=1, threshold=40.),
+    'hydrotrend-RI10-sampling-study': dict(
+        HYDROTREND_LABELS,
+        figures=('contour', 'histogram'),
+        x_range=[12.5, 16.], y_range=[1.4, 1.8], z_range=[4., 14.],
+        z_label='RI [yr]', cmap='magma_r',
+        title='Hydrotrend: samples and recurrence interval',
+        histogram_title='Hydrotrend: recurrence interval distribution',
+        title_size=20, label_size=18, histogram_ylim=[0., 0.4],
+        histogram_color=0.5, marker_color=0.5, marker_width=1,
+        cdf_width=1.5, transform='recurrence_interval',
+        statistics='sample', run_duration=1000.),
+    'hydrotrend-RI25-sampling-study': dict(
+        HYDROTREND_LABELS,
+        figures=('contour', 'histogram'),
+        x_range=[10., 20.], y_range=[1., 2.], z_range=[0., 500.],
+        z_label='Critical $C_s$ event count [d]', cmap='magma',
+        title='Hydrotrend: T-P samples and critical $C_s$ response',
+        histogram_title='Hydrotrend: critical $C_s$ response distribution',
+        median_recurrence=True, run_duration=1000.),
+    }
+
+plt.rcParams['mathtext.default'] = 'regular'
+
+
+def get_style(study_directory):
+    """Get the style of the figures of a study."""
+    name = os.path.basename(os.path.normpath(study_directory))
+    return dict(DEFAULT_STYLE, **STUDY_STYLES.get(name, {}))
+
+
+def discover_studies(root='.'):
+    """Find the study directories under a directory.
+
+    A study directory holds a Dakota tabular data file, `dakota.dat`.
+    If the directory is itself a study, it's the only one found.
+
+    """
+    if os.path.isfile(os.path.join(root, 'dakota.dat')):
+        return [root]
+    return sorted(os.path.join(root, name) for name in os.listdir(root)
+                  if os.path.isfile(os.path.join(root, name, 'dakota.dat')))
+
+
+def data_range(values, margin=0.05):
+    lower, upper = float(np.min(values)), float(np.max(values))
+    pad = margin * (upper - lower) or margin * max(abs(upper), 1.)
+    return [lower - pad, upper + pad]
+
+
+def is_planar(x, y):
+    """Check whether samples span the plane, so they can be gridded."""
+    xy = np.column_stack([x, y]).astype(float)
+    return len(xy) >= 3 and np.linalg.matrix_rank(xy - xy.mean(axis=0)) == 2
+
+
+_grids = {}
+
+
+def grid_key(x, y, z, x_range, y_range, shape=GRID_SHAPE):
+    """Compute the cache key of a gridded dataset."""
+    digest = hashlib.sha256()
+    for values in (x, y, z, x_range, y_range, shape):
+        digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def grid_samples(x, y, z, x_range, y_range, shape=GRID_SHAPE,
+                 cache_dir=None):
+    """Interpolate scattered samples onto a regular grid.
+
+    Parameters
+    ----------
+    x, y, z : ndarray
+      The samples.
+    x_range, y_range : list of float
+      The extent of the grid.
+    shape : tuple of int, optional
+      The number of grid points in x and y.
+    cache_dir : str, optional
+      A directory to cache the gridded samples in.
+
+    Returns
+    -------
+    tuple of ndarray
+      The x, y and z values of the grid.
+
+    """
+    key = grid_key(x, y, z, x_range, y_range, shape)
+    if key in _grids:
+        return _grids[key]
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, '.grid.{}.npz'.format(key[:16]))
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                _grids[key] = npz['x'], npz['y'], npz['z']
+                return _grids[key]
+        except (IOError, OSError, KeyError, ValueError):
+            pass
+
+    grid_x, grid_y = np.mgrid[x_range[0]:x_range[1]:complex(shape[0]),
+                              y_range[0]:y_range[1]:complex(shape[1])]
+    grid_z = griddata(np.column_stack([x, y]), z, (grid_x, grid_y),
+                      method='linear')
+    _grids[key] = grid_x, grid_y, grid_z
+
+    if path is not None:
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, x=grid_x, y=grid_y, z=grid_z)
+        os.rename(tmp, path)
+    return _grids[key]
+
+
+def set_title(fig, ax, title, style):
+    if title is None:
+        return
+    if style['title_size']:
+        fig.suptitle(title, fontsize=style['title_size'])
+    else:
+        ax.set_title(title)
+
+
+def make_stacked_surface_plot(x, y, z, grid, style, outfile='surface.png'):
+    X, Y, Z = grid
+    cmap = plt.get_cmap(style['cmap'])
+
+    fig = plt.figure()
+    ax = fig.add_subplot(projection='3d')
+
+    ax.scatter(x, y, zs=style['z_range'][0], s=10, zdir='z', c='r')
+    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, linewidth=0.5,
+                    color=cmap(0.2))
+    set_title(fig, ax, style['title'], style)
+
+    ax.set_xlim(style['x_range'])
+    ax.set_ylim(style['y_range'])
+    ax.set_zlim(style['z_range'])
+    ax.locator_params(axis='x', nbins=5)
+    ax.locator_params(axis='y', nbins=5)
+    ax.set_autoscale_on(False)
+    ax.set_xlabel(style['x_label'], fontsize=style['label_size'])
+    ax.set_ylabel(style['y_label'], fontsize=style['label_size'])
+    ax.set_zlabel(style['z_label'], fontsize=style['label_size'])
+    ax.tick_params(axis='both', labelsize=10)
+
+    fig.savefig(outfile, dpi=150)
+    plt.close(fig)
+
+
+def make_contour_plot(x, y, z, grid, style, outfile='contour.png'):
+    X, Y, Z = grid
+    cmap = plt.get_cmap(style['cmap'])
+
+    fig, ax = plt.subplots()
+
+    clevels = np.linspace(style['z_range'][0], style['z_range'][1],
+                          style['contour_levels'])
+    c = ax.contourf(X, Y, Z, cmap=cmap, levels=clevels,
+                    vmin=style['contour_vmin'], antialiased=True,
+                    extend=style['contour_extend'])
+    ax.scatter(x, y, s=10, color=cmap(0.9))
+    set_title(fig, ax, style['title'], style)
+
+    ax.set_xlim(style['x_range'])
+    ax.set_ylim(style['y_range'])
+    ax.locator_params(axis='x', nbins=5)
+    ax.locator_params(axis='y', nbins=5)
+    ax.set_xlabel(style['x_label'], fontsize=style['label_size'])
+    ax.set_ylabel(style['y_label'], fontsize=style['label_size'])
+
+    cbar = fig.colorbar(c, shrink=0.75, aspect=25)
+    cbar.ax.set_ylabel(style['z_label'], fontsize=style['label_size'])
+
+    fig.savefig(outfile, dpi=150)
+    plt.close(fig)
+
+
+def sample_statistics(z):
+    """Compute the statistics of a response from its samples."""
+    lower, upper = t_interval(z)
+    return {
+        'moments': {'mean': z.mean(), 'std_dev': z.std()},
+        'confidence_intervals': {'lower_mean': lower, 'upper_mean': upper},
+        'median': np.median(z),
+        }
+
+
+def make_pdf_and_cdf_plot(z, statistics, style, outfile='histogram.png'):
+    cmap = plt.get_cmap(style['cmap'])
+    label_size = style['label_size']
+    fig, ax1 = plt.subplots()
+
+    nbins = 21
+    bins = np.linspace(style['histogram_range'][0],
+                       style['histogram_range'][1], nbins)
+    pdf, _, _ = ax1.hist(z, bins=bins, density=True,
+                         color=cmap(style['histogram_color']))
+    set_title(fig, ax1, style['histogram_title'], style)
+
+    if style['histogram_ylim'] is not None:
+        ax1.set_ylim(style['histogram_ylim'])
+    ax1.set_xlabel(style['z_label'], fontsize=label_size)
+    ax1.set_ylabel('pdf', fontsize=label_size)
+
+    cdf = np.cumsum(pdf)
+    cdf /= cdf.max()
+    ax2 = ax1.twinx()
+    ax2.plot(bins[:-1], cdf, color='b', lw=style['cdf_width'])
+    ax2.set_ylabel('cdf', fontsize=label_size)
+
+    top = ax2.get_ylim()[-1]
+    right = ax2.get_xlim()[-1]
+    ymrk = 0.95 * top
+    color = cmap(style['marker_color'])
+    mew = style['marker_width']
+    if 'moments' in statistics:
+        mean = statistics['moments']['mean']
+        stdv = statistics['moments']['std_dev']
+        ax2.plot([mean - stdv, mean + stdv], [ymrk, ymrk], '|-',
+                 color=color, ms=15, mew=mew, lw=0.75)
+        ax2.plot(mean, ymrk, 's', color=color, ms=5)
+    if 'confidence_intervals' in statistics:
+        intervals = statistics['confidence_intervals']
+        ax2.plot([intervals['lower_mean'], intervals['upper_mean']],
+                 [ymrk, ymrk], '|', color=color, ms=10, mew=mew)
+    if 'median' in statistics:
+        ax2.plot(statistics['median'], ymrk, 'D', color=color, ms=5)
+
+    if style['threshold'] is not None and 'level_mappings' in statistics:
+        threshold = style['threshold']
+        probability = probability_at_level(statistics['level_mappings'],
+                                           threshold)
+        line = cmap(0.9)
+        ax2.plot([threshold, threshold], [0, probability], color=line,
+                 lw=0.5)
+        ax2.plot([threshold, right], [probability, probability], color=line,
+                 lw=0.5)
+        ax2.text(0.95 * right, 0.925 * top, '{:.2f}'.format(probability),
+                 ha='center', size=15)
+
+    if style['median_recurrence'] and 'level_mappings' in statistics:
+        median = level_at_probability(statistics['level_mappings'], 0.5)
+        ri = (style['run_duration'] + 1.) / median
+        ax2.text(0.75 * right, 0.80 * top, 'Median = {:g}'.format(median),
+                 ha='center', size=15)
+        ax2.text(0.75 * right, 0.75 * top, 'RI = {:.3} yr'.format(ri),
+                 ha='center', size=15)
+
+    fig.savefig(outfile, dpi=150)
+    plt.close(fig)
+
+
+def response_statistics(output_file, response, responses=None):
+    """Get the final statistics of a response from a Dakota output file.
+
+    See `agu2016.dakota_output.statistics_of`.
+
+    """
+    try:
+        return statistics_of(read_statistics(output_file), response,
+                             responses=responses)
+    except (IOError, OSError):
+        return {}
+
+
+def study_samples(study_directory, store=None):
+    """Get the samples of a study's first two variables and response.
+
+    The samples are read from a results store (see `agu2016.store`),
+    if the study is in it, or from the study's `dakota.dat`.
+
+    Returns
+    -------
+    tuple
+      The descriptors and the values of the three columns, and the
+      descriptors of all of the study's responses.
+
+    """
+    study = os.path.basename(os.path.abspath(study_directory))
+    if store is not None and study in store.studies:
+        roles = store.studies[study]
+        names = roles['variables'][:2] + roles['responses'][:1]
+        columns = store.read(names, where=[('study', '==', study)])
+        responses = roles['responses']
+    else:
+        dat_file = os.path.join(study_directory, 'dakota.dat')
+        columns = read_dat_file(dat_file)
+        names = columns.descriptors[:3]
+        responses = response_descriptors(dat_file)
+    return names, [columns[name] for name in names], responses
+
+
+def study_tasks(study_directory, style=None, store=None):
+    """Prepare the figures of a study for rendering.
+
+    The study's data and statistics are read, and its response
+    gridded, once for all of its figures.
+
+    Returns
+    -------
+    list of tuple
+      The ``(function, args)`` that render each figure.
+
+    """
+    style = dict(style or get_style(study_directory))
+    descriptors, (x, y, z), responses = study_samples(study_directory,
+                                                      store=store)
+    response = descriptors[2]
+
+    if style['transform'] == 'recurrence_interval':
+        z = (style['run_duration'] + 1.) / z
+    if style['statistics'] == 'sample':
+        statistics = sample_statistics(z)
+    else:
+        statistics = response_statistics(
+            os.path.join(study_directory, 'dakota.out'), response,
+            responses=responses)
+
+    for axis, values in (('x', x), ('y', y), ('z', z)):
+        if style[axis + '_range'] is None:
+            style[axis + '_range'] = data_range(values)
+        if style[axis + '_label'] is None:
+            style[axis + '_label'] = descriptors['xyz'.index(axis)]
+    if style['histogram_range'] is None:
+        style['histogram_range'] = style['z_range']
+
+    figures = list(style['figures'])
+    grid = None
+    if 'surface' in figures or 'contour' in figures:
+        if is_planar(x, y):
+            grid = grid_samples(x, y, z, style['x_range'], style['y_range'],
+                                cache_dir=study_directory)
+        else:
+            figures = [name for name in figures if name == 'histogram']
+
+    def outfile(name):
+        return os.path.join(study_directory, name + '.png')
+
+    tasks = []
+    if 'surface' in figures:
+        tasks.append((make_stacked_surface_plot,
+                      (x, y, z, grid, style, outfile('surface'))))
+    if 'contour' in figures:
+        tasks.append((make_contour_plot,
+                      (x, y, z, grid, style, outfile('contour'))))
+    if 'histogram' in figures:
+        tasks.append((make_pdf_and_cdf_plot,
+                      (z, statistics, style, outfile('histogram'))))
+    return tasks
+
+
+def render(task):
+    """Render a figure of a study, returning its file name."""
+    function, args = task
+    function(*args)
+    return args[-1]
+
+
+def plot_studies(study_directories, processes=None, store=None):
+    """Plot the results of studies in parallel.
+
+    Parameters
+    ----------
+    study_directories : list of str
+      The study directories.
+    processes : int, optional
+      The number of worker processes (default is the number of cores,
+      or fewer if there are fewer figures); 1 to render in this
+      process.
+    store : ResultsStore, optional
+      A results store to read the samples of the studies from, if
+      they're in it.
+
+    Returns
+    -------
+    list of str
+      The figures that were written.
+
+    """
+    tasks = []
+    for directory in study_directories:
+        tasks.extend(study_tasks(directory, store=store))
+    processes = min(processes or multiprocessing.cpu_count(),
+                    max(len(tasks), 1))
+    if processes == 1:
+        return [render(task) for task in tasks]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(render, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plot the results of the '
+                                                 'studies.')
+    parser.add_argument('directories', nargs='*', default=['.'],
+                        help='study directories, or directories of studies '
+                             '(default: .)')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--store', default=None,
+                        help='read the samples from a results store')
+    args = parser.parse_args()
+
+    studies = []
+    for directory in args.directories:
+        studies.extend(discover_studies(directory))
+    store = ResultsStore(args.store) if args.store else None
+    for outfile in plot_studies(studies, processes=args.processes,
+                                store=store):
+        print(outfile)
+
+
+if __name__ == '__main__':
+    main()
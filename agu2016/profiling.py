@@ -0,0 +1,442 @@
+"""Profile evaluations, and find where the time of a study goes.
+
+The phase timings of an evaluation (see `agu2016.monitor`) tell how
+long the model ran, but not whether that time went into setting up the
+PyMT component, stepping the Hydrotrend core, which writes its ASCII
+output to ``HYDRO_OUTPUT`` as it steps, or getting output values from
+the model. With the experiment's ``profiling`` option, the driver
+profiles each evaluation, and writes its profile to `profile.json` in
+the evaluation's ``run.N`` directory:
+
+stacks
+  The Python call stacks of the evaluation, sampled every `interval`
+  seconds by a background thread, in collapsed form: the frames from
+  the outermost in, as ``module:function``, joined by semicolons, and
+  the number of samples of each. Time spent in the model's compiled
+  code is sampled at the Python frame that called it.
+sections
+  The wall time and number of calls of the model's ``initialize``,
+  ``update``, ``get_value`` and ``finalize``, timed around each call.
+output_bytes
+  The size of the model's output files, whose writing is part of the
+  time of ``update`` and ``finalize``.
+
+When the experiment is done, the profiles of all of its evaluations
+are merged: the total time of each section and phase, the hottest
+frames by the samples in which they run (self) and are on the stack
+(total), and a flame graph in text, with the share of samples of each
+call path. The merged stacks are written to `profile.folded`, in the
+collapsed format of flame graph tools such as ``flamegraph.pl`` or
+speedscope. Merge the profiles of a study again with::
+
+  $ python -m agu2016.profiling path/to/run_directory --top 20
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+
+from .evaluations import list_run_directories, PROFILE_FILE
+from .monitor import read_timing, PHASES
+from .retention import directory_size
+
+
+COLLAPSED_FILE = 'profile.folded'
+SECTIONS = ('initialize', 'update', 'get_value', 'finalize')
+OUTPUT_DIRECTORY = 'HYDRO_OUTPUT'
+HIDDEN_MODULES = ('importlib._bootstrap', 'importlib._bootstrap_external',
+                  __name__)
+
+_active = None
+
+
+def active_profile():
+    """Get the profile of the evaluation being run, if it's profiled."""
+    return _active
+
+
+def frame_label(frame):
+    """Label a frame by its module and function, as ``module:function``."""
+    module = frame.f_globals.get('__name__', '?')
+    # A module run with ``python -m`` is named by its import path.
+    spec = frame.f_globals.get('__spec__')
+    if module == '__main__' and spec is not None:
+        module = spec.name
+    return '{}:{}'.format(module, frame.f_code.co_name)
+
+
+def collapse_stack(frame):
+    """Collapse the stack of a frame, outermost first, to a string.
+
+    The frames of the import machinery and of this module, which times
+    the model's calls, are left out.
+
+    """
+    labels = []
+    while frame is not None:
+        if frame.f_globals.get('__name__') not in HIDDEN_MODULES:
+            labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler(object):
+
+    """Sample the call stack of a thread from a background thread.
+
+    Parameters
+    ----------
+    interval : float, optional
+      Seconds between samples.
+    thread_id : int, optional
+      The identifier of the thread to sample (default is the thread
+      that starts the sampler).
+
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.current_thread().ident
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _TimedModel(object):
+
+    # Times the calls of a model's methods, and passes everything else
+    # through. Methods are kept once looked up, timed or not, so the
+    # calls of each step don't go through __getattr__.
+
+    def __init__(self, model, profile):
+        self._model = model
+        self._profile = profile
+
+    def __getattr__(self, name):
+        attr = getattr(self._model, name)
+        if name not in SECTIONS:
+            if callable(attr):
+                setattr(self, name, attr)
+            return attr
+        add = self._profile.add
+
+        def timed(*args, **kwds):
+            start = time.time()
+            try:
+                return attr(*args, **kwds)
+            finally:
+                add(name, time.time() - start)
+                if name == 'finalize':
+                    self._profile.measure_output()
+        setattr(self, name, timed)
+        return timed
+
+
+class EvaluationProfile(object):
+
+    """Profile an evaluation, while it's active.
+
+    Use the profile as a context manager around the evaluation; models
+    run while it's active are timed (see `agu2016.models`).
+
+    Parameters
+    ----------
+    interval : float, optional
+      Seconds between samples of the call stack.
+
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.sections = dict((name, {'time': 0., 'calls': 0})
+                             for name in SECTIONS)
+        self.output_bytes = 0
+        self._sampler = StackSampler(interval=interval)
+
+    def add(self, section, seconds):
+        """Add the time of a call to a section."""
+        record = self.sections[section]
+        record['time'] += seconds
+        record['calls'] += 1
+
+    def measure_output(self, output_directory=OUTPUT_DIRECTORY):
+        """Measure the model's output, before retention can remove it."""
+        self.output_bytes = directory_size(output_directory)
+
+    def instrument(self, model):
+        """Time the calls of a model's methods."""
+        return _TimedModel(model, self)
+
+    def start(self):
+        global _active
+        _active = self
+        # The sampler runs only when the evaluation's thread lets go of
+        # the interpreter lock, so have it let go more often than the
+        # sampler wakes, lest the samples gather where it blocks.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval,
+                                  self.interval / 10.))
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        global _active
+        self._sampler.stop()
+        sys.setswitchinterval(self._switch_interval)
+        _active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def write(self, profile_file=PROFILE_FILE):
+        """Write the profile of the evaluation."""
+        record = {
+            'interval': self.interval,
+            'samples': sum(self._sampler.stacks.values()),
+            'stacks': dict(self._sampler.stacks),
+            'sections': self.sections,
+            'output_bytes': self.output_bytes,
+            }
+        with open(profile_file, 'w') as fp:
+            json.dump(record, fp, indent=2, sort_keys=True)
+
+
+def read_profile(eval_directory):
+    """Read the profile of an evaluation, or None if it wasn't profiled."""
+    try:
+        with open(os.path.join(eval_directory, PROFILE_FILE), 'r') as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def merge_profiles(run_directory):
+    """Merge the profiles of the evaluations of an experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota was run.
+
+    Returns
+    -------
+    dict
+      The number of evaluations profiled, their merged stacks, the
+      total time and calls of each section, the total time of each
+      phase of the evaluations, and the total size of their output.
+
+    """
+    stacks = Counter()
+    sections = dict((name, {'time': 0., 'calls': 0}) for name in SECTIONS)
+    phases = dict((name, 0.) for name in PHASES)
+    evaluations, output_bytes, interval = 0, 0, None
+    for _, path in list_run_directories(run_directory):
+        profile = read_profile(path)
+        if profile is None:
+            continue
+        evaluations += 1
+        interval = profile['interval']
+        stacks.update(profile['stacks'])
+        for name, record in profile['sections'].items():
+            sections[name]['time'] += record['time']
+            sections[name]['calls'] += record['calls']
+        output_bytes += profile['output_bytes']
+        timing = read_timing(path)
+        if timing is not None:
+            for name in PHASES:
+                phases[name] += timing['phases'].get(name, 0.)
+    return {
+        'evaluations': evaluations,
+        'interval': interval,
+        'samples': sum(stacks.values()),
+        'stacks': stacks,
+        'sections': sections,
+        'phases': phases,
+        'output_bytes': output_bytes,
+        }
+
+
+def hot_frames(stacks, top=15):
+    """Rank the frames of collapsed stacks by their samples.
+
+    Parameters
+    ----------
+    stacks : dict
+      The number of samples of each collapsed stack.
+    top : int, optional
+      The number of frames to rank.
+
+    Returns
+    -------
+    list of tuple
+      The ``(frame, self_samples, total_samples)`` of the frames with
+      the most samples of their own, most first.
+
+    Examples
+    --------
+    >>> hot_frames({'a;b;c': 3, 'a;b': 1, 'a;d': 2})
+    [('c', 3, 3), ('d', 2, 2), ('b', 1, 4), ('a', 0, 6)]
+
+    """
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    ranked = sorted(total, key=lambda frame: (-own[frame], -total[frame],
+                                              frame))
+    return [(frame, own[frame], total[frame]) for frame in ranked[:top]]
+
+
+def stack_tree(stacks):
+    """Build the call tree of collapsed stacks.
+
+    Returns
+    -------
+    dict
+      The root of the tree, whose nodes have the number of ``samples``
+      on their call path and their ``children`` by frame.
+
+    """
+    root = {'samples': 0, 'children': {}}
+    for stack, count in stacks.items():
+        node = root
+        node['samples'] += count
+        for frame in stack.split(';'):
+            node = node['children'].setdefault(
+                frame, {'samples': 0, 'children': {}})
+            node['samples'] += count
+    return root
+
+
+def format_flame_graph(stacks, min_fraction=0.01, width=30):
+    """Format collapsed stacks as a flame graph in text.
+
+    Each call path with at least `min_fraction` of the samples is a
+    line, indented by its depth, with its share of the samples.
+
+    Examples
+    --------
+    >>> print(format_flame_graph({'a;b': 3, 'a;c': 1}, width=4))
+    100.0% #### a
+     75.0% ###    b
+     25.0% #      c
+
+    """
+    root = stack_tree(stacks)
+    total = float(root['samples'])
+    lines = []
+
+    def visit(node, depth):
+        for frame, child in sorted(node['children'].items(),
+                                   key=lambda item: -item[1]['samples']):
+            fraction = child['samples'] / total
+            if fraction < min_fraction:
+                continue
+            lines.append('{:6.1%} {:<{width}} {}{}'.format(
+                fraction, '#' * int(round(fraction * width)), '  ' * depth,
+                frame, width=width))
+            visit(child, depth + 1)
+
+    if total > 0:
+        visit(root, 0)
+    return '\n'.join(lines)
+
+
+def write_collapsed(stacks, path):
+    """Write collapsed stacks, one ``stack count`` line each."""
+    with open(path, 'w') as fp:
+        for stack, count in sorted(stacks.items()):
+            fp.write('{} {}\n'.format(stack, count))
+    return path
+
+
+def profile_study(run_directory):
+    """Merge the profiles of an experiment, and write its stacks.
+
+    Returns
+    -------
+    dict
+      The merged profiles (see `merge_profiles`).
+
+    """
+    report = merge_profiles(run_directory)
+    write_collapsed(report['stacks'],
+                    os.path.join(run_directory, COLLAPSED_FILE))
+    return report
+
+
+def format_profile_report(report, top=15, min_fraction=0.01):
+    """Format merged profiles for the console."""
+    if not report['evaluations']:
+        return 'No evaluations were profiled.'
+    lines = ['Profiled {} evaluations, {} samples every {:g} s.'.format(
+        report['evaluations'], report['samples'], report['interval'])]
+    lines.append('Phases: ' + ', '.join(
+        '{} {:.2f} s'.format(name, report['phases'][name])
+        for name in PHASES))
+    lines.append('Model: ' + ', '.join(
+        '{} {:.2f} s ({} calls)'.format(name, record['time'],
+                                        record['calls'])
+        for name, record in ((name, report['sections'][name])
+                             for name in SECTIONS)) +
+        ', {:.1f} MB of output'.format(report['output_bytes'] / 1e6))
+
+    samples = float(report['samples']) or 1.
+    lines.append('')
+    lines.append('{:>7} {:>7}  {}'.format('self', 'total', 'frame'))
+    for frame, own, total in hot_frames(report['stacks'], top=top):
+        lines.append('{:7.1%} {:7.1%}  {}'.format(own / samples,
+                                                  total / samples, frame))
+    lines.append('')
+    lines.append(format_flame_graph(report['stacks'],
+                                    min_fraction=min_fraction))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Merge the evaluation profiles of an experiment.')
+    parser.add_argument('run_directory', nargs='?', default=os.curdir,
+                        help='the run directory of the experiment')
+    parser.add_argument('--top', type=int, default=15,
+                        help='the number of hot frames to list')
+    parser.add_argument('--min-fraction', type=float, default=0.01,
+                        help='the smallest share of samples of a call '
+                             'path in the flame graph')
+    args = parser.parse_args()
+
+    report = profile_study(args.run_directory)
+    print(format_profile_report(report, top=args.top,
+                                min_fraction=args.min_fraction))
+
+
+if __name__ == '__main__':
+    main()
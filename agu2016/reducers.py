@@ -0,0 +1,200 @@
+"""Reduce model output to response values as the model steps.
+
+A reducer is fed the value of an output variable at every time step
+and keeps only what it needs to compute its statistic, so a response
+is computed in constant memory, no matter how long the run. Order
+statistics (medians and quantiles) are estimated with the P-square
+algorithm of Jain and Chlamtac (1985), which tracks five markers of
+the distribution rather than the full series.
+
+"""
+import math
+
+from .responses import parse_statistic
+
+
+class Max(object):
+
+    """Running maximum."""
+
+    def __init__(self):
+        self.value = -float('inf')
+
+    def update(self, x):
+        if x > self.value:
+            self.value = x
+
+    def result(self):
+        return self.value
+
+
+class Min(object):
+
+    """Running minimum."""
+
+    def __init__(self):
+        self.value = float('inf')
+
+    def update(self, x):
+        if x < self.value:
+            self.value = x
+
+    def result(self):
+        return self.value
+
+
+class Sum(object):
+
+    """Running sum."""
+
+    def __init__(self):
+        self.value = 0.
+
+    def update(self, x):
+        self.value += x
+
+    def result(self):
+        return self.value
+
+
+class Moments(object):
+
+    """Running mean and standard deviation, by Welford's method.
+
+    Parameters
+    ----------
+    statistic : {'mean', 'std'}
+      The statistic to return.
+
+    """
+
+    def __init__(self, statistic='mean'):
+        self.statistic = statistic
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    def result(self):
+        if self.statistic == 'std':
+            return math.sqrt(self.m2 / self.count) if self.count else 0.
+        return self.mean
+
+
+class ThresholdCount(object):
+
+    """Running count of values above a level."""
+
+    def __init__(self, level):
+        self.level = level
+        self.value = 0
+
+    def update(self, x):
+        if x > self.level:
+            self.value += 1
+
+    def result(self):
+        return self.value
+
+
+class P2Quantile(object):
+
+    """Streaming estimate of a quantile with the P-square algorithm.
+
+    Parameters
+    ----------
+    p : float
+      The probability of the quantile, e.g. 0.5 for the median.
+
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0., 2. * p, 4. * p, 2. + 2. * p, 4.]
+        self.increments = [0., p / 2., p, (1. + p) / 2., 1.]
+
+    def update(self, x):
+        q, n = self.heights, self.positions
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if ((d >= 1. and n[i + 1] - n[i] > 1) or
+                    (d <= -1. and n[i - 1] - n[i] < -1)):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / float(n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def result(self):
+        q = self.heights
+        if len(q) == 5 and self.positions[4] > 4:
+            return q[2]
+        if not q:
+            return float('nan')
+        # Too few values for the markers: interpolate them directly.
+        position = self.p * (len(q) - 1)
+        lower = int(math.floor(position))
+        upper = min(lower + 1, len(q) - 1)
+        return q[lower] + (q[upper] - q[lower]) * (position - lower)
+
+
+def make_reducer(spec, threshold=None):
+    """Create the reducer of a response statistic.
+
+    Parameters
+    ----------
+    spec : str
+      A response statistic, as in `agu2016.responses`.
+    threshold : float, optional
+      The level of a threshold count that doesn't give one.
+
+    """
+    name, argument = parse_statistic(spec)
+    if name == 'max':
+        return Max()
+    elif name == 'min':
+        return Min()
+    elif name == 'sum':
+        return Sum()
+    elif name in ('mean', 'std'):
+        return Moments(name)
+    elif name == 'median':
+        return P2Quantile(.5)
+    elif name == 'quantile':
+        return P2Quantile(argument)
+    elif name == 'threshold_count':
+        return ThresholdCount(threshold if argument is None else argument)
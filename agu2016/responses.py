@@ -0,0 +1,171 @@
+"""Response functions computed from model output series.
+
+An experiment's ``response_statistics`` are paired with its
+``response_descriptors``; each entry may be a single statistic or a
+list of them, and if there's only one descriptor, every statistic is
+computed from it. Every descriptor-statistic pair is a separate Dakota
+response function, so one model run can provide, for example, the
+maximum, the median and the number of days above a threshold of the
+suspended sediment concentration::
+
+  'response_descriptors': 'channel_exit_water_sediment~suspended__mass_concentration',
+  'response_statistics': ['max', 'median', 'threshold_count=40',
+                          'quantile=0.99'],
+
+The statistics are:
+
+max, min, mean, median, std, sum
+  The usual reductions of the series.
+quantile=q
+  The q-th quantile of the series, with 0 <= q <= 1.
+threshold_count=level
+  The number of values above a level. Without a level, the first of
+  the experiment's ``response_levels`` is used.
+
+When an experiment has a single response function, it's named by its
+descriptor, as before; otherwise each function is named
+``<descriptor>:<statistic>``.
+
+"""
+import numpy as np
+
+
+STATISTICS = ('max', 'min', 'mean', 'median', 'std', 'sum', 'quantile',
+              'threshold_count')
+
+
+def parse_statistic(spec):
+    """Split a statistic into its name and argument.
+
+    Parameters
+    ----------
+    spec : str
+      A statistic, such as 'max' or 'threshold_count=40'.
+
+    Returns
+    -------
+    tuple
+      The name of the statistic and its argument (a float, or None).
+
+    """
+    name, _, argument = spec.partition('=')
+    name = name.strip()
+    if name not in STATISTICS:
+        raise ValueError('unknown response statistic: {}'.format(spec))
+    if argument:
+        return name, float(argument)
+    if name == 'quantile':
+        raise ValueError('quantile needs a probability, e.g. quantile=0.99')
+    return name, None
+
+
+def response_functions(descriptors, statistics, response_levels=None):
+    """Pair output variables with the statistics computed from them.
+
+    Parameters
+    ----------
+    descriptors : str or list of str
+      The output variables.
+    statistics : str or list
+      The statistics, paired with the descriptors. An entry may be a
+      list of statistics.
+    response_levels : list, optional
+      The response levels of the experiment, the first of which is the
+      level of threshold counts that don't give one.
+
+    Returns
+    -------
+    list of tuple
+      The ``(descriptor, statistic, label)`` of each response
+      function, where the label is the Dakota response descriptor.
+
+    Raises
+    ------
+    ValueError
+      If a statistic is unknown, or a threshold count has no level.
+
+    """
+    if isinstance(descriptors, str):
+        descriptors = [descriptors]
+    if isinstance(statistics, str):
+        statistics = [statistics]
+
+    if len(descriptors) == 1:
+        statistics = [statistics]
+    elif len(statistics) != len(descriptors):
+        raise ValueError('response_statistics must be paired with '
+                         'response_descriptors')
+
+    pairs = []
+    for descriptor, stats in zip(descriptors, statistics):
+        if isinstance(stats, str):
+            stats = [stats]
+        for stat in stats:
+            name, argument = parse_statistic(stat)
+            if (name == 'threshold_count' and argument is None and
+                    not response_levels):
+                raise ValueError(
+                    '{} of {} needs a level, e.g. threshold_count=40, or '
+                    'response_levels'.format(stat, descriptor))
+            pairs.append((descriptor, stat))
+
+    if len(pairs) == 1:
+        return [(pairs[0][0], pairs[0][1], pairs[0][0])]
+    return [(descriptor, stat, '{}:{}'.format(descriptor, stat))
+            for descriptor, stat in pairs]
+
+
+def sorted_quantile(data, q):
+    """Get a quantile of sorted data, interpolating linearly like NumPy."""
+    position = q * (len(data) - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, len(data) - 1)
+    return data[lower] + (data[upper] - data[lower]) * (position - lower)
+
+
+def compute_responses(functions, series, threshold=None):
+    """Compute the response functions from model output series.
+
+    Each series is sorted once; the order statistics (max, min,
+    median and quantiles) and the threshold counts of all of its
+    response functions are then read from the sorted values.
+
+    Parameters
+    ----------
+    functions : list of tuple
+      The ``(descriptor, statistic)`` of each response function.
+    series : dict
+      The output series, keyed by descriptor.
+    threshold : float, optional
+      The level of threshold counts that don't give one.
+
+    Returns
+    -------
+    list of float
+      The value of each response function.
+
+    """
+    ordered = {}
+    values = []
+    for descriptor, spec in functions:
+        name, argument = parse_statistic(spec)
+        if descriptor not in ordered:
+            ordered[descriptor] = np.sort(np.asarray(series[descriptor]),
+                                          kind='mergesort')
+        data = ordered[descriptor]
+
+        if name == 'max':
+            value = data[-1]
+        elif name == 'min':
+            value = data[0]
+        elif name == 'median':
+            value = sorted_quantile(data, .5)
+        elif name == 'quantile':
+            value = sorted_quantile(data, argument)
+        elif name == 'threshold_count':
+            level = threshold if argument is None else argument
+            value = len(data) - np.searchsorted(data, level, side='right')
+        else:
+            value = getattr(np, name)(data)
+        values.append(float(value))
+    return values
@@ -0,0 +1,263 @@
+"""Resume an experiment that was interrupted.
+
+If the host running an experiment dies part way through, running the
+study script again resumes the experiment rather than starting over:
+
+* Dakota writes a restart file, `dakota.rst`, with the variables and
+  responses of every evaluation it finishes. If one was left by an
+  earlier attempt of the same experiment, it's moved aside and read
+  back with ``-read_restart``, so Dakota replays those evaluations
+  instead of running them.
+* As each evaluation finishes, the driver records its responses in the
+  evaluation's ``run.N`` directory, with a digest of its inputs. An
+  evaluation that finished after Dakota last wrote its restart file is
+  found there, and its responses are returned without running the
+  model again.
+* The model is set up, and its configuration file turned into the
+  Dakota template, only once: the setup records a fingerprint of the
+  model component and parameters in `model_setup.json`, and a later
+  attempt with the same fingerprint uses the template it left. Any
+  other template, such as the archived template of a study or one
+  left by an attempt with other model parameters, is made again in
+  its place.
+
+All of these are tied to the exact inputs of the experiment: the
+restart file is only read if the variables, interface and responses
+of the Dakota input file, the driver configuration and the model
+template are unchanged, and an evaluation's recorded responses are
+only used if its parameters, rendered configuration file and driver
+configuration are the same. Because Dakota samples the same points in
+the same order, the resumed experiment's `dakota.dat` is the same as
+that of an uninterrupted run. The method may change, as Dakota looks
+up the replayed evaluations by their variables, so the study can also
+be run again with a refined method, such as a polynomial chaos
+expansion of a higher sparse grid level, and only the points it
+hasn't run before are evaluated (see `agu2016.pce`).
+
+"""
+import os
+import json
+import hashlib
+import subprocess
+
+from .dakota_input import get_block, read_input_file
+from .evaluations import COMPLETION_FILE
+
+
+RESTART_FILE = 'dakota.rst'
+FINGERPRINT_FILE = 'dakota.rst.json'
+SETUP_FILE = 'model_setup.json'
+EVALUATION_BLOCKS = ('variables', 'interface', 'responses')
+
+
+def file_digest(paths):
+    """Compute a digest of the contents of files."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update('\n{}\n'.format(os.path.basename(path)).encode('utf-8'))
+        with open(path, 'rb') as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+def evaluation_digest(params, config_text, driver_config=None):
+    """Compute a digest of the inputs of an evaluation.
+
+    Parameters
+    ----------
+    params : dict
+      The contents of the parameters file, from `read_params_file`.
+    config_text : str
+      The rendered model configuration file.
+    driver_config : dict, optional
+      The driver configuration, which sets how responses are computed.
+
+    Returns
+    -------
+    str
+      A hex digest that identifies the evaluation.
+
+    """
+    record = {
+        'eval_id': params['eval_id'],
+        'variables': [[name, repr(value)] for name, value in
+                      params['variables'].items()],
+        'response_descriptors': params['response_descriptors'],
+        'driver': driver_config,
+        }
+    digest = hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8'))
+    digest.update(config_text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def write_completion(eval_directory, digest, values):
+    """Record the responses of a finished evaluation."""
+    path = os.path.join(eval_directory, COMPLETION_FILE)
+    with open(path + '.tmp', 'w') as fp:
+        json.dump({'digest': digest, 'values': list(values)}, fp)
+    os.rename(path + '.tmp', path)
+
+
+def read_completion(eval_directory, digest):
+    """Get the recorded responses of an evaluation.
+
+    Returns
+    -------
+    list of float or None
+      The responses, or None if the evaluation didn't finish or its
+      inputs differ.
+
+    """
+    try:
+        with open(os.path.join(eval_directory, COMPLETION_FILE), 'r') as fp:
+            record = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+    if record.get('digest') != digest:
+        return None
+    return record['values']
+
+
+def experiment_fingerprint(run_directory, files, input_file=None):
+    """Compute a digest of the inputs of an experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    files : list of str
+      The files that define the experiment, relative to the run
+      directory, such as the driver configuration and the model
+      template.
+    input_file : str, optional
+      The Dakota input file, relative to the run directory. Only the
+      blocks that determine the evaluations, not the method, are part
+      of the fingerprint.
+
+    """
+    digest = hashlib.sha256(file_digest(
+        [os.path.join(run_directory, name) for name in files
+         if os.path.isfile(os.path.join(run_directory, name))]).encode(
+             'utf-8'))
+    if input_file is not None:
+        blocks = read_input_file(os.path.join(run_directory, input_file))
+        for name in EVALUATION_BLOCKS:
+            digest.update('\n{}\n'.format(name).encode('utf-8'))
+            digest.update('\n'.join(get_block(blocks, name)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def setup_fingerprint(component, model_parameters):
+    """Compute a digest of the setup of a model.
+
+    Parameters
+    ----------
+    component : str
+      The name of the model component.
+    model_parameters : dict
+      The parameters the model is set up with.
+
+    """
+    record = {'component': component, 'parameters': model_parameters}
+    return hashlib.sha256(json.dumps(record, sort_keys=True,
+                                     default=repr).encode('utf-8')).hexdigest()
+
+
+def previous_setup(run_directory, template_file, fingerprint):
+    """Check whether an earlier attempt set up the model the same way.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where the model is set up.
+    template_file : str
+      The Dakota template file made by the setup, relative to the run
+      directory.
+    fingerprint : str
+      The fingerprint of the setup, from `setup_fingerprint`.
+
+    Returns
+    -------
+    bool
+      True if the template was made by a setup with this fingerprint.
+
+    """
+    try:
+        with open(os.path.join(run_directory, SETUP_FILE), 'r') as fp:
+            record = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return False
+    return (record.get('fingerprint') == fingerprint and
+            record.get('template_file') == template_file and
+            os.path.isfile(os.path.join(run_directory, template_file)))
+
+
+def record_setup(run_directory, template_file, fingerprint):
+    """Record the setup of a model, once its template is made."""
+    with open(os.path.join(run_directory, SETUP_FILE), 'w') as fp:
+        json.dump({'fingerprint': fingerprint,
+                   'template_file': template_file}, fp)
+
+
+def previous_restart(run_directory, fingerprint):
+    """Set aside the restart file left by an earlier attempt.
+
+    The restart file is moved to ``dakota.rst.N``, with the lowest
+    unused N, so the new attempt can write its own, and the fingerprint
+    of the new attempt is recorded with it.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    fingerprint : str
+      The fingerprint of the experiment, from `experiment_fingerprint`.
+
+    Returns
+    -------
+    str or None
+      The name of the earlier restart file, relative to the run
+      directory, or None if there isn't one for this experiment.
+
+    """
+    path = os.path.join(run_directory, RESTART_FILE)
+    fingerprint_path = os.path.join(run_directory, FINGERPRINT_FILE)
+    try:
+        with open(fingerprint_path, 'r') as fp:
+            previous = json.load(fp).get('fingerprint')
+    except (IOError, OSError, ValueError):
+        previous = None
+    with open(fingerprint_path, 'w') as fp:
+        json.dump({'fingerprint': fingerprint}, fp)
+
+    if (previous != fingerprint or not os.path.isfile(path) or
+            os.path.getsize(path) == 0):
+        return None
+
+    n = 1
+    while os.path.exists('{}.{}'.format(path, n)):
+        n += 1
+    os.rename(path, '{}.{}'.format(path, n))
+    return '{}.{}'.format(RESTART_FILE, n)
+
+
+def run_dakota(run_directory, input_file='dakota.in',
+               output_file='dakota.out', read_restart=None):
+    """Run Dakota, replaying the evaluations of a restart file.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    input_file : str, optional
+      The Dakota input file, relative to the run directory.
+    output_file : str, optional
+      The Dakota output file.
+    read_restart : str, optional
+      A restart file of an earlier attempt.
+
+    """
+    command = ['dakota', '-i', input_file, '-o', output_file]
+    if read_restart is not None:
+        command += ['-read_restart', read_restart]
+    subprocess.check_call(command, cwd=run_directory)
@@ -0,0 +1,337 @@
+"""Limit the disk space used by the run directories of an experiment.
+
+Dakotathon saves every evaluation's work directory, with all of the
+model's input and output files. A retention policy instead keeps only
+the parameters and results files of each evaluation, which hold its
+variables and extracted responses, and optionally the full output of
+the evaluations with the most extreme responses, compressed, within a
+disk budget. A policy is a dict with the keys:
+
+keep_extreme
+  The number of evaluations whose full output is kept (default 0).
+response
+  The response function, by index or descriptor, that ranks the
+  evaluations (default is the first).
+extreme
+  'high' (the default) to rank the largest responses first, 'low' for
+  the smallest, or 'both' for the farthest from the median.
+compress
+  If True (the default), keep full output as a compressed archive,
+  `output.tar.gz`, in the evaluation directory.
+disk_budget
+  The most space the run directories may use, in bytes or as a string
+  like '2 GB'. When it's exceeded, the kept output of the least
+  extreme evaluations is evicted first.
+
+The policy is applied by the driver as each evaluation finishes, to
+that evaluation only: the evaluations whose output is kept, with their
+responses and sizes, and the disk used by the others are recorded in
+`retention.json` in the run directory, under a lock shared by the
+drivers of evaluations that run at once. An evaluation outside the
+current top ``keep_extreme`` can never move back into it, so its
+output is removed right away, without being archived; one that enters
+the top is archived, and the least extreme of the kept evaluations
+then has its output removed. When the experiment is done, the policy
+is applied once more to all of the run directories, and the record is
+rebuilt from them.
+
+"""
+import os
+import re
+import json
+import shutil
+import tarfile
+
+import numpy as np
+
+from .evaluations import (list_run_directories, PARAMETERS_FILE,
+                          RESULTS_FILE, TIMING_FILE, COMPLETION_FILE,
+                          PROFILE_FILE)
+from .locking import FileLock
+from .params import read_results_file
+
+
+KEEP_FILES = (PARAMETERS_FILE, RESULTS_FILE, TIMING_FILE,
+              COMPLETION_FILE, PROFILE_FILE)
+ARCHIVE_FILE = 'output.tar.gz'
+RETENTION_FILE = 'retention.json'
+LOCK_FILE = '.retention.lock'
+UNITS = {'': 1, 'B': 1, 'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12}
+
+
+def parse_size(size):
+    """Convert a size like '2 GB' to bytes."""
+    if size is None or isinstance(size, (int, float)):
+        return size
+    match = re.match(r'^\s*([\d.]+)\s*([KMGT]?B?)\s*$', size.upper())
+    if not match:
+        raise ValueError('bad disk size: {}'.format(size))
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+
+class RetentionPolicy(object):
+
+    """What to keep of the run directories of an experiment.
+
+    Parameters
+    ----------
+    keep_extreme : int, optional
+      The number of evaluations whose full output is kept.
+    response : int or str, optional
+      The response function that ranks the evaluations.
+    extreme : {'high', 'low', 'both'}, optional
+      Which responses are the most extreme.
+    compress : bool, optional
+      Whether to keep full output as a compressed archive.
+    disk_budget : int, float or str, optional
+      The most space the run directories may use.
+
+    """
+
+    def __init__(self, keep_extreme=0, response=0, extreme='high',
+                 compress=True, disk_budget=None):
+        if extreme not in ('high', 'low', 'both'):
+            raise ValueError('extreme must be high, low or both')
+        self.keep_extreme = int(keep_extreme)
+        self.response = response
+        self.extreme = extreme
+        self.compress = compress
+        self.disk_budget = parse_size(disk_budget)
+
+    def response_value(self, eval_directory):
+        """Get the ranking response of a finished evaluation."""
+        results_file = os.path.join(eval_directory, RESULTS_FILE)
+        if isinstance(self.response, int):
+            return read_results_file(results_file)[self.response]
+        with open(results_file, 'r') as fp:
+            for line in fp:
+                tokens = line.split()
+                if len(tokens) > 1 and tokens[1] == self.response:
+                    return float(tokens[0])
+        raise KeyError('{}: no response {}'.format(results_file,
+                                                   self.response))
+
+
+def directory_size(path):
+    """Get the total size of the files under a directory, in bytes."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+def _output_entries(eval_directory):
+    return [name for name in os.listdir(eval_directory)
+            if name not in KEEP_FILES and name != ARCHIVE_FILE]
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def has_output(eval_directory):
+    """Check whether an evaluation still has its full output."""
+    return bool(_output_entries(eval_directory) or
+                os.path.exists(os.path.join(eval_directory, ARCHIVE_FILE)))
+
+
+def archive_output(eval_directory):
+    """Compress the output of an evaluation into an archive."""
+    entries = _output_entries(eval_directory)
+    if not entries:
+        return
+    archive = os.path.join(eval_directory, ARCHIVE_FILE)
+    with tarfile.open(archive + '.tmp', 'w:gz') as tar:
+        for name in entries:
+            tar.add(os.path.join(eval_directory, name), arcname=name)
+    os.rename(archive + '.tmp', archive)
+    for name in entries:
+        _remove(os.path.join(eval_directory, name))
+
+
+def evict_output(eval_directory):
+    """Remove all but the parameters and results of an evaluation."""
+    for name in _output_entries(eval_directory) + [ARCHIVE_FILE]:
+        _remove(os.path.join(eval_directory, name))
+
+
+def _sort_keys(policy, values, center=None):
+    # The most extreme evaluations have the smallest keys.
+    values = np.asarray(values, dtype=float)
+    if policy.extreme == 'high':
+        return -values
+    if policy.extreme == 'low':
+        return values
+    return -np.abs(values - center)
+
+
+def _response_values(run_directory, policy):
+    dirs, values = [], []
+    for _, path in list_run_directories(run_directory):
+        try:
+            values.append(policy.response_value(path))
+        except (IOError, OSError, IndexError, KeyError, ValueError):
+            continue
+        dirs.append(path)
+    return dirs, values
+
+
+def rank_evaluations(run_directory, policy):
+    """Rank the finished evaluations of an experiment by extremeness.
+
+    Returns
+    -------
+    list of str
+      The evaluation directories, most extreme first.
+
+    """
+    dirs, values = _response_values(run_directory, policy)
+    if not dirs:
+        return []
+    order = np.argsort(_sort_keys(policy, values, np.median(values)),
+                       kind='mergesort')
+    return [dirs[i] for i in order]
+
+
+def read_retention(run_directory):
+    """Read the record of what a retention policy has kept."""
+    try:
+        with open(os.path.join(run_directory, RETENTION_FILE), 'r') as fp:
+            return json.load(fp)
+    except (IOError, OSError, ValueError):
+        return {'kept': [], 'disk_usage': 0., 'values': []}
+
+
+def write_retention(run_directory, record):
+    """Write the record of what a retention policy has kept, atomically."""
+    path = os.path.join(run_directory, RETENTION_FILE)
+    with open(path + '.tmp', 'w') as fp:
+        json.dump(record, fp)
+    os.replace(path + '.tmp', path)
+
+
+def _may_keep(policy, record, value):
+    if policy.keep_extreme <= 0:
+        return False
+    if len(record['kept']) < policy.keep_extreme:
+        return True
+    values = record['values'] + [value]
+    keys = _sort_keys(policy, [value] + [entry[1] for entry in
+                                         record['kept']],
+                      np.median(values))
+    return keys[0] < keys[1:].max()
+
+
+def _enforce(run_directory, policy, record):
+    # Trim the kept evaluations to the policy's number, most extreme
+    # first, and then to its disk budget; the record's disk usage is of
+    # the evaluations that aren't kept.
+    kept = record['kept']
+    if kept:
+        center = np.median(record['values'] or [0.])
+        order = np.argsort(_sort_keys(policy, [entry[1] for entry in kept],
+                                      center), kind='mergesort')
+        kept = [kept[i] for i in order]
+
+    evicted = 0
+    used = record['disk_usage'] + sum(entry[2] for entry in kept)
+    while kept and (len(kept) > policy.keep_extreme or
+                    (policy.disk_budget is not None and
+                     used > policy.disk_budget)):
+        name, _, size = kept.pop()
+        path = os.path.join(run_directory, name)
+        evict_output(path)
+        evicted += 1
+        size_left = directory_size(path)
+        record['disk_usage'] += size_left
+        used += size_left - size
+    record['kept'] = kept
+    return evicted, used
+
+
+def apply_retention(run_directory, policy, eval_directory=None):
+    """Apply a retention policy to the run directories of an experiment.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota is run.
+    policy : RetentionPolicy
+      The retention policy.
+    eval_directory : str, optional
+      An evaluation that just finished, to apply the policy to; its
+      output is archived if it may be kept. If not given, the policy is
+      applied to all of the evaluations.
+
+    Returns
+    -------
+    dict
+      The number of evaluations with full output kept and evicted, and
+      the disk space used by the run directories.
+
+    """
+    lock = FileLock(os.path.join(run_directory, LOCK_FILE))
+    if eval_directory is None:
+        with lock:
+            return _apply_to_all(run_directory, policy)
+
+    name = os.path.basename(os.path.abspath(eval_directory))
+    value = policy.response_value(eval_directory)
+    with lock:
+        keep = _may_keep(policy, read_retention(run_directory), value)
+
+    # Only this driver writes to its evaluation, so it's archived or
+    # evicted without holding the lock; it's not in the record until
+    # it's done, so no other driver evicts it meanwhile.
+    evicted = 0
+    if not keep and has_output(eval_directory):
+        evict_output(eval_directory)
+        evicted += 1
+    elif policy.compress:
+        archive_output(eval_directory)
+    size = directory_size(eval_directory)
+
+    with lock:
+        record = read_retention(run_directory)
+        record['values'].append(value)
+        record['kept'] = [entry for entry in record['kept']
+                          if entry[0] != name]
+        if keep:
+            record['kept'].append([name, value, size])
+        else:
+            record['disk_usage'] += size
+        trimmed, used = _enforce(run_directory, policy, record)
+        write_retention(run_directory, record)
+    return {
+        'kept': len(record['kept']),
+        'evicted': evicted + trimmed,
+        'disk_usage': used,
+        }
+
+
+def _apply_to_all(run_directory, policy):
+    dirs, values = _response_values(run_directory, policy)
+    record = {'kept': [], 'disk_usage': 0., 'values': values}
+    for path, value in zip(dirs, values):
+        if has_output(path):
+            record['kept'].append([os.path.basename(path), value,
+                                   directory_size(path)])
+        else:
+            record['disk_usage'] += directory_size(path)
+    evicted, used = _enforce(run_directory, policy, record)
+    write_retention(run_directory, record)
+    return {
+        'kept': len(record['kept']),
+        'evicted': evicted,
+        'disk_usage': used,
+        }
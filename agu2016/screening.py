@@ -0,0 +1,368 @@
+"""Screen the uncertain inputs of the model before a costly study.
+
+The studies vary only the starting mean annual temperature and total
+annual precipitation, but Hydrotrend has many more uncertain inputs:
+the lapse rate, rain mass balance coefficient, base flow, and the BQART
+lithology and anthropogenic factors, among others. A 1000-year Latin
+hypercube or polynomial chaos study of all of them would need far too
+many runs. A screening run ranks the inputs cheaply instead, by the
+elementary effects method of Morris (1991):
+
+1. a design of ``r`` trajectories is drawn on a grid of ``p`` levels
+   of the unit hypercube, each a start point and ``k`` steps, one per
+   input, of ``delta = p / (2 (p - 1))``, so the model runs ``r (k +
+   1)`` times; optionally, the trajectories are the ``r`` of a larger
+   set of candidates that are most spread out (Campolongo et al.,
+   2007);
+2. the model is run at the design, scaled to the bounds of the
+   variables, through a batch scheduler (see `agu2016.batch`);
+3. each step gives the elementary effect of its input, the change of
+   each response over the step, relative to the step on the unit
+   hypercube. The mean of their absolute values, ``mu_star``, ranks
+   the inputs by their influence, and their standard deviation,
+   ``sigma``, flags inputs with nonlinear effects or interactions.
+
+The inputs with the largest ``mu_star`` are kept, and the others are
+fixed at nominal values, by default the middle of their bounds. The
+ranking is written to `screening.json` along with the reduced
+experiment, the experiment of the screening run with only the kept
+inputs as variables, for the follow-up Sampling or PolynomialChaos
+study.
+
+"""
+import os
+import json
+
+import numpy as np
+
+from .adaptive import uniform_variables
+from .batch import make_jobs, collect_results
+from .dakota_input import get_keyword_values
+from .tabular import write_tabular_file
+
+
+SCREENING_FILE = 'screening.json'
+VARIABLE_KEYS = ('descriptors', 'lower_bounds', 'upper_bounds')
+
+
+def _spread(candidates, trajectories):
+    # Campolongo's distance between two trajectories, the sum of the
+    # distances between their points; one candidate at a time, to bound
+    # memory.
+    distance = np.empty((len(candidates), len(candidates)))
+    for m, trajectory in enumerate(candidates):
+        diff = trajectory[None, :, None, :] - candidates[:, None, :, :]
+        distance[m] = np.sqrt((diff ** 2).sum(axis=3)).sum(axis=(1, 2))
+
+    # Pick greedily, rather than search every combination.
+    chosen = list(np.unravel_index(distance.argmax(), distance.shape))
+    while len(chosen) < trajectories:
+        total = distance[:, chosen].sum(axis=1)
+        total[chosen] = -1.
+        chosen.append(total.argmax())
+    return candidates[np.array(chosen)]
+
+
+def morris_design(trajectories, dimensions, levels, rng, candidates=None):
+    """Draw a design of Morris trajectories on the unit hypercube.
+
+    Parameters
+    ----------
+    trajectories : int
+      The number of trajectories.
+    dimensions : int
+      The number of variables.
+    levels : int
+      The number of levels of the grid, an even number.
+    rng : RandomState
+      The random number generator.
+    candidates : int, optional
+      The number of trajectories to draw, from which the most spread
+      out are chosen.
+
+    Returns
+    -------
+    ndarray
+      The points of each trajectory, with shape ``(trajectories,
+      dimensions + 1, dimensions)``. Each point differs from the one
+      before it in one variable, by ``levels / (2 (levels - 1))``.
+
+    Examples
+    --------
+    >>> design = morris_design(4, 3, 4, np.random.RandomState(0))
+    >>> design.shape
+    (4, 4, 3)
+    >>> steps = np.abs(np.diff(design, axis=1))
+    >>> bool(np.all((steps > 0).sum(axis=2) == 1))
+    True
+    >>> bool(np.allclose(steps.sum(axis=2), 2. / 3.))
+    True
+
+    """
+    if levels < 2 or levels % 2:
+        raise ValueError('the number of levels must be even')
+    n = max(int(candidates or 0), trajectories)
+    delta = levels / (2. * (levels - 1))
+
+    # Morris's B* = (J x* + delta / 2 ((2 B - J) D* + J)) P*, with the
+    # permutation P* applied to the columns of B rather than to B*.
+    steps = np.tril(np.ones((dimensions + 1, dimensions)), -1)
+    order = np.argsort(rng.uniform(size=(n, dimensions)), axis=1)
+    steps = steps[:, order].transpose(1, 0, 2)
+    start = rng.randint(levels // 2, size=(n, 1, dimensions)) / (levels - 1.)
+    signs = rng.choice([-1., 1.], size=(n, 1, dimensions))
+    design = start + delta / 2. * ((2. * steps - 1.) * signs + 1.)
+
+    if n > trajectories:
+        design = _spread(design, trajectories)
+    return design
+
+
+def elementary_effects(design, responses):
+    """Compute the elementary effects of the inputs along trajectories.
+
+    Parameters
+    ----------
+    design : ndarray
+      The trajectories on the unit hypercube, with shape ``(r, k + 1,
+      k)``.
+    responses : ndarray
+      The responses at the points of the trajectories, with shape
+      ``(r, k + 1, m)``.
+
+    Returns
+    -------
+    ndarray
+      The elementary effect of each input on each response, in each
+      trajectory, with shape ``(r, k, m)``.
+
+    """
+    steps = np.diff(design, axis=1)
+    inputs = np.abs(steps).argmax(axis=2)
+    delta = np.take_along_axis(steps, inputs[:, :, np.newaxis], axis=2)
+    effects = np.empty((design.shape[0], design.shape[2],
+                        responses.shape[2]))
+    effects[np.arange(len(design))[:, np.newaxis], inputs] = (
+        np.diff(responses, axis=1) / delta)
+    return effects
+
+
+def screening_measures(effects):
+    """Compute the Morris measures from elementary effects.
+
+    Returns
+    -------
+    dict
+      ``mu``, ``mu_star`` and ``sigma`` of each input and response,
+      with shape ``(k, m)``.
+
+    """
+    ddof = 1 if len(effects) > 1 else 0
+    return {
+        'mu': effects.mean(axis=0),
+        'mu_star': np.abs(effects).mean(axis=0),
+        'sigma': effects.std(axis=0, ddof=ddof),
+        }
+
+
+def select_inputs(mu_star, keep=None, threshold=0.1):
+    """Choose the inputs to keep from their ``mu_star``.
+
+    Parameters
+    ----------
+    mu_star : array_like
+      The ``mu_star`` of each input.
+    keep : int, optional
+      The number of inputs to keep, the most influential.
+    threshold : float, optional
+      Without `keep`, keep the inputs whose ``mu_star`` is at least
+      this fraction of the largest.
+
+    Returns
+    -------
+    ndarray
+      The indices of the inputs to keep, most influential first.
+
+    Examples
+    --------
+    >>> select_inputs([0.5, 10., 0.01, 2.]).tolist()
+    [1, 3]
+    >>> select_inputs([0.5, 10., 0.01, 2.], keep=3).tolist()
+    [1, 3, 0]
+
+    """
+    mu_star = np.asarray(mu_star, dtype=float)
+    ranked = np.argsort(-mu_star, kind='mergesort')
+    if keep is not None:
+        return ranked[:max(int(keep), 1)]
+    kept = mu_star[ranked] >= threshold * mu_star[ranked[0]]
+    kept[0] = True
+    return ranked[kept]
+
+
+def run_screening(input_file, scheduler, run_directory='.',
+                  tabular_file='dakota.dat', trajectories=10, levels=4,
+                  candidates=None, budget=None, keep=None, threshold=0.1,
+                  response=0, nominal_values=None):
+    """Rank the inputs of a model by their elementary effects.
+
+    Parameters
+    ----------
+    input_file : str
+      The Dakota input file, relative to the run directory. Its
+      variables are the inputs to screen.
+    scheduler : LocalScheduler or QueueScheduler
+      The scheduler that runs the model.
+    run_directory : str, optional
+      The directory where Dakota is run.
+    tabular_file : str, optional
+      The tabular file of the model runs.
+    trajectories : int, optional
+      The number of trajectories.
+    levels : int, optional
+      The number of levels of the grid, an even number.
+    candidates : int, optional
+      The number of trajectories to choose the most spread out from.
+    budget : int, optional
+      The most model runs, in place of the number of trajectories.
+    keep : int, optional
+      The number of inputs to keep.
+    threshold : float, optional
+      Without `keep`, keep the inputs whose ``mu_star`` is at least
+      this fraction of the largest.
+    response : int, optional
+      The index of the response function that ranks the inputs.
+    nominal_values : dict, optional
+      The values at which to fix inputs that are screened out (default
+      is the middle of their bounds).
+
+    Returns
+    -------
+    dict
+      The Morris measures of each input and response, the ranking of
+      the inputs by the screening response, the inputs kept and the
+      nominal values of the others.
+
+    """
+    input_path = os.path.join(run_directory, input_file)
+    seed = get_keyword_values(input_path, 'method', 'seed')
+    rng = np.random.RandomState(int(seed[0]) if seed else None)
+    descriptors, lower, upper = uniform_variables(input_path)
+    dimensions = len(descriptors)
+    if budget is not None:
+        trajectories = int(budget) // (dimensions + 1)
+    if trajectories < 2:
+        raise ValueError('screening needs at least two trajectories, or '
+                         '{} model runs'.format(2 * (dimensions + 1)))
+
+    design = morris_design(int(trajectories), dimensions, int(levels), rng,
+                           candidates=candidates)
+    points = lower + design.reshape(-1, dimensions) * (upper - lower)
+    eval_ids = np.arange(len(points)) + 1
+    jobs = make_jobs(input_path, eval_ids, descriptors, points,
+                     run_directory=run_directory)
+    scheduler.run(jobs)
+    values = collect_results(jobs)
+
+    response_descriptors = get_keyword_values(input_path, 'responses',
+                                              'response_descriptors')
+    write_tabular_file(os.path.join(run_directory, tabular_file), eval_ids,
+                       descriptors + response_descriptors,
+                       np.hstack([points, values]))
+
+    measures = screening_measures(elementary_effects(
+        design, values.reshape(design.shape[:2] + (-1,))))
+    selected = select_inputs(measures['mu_star'][:, response], keep=keep,
+                             threshold=threshold)
+    nominal = dict(zip(descriptors, ((lower + upper) / 2.).tolist()))
+    nominal.update(nominal_values or {})
+
+    report = {
+        'runs': len(points),
+        'trajectories': int(trajectories),
+        'levels': int(levels),
+        'response': response_descriptors[response],
+        'measures': dict(
+            (name, dict((key, dict(zip(descriptors,
+                                       measures[key][:, j].tolist())))
+                        for key in measures))
+            for j, name in enumerate(response_descriptors)),
+        'ranking': [descriptors[i] for i in np.argsort(
+            -measures['mu_star'][:, response], kind='mergesort')],
+        'selected': [descriptors[i] for i in selected],
+        'nominal_values': dict((name, nominal[name]) for name in descriptors
+                               if name not in
+                               [descriptors[i] for i in selected]),
+        }
+    with open(os.path.join(run_directory, SCREENING_FILE), 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    return report
+
+
+def reduce_experiment(experiment, report):
+    """Get the experiment of a follow-up study, with the kept inputs.
+
+    Parameters
+    ----------
+    experiment : dict
+      The experiment of the screening run.
+    report : dict
+      The report of the screening run.
+
+    Returns
+    -------
+    dict
+      The experiment, without its screening option, with only the kept
+      inputs as variables and the others set to their nominal values.
+
+    """
+    descriptors = list(experiment['descriptors'])
+    kept = [descriptors.index(name) for name in descriptors
+            if name in report['selected']]
+    reduced = dict(experiment)
+    reduced.pop('screening', None)
+    for key in VARIABLE_KEYS:
+        if key in reduced:
+            reduced[key] = [experiment[key][i] for i in kept]
+    reduced.update(report['nominal_values'])
+    return reduced
+
+
+def write_reduced_experiment(run_directory, experiment):
+    """Add the reduced experiment to the report of a screening run.
+
+    Returns
+    -------
+    dict
+      The reduced experiment.
+
+    """
+    path = os.path.join(run_directory, SCREENING_FILE)
+    with open(path, 'r') as fp:
+        report = json.load(fp)
+    report['experiment'] = reduce_experiment(experiment, report)
+    with open(path, 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    return report['experiment']
+
+
+def load_reduced_experiment(directory):
+    """Get the reduced experiment of the screening run in a directory."""
+    with open(os.path.join(directory, SCREENING_FILE), 'r') as fp:
+        return json.load(fp)['experiment']
+
+
+def format_screening_report(report):
+    """Format the report of a screening run for the console."""
+    measures = report['measures'][report['response']]
+    lines = ['Elementary effects on {response} from {runs} runs '
+             '({trajectories} trajectories, {levels} levels):'.format(
+                 **report)]
+    for name in report['ranking']:
+        line = '  {:<40} mu* = {:.4g}, mu = {:.4g}, sigma = {:.4g}'.format(
+            name, measures['mu_star'][name], measures['mu'][name],
+            measures['sigma'][name])
+        if name in report['nominal_values']:
+            line += ', fixed at {:g}'.format(report['nominal_values'][name])
+        lines.append(line)
+    return '\n'.join(lines)
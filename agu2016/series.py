@@ -0,0 +1,155 @@
+"""A binary, memory-mappable file format for model output series.
+
+Hydrotrend writes each output variable to its own ASCII file, which has
+to be parsed back to compute a response. A series file instead holds
+all of the output variables of a run in one binary array that's read
+with `numpy.memmap`, so reading a variable is a zero-copy view of the
+file. A series file is laid out as::
+
+  magic       8 bytes, b'AGUSERS1'
+  length      4 bytes, little-endian uint32, the length of the header
+  header      JSON, padded with spaces so the data is 64-byte aligned
+  data        little-endian float64, one row of variables per time step
+
+The header holds the names and units of the variables, the number of
+time steps, and the time step and its units. Rows are appended as the
+model steps and the step count is filled in when the file is closed.
+
+"""
+import json
+import struct
+
+import numpy as np
+
+
+MAGIC = b'AGUSERS1'
+ALIGNMENT = 64
+DTYPE = np.dtype('<f8')
+
+
+def _pack_header(header, length=None):
+    text = json.dumps(header, sort_keys=True).encode('utf-8')
+    if length is None:
+        # Leave room for the step count to grow when the file is closed.
+        length = len(MAGIC) + 4 + len(text) + 32
+        length += -length % ALIGNMENT
+        length -= len(MAGIC) + 4
+    if len(text) > length:
+        raise ValueError('series header is too long')
+    return MAGIC + struct.pack('<I', length) + text.ljust(length)
+
+
+class SeriesWriter(object):
+
+    """Write model output series to a series file as the model steps.
+
+    Parameters
+    ----------
+    path : str
+      Path to the series file.
+    variables : list of str
+      The names of the output variables.
+    units : list of str, optional
+      The units of the variables.
+    time_step : float, optional
+      The model time step.
+    time_units : str, optional
+      The units of the time step.
+    chunk_size : int, optional
+      The number of time steps to buffer between writes.
+
+    """
+
+    def __init__(self, path, variables, units=None, time_step=1.,
+                 time_units='d', chunk_size=8192):
+        self.path = path
+        self.header = {
+            'variables': list(variables),
+            'units': list(units or [''] * len(variables)),
+            'time_step': time_step,
+            'time_units': time_units,
+            'dtype': DTYPE.str,
+            'count': 0,
+            }
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self._fp = open(path, 'wb')
+        packed = _pack_header(self.header)
+        self._header_length = len(packed) - len(MAGIC) - 4
+        self._fp.write(packed)
+
+    def append(self, values):
+        """Append the values of the variables at a time step."""
+        self.chunk.append(values)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.chunk:
+            self._fp.write(np.array(self.chunk, dtype=DTYPE).tobytes())
+            self.header['count'] += len(self.chunk)
+            self.chunk = []
+
+    def close(self):
+        """Write any buffered steps and the final header."""
+        self.flush()
+        self._fp.seek(0)
+        self._fp.write(_pack_header(self.header, self._header_length))
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SeriesFile(object):
+
+    """A series file, memory-mapped for reading.
+
+    Parameters
+    ----------
+    path : str
+      Path to the series file.
+
+    Examples
+    --------
+    >>> series = SeriesFile('HYDRO_OUTPUT/hydrotrend.bin')  # doctest: +SKIP
+    >>> cs = series['channel_exit_water_sediment~'
+    ...             'suspended__mass_concentration']  # doctest: +SKIP
+
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            if fp.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{}: not a series file'.format(path))
+            length, = struct.unpack('<I', fp.read(4))
+            self.header = json.loads(fp.read(length).decode('utf-8'))
+        self.path = path
+        self.variables = self.header['variables']
+        shape = (self.header['count'], len(self.variables))
+        if shape[0]:
+            self.data = np.memmap(path, dtype=self.header['dtype'], mode='r',
+                                  offset=len(MAGIC) + 4 + length, shape=shape)
+        else:
+            self.data = np.empty(shape, dtype=self.header['dtype'])
+
+    def units(self, name):
+        """Get the units of a variable."""
+        return self.header['units'][self.variables.index(name)]
+
+    def __getitem__(self, name):
+        """Get the series of a variable, as a view into the file."""
+        return self.data[:, self.variables.index(name)]
+
+    def __contains__(self, name):
+        return name in self.variables
+
+    def __len__(self):
+        return self.header['count']
+
+    def as_dict(self):
+        """Get views of the series of all variables, keyed by name."""
+        return dict((name, self[name]) for name in self.variables)
@@ -0,0 +1,333 @@
+"""Stage the run directories of evaluations.
+
+Every evaluation renders the model configuration file from the
+experiment's template with its variable values, and needs the
+experiment's auxiliary files, such as Hydrotrend's hypsometry, in its
+``run.N`` directory. For thousands of short evaluations on a network
+file system, copying those files costs about as much as running the
+model, so staging is done in two layers:
+
+* The template is parsed once into a `CompiledTemplate`, which renders
+  a configuration file by joining its literal text with the formatted
+  variable values, and can render every point of a batch at once.
+* The auxiliary files are copied once into a read-only shared layer,
+  `inputs` in the experiment's run directory, and each evaluation
+  gets hard links to them, falling back to symbolic links, then to
+  copies, where the file system doesn't allow it. The files are made
+  read-only, so a model can't change the shared copy through its link.
+
+When the evaluations are run as batch jobs (see `agu2016.batch`), all
+of their run directories are staged before the jobs are submitted, and
+a small marker file tells the driver that it doesn't need to stage its
+own directory again.
+
+"""
+import os
+import stat
+import shutil
+import string
+import hashlib
+from multiprocessing.pool import ThreadPool
+
+
+SHARED_INPUTS = 'inputs'
+STAGED_FILE = 'staged.sha256'
+STAGING_MODES = ('link', 'symlink', 'copy')
+
+
+def disable_ascii_output(config_text):
+    """Turn off the ASCII output files of a Hydrotrend configuration."""
+    lines = config_text.split('\n')
+    for i, line in enumerate(lines):
+        if 'Write output to ASCII files' in line:
+            lines[i] = line.replace('ON', 'OFF', 1)
+    return '\n'.join(lines)
+
+
+class CompiledTemplate(object):
+
+    """A model configuration template, parsed once for fast rendering.
+
+    Parameters
+    ----------
+    text : str
+      The template, with ``{name}`` replacement fields as for
+      `str.format`.
+
+    Examples
+    --------
+    >>> template = CompiledTemplate('T = {T:.1f}\\nP = {P}\\n')
+    >>> template.names
+    ['T', 'P']
+    >>> print(template.render({'T': 14.26, 'P': 1.5}), end='')
+    T = 14.3
+    P = 1.5
+    >>> template.render_many(['T', 'P'], [[1., 2.], [3., 4.]])
+    ['T = 1.0\\nP = 2.0\\n', 'T = 3.0\\nP = 4.0\\n']
+
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._literals = []
+        self._fields = []
+        for literal, name, spec, conversion in string.Formatter().parse(text):
+            self._literals.append(literal)
+            if name is not None:
+                if not name or not name.isidentifier():
+                    raise ValueError(
+                        'unsupported replacement field: {{{}}}'.format(name))
+                self._fields.append((name, spec or '', conversion))
+
+    @property
+    def names(self):
+        """The names of the variables in the template, in order."""
+        return [name for name, _, _ in self._fields]
+
+    def _format(self, value, spec, conversion):
+        if conversion == 'r':
+            value = repr(value)
+        elif conversion == 's':
+            value = str(value)
+        elif conversion == 'a':
+            value = ascii(value)
+        return format(value, spec)
+
+    def _join(self, values):
+        parts = [None] * (len(self._literals) + len(values))
+        parts[::2] = self._literals
+        parts[1::2] = values
+        return ''.join(parts)
+
+    def render(self, variables):
+        """Render the template with a dict of variable values."""
+        return self._join([self._format(variables[name], spec, conversion)
+                           for name, spec, conversion in self._fields])
+
+    def render_many(self, descriptors, points):
+        """Render the template for every point of a batch.
+
+        Parameters
+        ----------
+        descriptors : list of str
+          The variable descriptors.
+        points : array_like
+          The variable values, with one row per point.
+
+        Returns
+        -------
+        list of str
+          The rendered text of each point.
+
+        """
+        points = [[float(value) for value in row] for row in points]
+        columns = []
+        for name, spec, conversion in self._fields:
+            try:
+                column = descriptors.index(name)
+            except ValueError:
+                raise KeyError(name)
+            columns.append([self._format(row[column], spec, conversion)
+                            for row in points])
+        return [self._join(values) for values in zip(*columns)] or (
+            [self._join([])] * len(points))
+
+
+_templates = {}
+
+
+def compile_template(template_file):
+    """Get the compiled form of a template file.
+
+    Compiled templates are kept for the life of the process, and
+    compiled again if the file changes.
+
+    """
+    info = os.stat(template_file)
+    key = (os.path.abspath(template_file), info.st_mtime, info.st_size)
+    if key not in _templates:
+        with open(template_file, 'r') as fp:
+            _templates[key] = CompiledTemplate(fp.read())
+    return _templates[key]
+
+
+def model_config_text(config, text):
+    """Get the configuration file the driver writes from rendered text.
+
+    With streaming responses or binary output, Hydrotrend's ASCII
+    output is turned off.
+
+    """
+    if config['streaming_responses'] or config['output_format'] == 'binary':
+        return disable_ascii_output(text)
+    return text
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_read_only(path):
+    mode = os.stat(path).st_mode
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def share_inputs(run_directory, auxiliary_files):
+    """Copy auxiliary files into the read-only shared layer.
+
+    Files that are already in the layer, with the same size and
+    modification time, aren't copied again.
+
+    Parameters
+    ----------
+    run_directory : str
+      The run directory of the experiment.
+    auxiliary_files : list of str
+      The auxiliary files, relative to the run directory.
+
+    Returns
+    -------
+    str
+      The directory of the shared layer.
+
+    """
+    shared = os.path.join(run_directory, SHARED_INPUTS)
+    if not os.path.isdir(shared):
+        os.makedirs(shared)
+    for name in auxiliary_files:
+        source = os.path.join(run_directory, name)
+        destination = os.path.join(shared, os.path.basename(name))
+        info = os.stat(source)
+        try:
+            current = os.stat(destination)
+        except OSError:
+            current = None
+        if current is not None and (current.st_size == info.st_size and
+                                    current.st_mtime == info.st_mtime):
+            continue
+        if current is not None:
+            os.remove(destination)
+        shutil.copy2(source, destination)
+        make_read_only(destination)
+    return shared
+
+
+def stage_file(source, directory, mode='link'):
+    """Put a file in an evaluation directory.
+
+    Parameters
+    ----------
+    source : str
+      The file to stage.
+    directory : str
+      The evaluation directory.
+    mode : {'link', 'symlink', 'copy'}, optional
+      Whether to hard link the file, falling back to a symbolic link
+      and then a copy, to link it symbolically, falling back to a copy,
+      or to copy it.
+
+    """
+    if mode not in STAGING_MODES:
+        raise ValueError('unknown staging mode: {}'.format(mode))
+    destination = os.path.join(directory, os.path.basename(source))
+    if os.path.lexists(destination):
+        os.remove(destination)
+    if mode == 'link':
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+    if mode in ('link', 'symlink'):
+        try:
+            os.symlink(os.path.abspath(source), destination)
+            return
+        except OSError:
+            pass
+    shutil.copy(source, destination)
+
+
+def staged_inputs(config):
+    """Get the auxiliary files an evaluation stages, and how.
+
+    Returns
+    -------
+    tuple
+      The paths of the files to stage and the staging mode.
+
+    """
+    mode = config.get('staging', 'copy')
+    source = config['run_directory']
+    if mode != 'copy' and config.get('shared_inputs'):
+        source = config['shared_inputs']
+    return ([os.path.join(source, os.path.basename(name))
+             for name in config['auxiliary_files']], mode)
+
+
+def stage_directory(directory, config, text):
+    """Write an evaluation's configuration file and stage its inputs.
+
+    Parameters
+    ----------
+    directory : str
+      The evaluation directory.
+    config : dict
+      The driver configuration.
+    text : str
+      The configuration file to write.
+
+    """
+    with open(os.path.join(directory, config['config_file']), 'w') as fp:
+        fp.write(text)
+    files, mode = staged_inputs(config)
+    for path in files:
+        stage_file(path, directory, mode=mode)
+
+
+def is_staged(directory, text):
+    """Check whether an evaluation directory was staged for a text."""
+    try:
+        with open(os.path.join(directory, STAGED_FILE), 'r') as fp:
+            return fp.read().strip() == text_digest(text)
+    except (IOError, OSError):
+        return False
+
+
+def stage_evaluations(config, directories, descriptors, points, threads=8):
+    """Stage the run directories of a batch of evaluations at once.
+
+    The template is rendered for every point, then the directories are
+    staged by a pool of threads, since on a network file system the
+    time goes to waiting on the server.
+
+    Parameters
+    ----------
+    config : dict
+      The driver configuration.
+    directories : list of str
+      The evaluation directories.
+    descriptors : list of str
+      The variable descriptors.
+    points : array_like
+      The variable values, with one row per evaluation.
+    threads : int, optional
+      The number of directories to stage at once.
+
+    """
+    template = compile_template(os.path.join(config['run_directory'],
+                                             config['template_file']))
+    texts = [model_config_text(config, text)
+             for text in template.render_many(descriptors, points)]
+
+    def stage(item):
+        directory, text = item
+        stage_directory(directory, config, text)
+        with open(os.path.join(directory, STAGED_FILE), 'w') as fp:
+            fp.write(text_digest(text) + '\n')
+
+    pool = ThreadPool(threads)
+    try:
+        pool.map(stage, zip(directories, texts))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,514 @@
+"""Compute the statistics of the responses of a study.
+
+Every response column of a Dakota tabular file is summarized in one
+vectorized pass over the 2-D array of values, with a column per
+response:
+
+* moments: the mean, standard deviation (with ``ddof=1``, as Dakota
+  reports it), skewness and excess kurtosis;
+* the Student's t confidence interval of the mean, as Dakota reports;
+* quantiles at probability levels;
+* exceedance probabilities of response levels, with Wilson score
+  confidence intervals;
+* optionally, percentile bootstrap confidence intervals of any of the
+  above.
+
+The bootstrap draws its resamples as a 2-D array of row indices, one
+row per resample, and counts how often each resample draws each value,
+so each statistic is computed for a whole block of resamples at once
+with matrix products and cumulative sums.
+Blocks are sized to bound memory, and may be split across worker
+processes. Each block has its own random stream, spawned from the
+seed, so the intervals don't depend on the number of processes.
+
+Example
+-------
+Summarize a study, with bootstrap intervals of its tail::
+
+  $ python -m agu2016.statistics dakota.dat --levels 40 \\
+      --probabilities 0.5 0.95 --bootstrap 2000 --processes 4
+
+or a study, or part of it, in a results store (see `agu2016.store`)::
+
+  $ python -m agu2016.statistics --store results \\
+      --study hydrotrend-RI10-sampling-study \\
+      --where 'starting_mean_annual_temperature > 14' --levels 40
+
+"""
+import json
+import argparse
+import multiprocessing
+
+import numpy as np
+from scipy import stats
+
+from .store import ResultsStore
+from .tabular import read_dat_file, response_descriptors
+
+
+PROBABILITY_LEVELS = (0.05, 0.10, 0.33, 0.50, 0.67, 0.90, 0.95)
+BLOCK_SIZE = 2 ** 22  # rows per block of bootstrap resamples
+
+
+def as_columns(values):
+    """View values as a 2-D array, with a column per response."""
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    return values
+
+
+def moments(values, axis=0):
+    """Compute the moments of each response.
+
+    Returns
+    -------
+    dict
+      The mean, standard deviation, skewness and excess kurtosis of
+      each column.
+
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[axis]
+    mean = values.mean(axis=axis)
+    deviations = values - np.expand_dims(mean, axis)
+    m2 = (deviations ** 2).mean(axis=axis)
+    m3 = (deviations ** 3).mean(axis=axis)
+    m4 = (deviations ** 4).mean(axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'mean': mean,
+            'std_dev': np.sqrt(m2 * n / (n - 1)) if n > 1 else 0. * mean,
+            'skewness': m3 / m2 ** 1.5,
+            'kurtosis': m4 / m2 ** 2 - 3.,
+            }
+
+
+def t_interval(values, confidence=0.95, axis=0):
+    """Get the Student's t confidence interval of the mean of each response.
+
+    Examples
+    --------
+    >>> lower, upper = t_interval([1., 2., 3., 4.])
+    >>> print('{:.4f} {:.4f}'.format(float(lower), float(upper)))
+    0.4457 4.5543
+
+    """
+    values = np.asarray(values, dtype=float)
+    n = values.shape[axis]
+    mean = values.mean(axis=axis)
+    if n < 2:
+        return mean, mean
+    half = (stats.t.ppf(0.5 + confidence / 2., n - 1) *
+            values.std(axis=axis, ddof=1) / np.sqrt(n))
+    return mean - half, mean + half
+
+
+def wilson_interval(p, n, confidence=0.95):
+    """Get the Wilson score confidence interval of a probability.
+
+    Parameters
+    ----------
+    p : float or ndarray
+      The observed proportion.
+    n : int
+      The number of samples.
+    confidence : float, optional
+      The confidence level.
+
+    Returns
+    -------
+    tuple
+      The lower and upper bounds.
+
+    """
+    z = stats.norm.ppf(0.5 + confidence / 2.)
+    center = (p + z ** 2 / (2. * n)) / (1. + z ** 2 / n)
+    half = (z / (1. + z ** 2 / n) *
+            np.sqrt(p * (1. - p) / n + z ** 2 / (4. * n ** 2)))
+    return center - half, center + half
+
+
+def quantiles(values, probabilities, axis=0):
+    """Get the quantiles of each response at probability levels."""
+    return np.quantile(values, probabilities, axis=axis)
+
+
+def exceedance(values, levels, axis=0):
+    """Get the probability that each response exceeds response levels."""
+    values = np.asarray(values, dtype=float)
+    levels = np.asarray(levels, dtype=float)
+    shape = levels.shape + (1,) * values.ndim
+    return (values > levels.reshape(shape)).mean(axis=axis + levels.ndim)
+
+
+def parse_statistic(name):
+    """Split a statistic like 'quantile=0.95' into its name and argument."""
+    name, _, arg = name.partition('=')
+    return name, float(arg) if arg else None
+
+
+_values = None
+_order = None
+_powers = None
+
+
+def _share_values(values):
+    """Prepare values for the bootstrap in this process.
+
+    The order of the rows doesn't matter to a bootstrap, so they're
+    sorted by the first column, whose order statistics then need no
+    reordering. The powers of the values about their mean, for the
+    moments, are computed once.
+
+    """
+    global _values, _order, _powers
+    _values = values[np.argsort(values[:, 0], kind='stable')]
+    _order = np.argsort(_values, axis=0, kind='stable')
+    centered = _values - _values.mean(axis=0)
+    _powers = [centered ** k for k in (1, 2, 3, 4)]
+
+
+def _resample_counts(rng, size, n):
+    """Draw resamples, as the number of times each row is drawn."""
+    rows = rng.integers(0, n, size=(size, n))
+    rows += (np.arange(size) * n)[:, np.newaxis]
+    return np.bincount(rows.ravel(), minlength=size * n).reshape(size, n)
+
+
+def _bootstrap_block(args):
+    """Compute statistics of a block of bootstrap resamples.
+
+    A resample is represented by how many times it draws each row, so
+    its moments and exceedance probabilities are products of the
+    counts with the values, and its quantiles are found from the
+    cumulative counts of the sorted values.
+
+    Returns
+    -------
+    ndarray
+      The statistics, with shape ``(statistics, resamples, columns)``.
+
+    """
+    names, size, seed = args
+    n = len(_values)
+    counts = _resample_counts(np.random.default_rng(seed), size, n)
+    weights = counts.astype(float)
+
+    # The moments are taken about the mean of the values, so that the
+    # central moments computed from raw moments don't lose precision.
+    raw = [weights.dot(power) / n for power in _powers]
+    mean = raw[0]
+    m2 = raw[1] - mean ** 2
+    m3 = raw[2] - 3. * mean * raw[1] + 2. * mean ** 3
+    m4 = (raw[3] - 4. * mean * raw[2] + 6. * mean ** 2 * raw[1] -
+          3. * mean ** 4)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary = {
+            'mean': mean + _values.mean(axis=0),
+            'std_dev': np.sqrt(np.maximum(m2, 0.) * n / (n - 1)),
+            'skewness': m3 / m2 ** 1.5,
+            'kurtosis': m4 / m2 ** 2 - 3.,
+            }
+
+    # Interpolate between order statistics, as np.quantile does.
+    probabilities = [arg if stat == 'quantile' else 0.5 for stat, arg in
+                     map(parse_statistic, names)
+                     if stat in ('quantile', 'median')]
+    if probabilities:
+        h = (n - 1) * np.array(probabilities)
+        ranks = np.concatenate([np.floor(h), np.ceil(h)]) + 1
+        levels = np.empty((len(probabilities), size, _values.shape[1]))
+        counts = counts.astype(np.int32)
+        for j in range(_values.shape[1]):
+            if j == 0:
+                ordered, cumulative = _values[:, 0], counts.cumsum(axis=1)
+            else:
+                ordered = _values[_order[:, j], j]
+                cumulative = counts[:, _order[:, j]].cumsum(axis=1)
+            for row in range(size):
+                at = ordered[np.searchsorted(cumulative[row], ranks)]
+                lower, upper = at[:len(h)], at[len(h):]
+                levels[:, row, j] = lower + (h - np.floor(h)) * (upper - lower)
+        levels = iter(levels)
+
+    results = []
+    for name in names:
+        stat, arg = parse_statistic(name)
+        if stat in summary:
+            results.append(summary[stat])
+        elif stat in ('quantile', 'median'):
+            results.append(next(levels))
+        elif stat == 'exceedance':
+            results.append(weights.dot((_values > arg).astype(float)) / n)
+        else:
+            raise ValueError('unknown statistic: {}'.format(name))
+    return np.array(results)
+
+
+def bootstrap(values, names, resamples=1000, confidence=0.95, seed=None,
+              processes=None):
+    """Get percentile bootstrap confidence intervals of statistics.
+
+    Parameters
+    ----------
+    values : array_like
+      The response values, with a row per sample and a column per
+      response.
+    names : list of str
+      The statistics: 'mean', 'std_dev', 'skewness', 'kurtosis',
+      'median', 'quantile=p' or 'exceedance=level'.
+    resamples : int, optional
+      The number of bootstrap resamples.
+    confidence : float, optional
+      The confidence level.
+    seed : int, optional
+      The seed of the resamples.
+    processes : int, optional
+      The number of worker processes; by default, resamples are
+      drawn in this process.
+
+    Returns
+    -------
+    tuple of ndarray
+      The lower and upper bounds, and the standard error, of each
+      statistic of each response, with shape ``(len(names), columns)``.
+
+    """
+    values = as_columns(values)
+    per_block = max(1, BLOCK_SIZE // len(values))
+    sizes = [min(per_block, resamples - start)
+             for start in range(0, resamples, per_block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    blocks = [(list(names), size, block_seed)
+              for size, block_seed in zip(sizes, seeds)]
+
+    if processes and processes > 1 and len(blocks) > 1:
+        pool = multiprocessing.Pool(min(processes, len(blocks)),
+                                    initializer=_share_values,
+                                    initargs=(values,))
+        try:
+            results = pool.map(_bootstrap_block, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _share_values(values)
+        results = [_bootstrap_block(block) for block in blocks]
+
+    # Each block is (statistics, resamples, columns).
+    replicates = np.concatenate(results, axis=1)
+    alpha = 1. - confidence
+    lower, upper = np.quantile(replicates, [alpha / 2., 1. - alpha / 2.],
+                               axis=1)
+    return lower, upper, replicates.std(axis=1, ddof=1)
+
+
+def describe(values, descriptors=None, levels=(),
+             probabilities=PROBABILITY_LEVELS, confidence=0.95,
+             resamples=0, seed=None, processes=None):
+    """Summarize the responses of a study.
+
+    Parameters
+    ----------
+    values : array_like
+      The response values, with a row per sample and a column per
+      response.
+    descriptors : list of str, optional
+      The name of each response.
+    levels : list of float, optional
+      Response levels whose exceedance probabilities are estimated.
+    probabilities : list of float, optional
+      Probability levels whose quantiles are estimated.
+    confidence : float, optional
+      The confidence level of the intervals.
+    resamples : int, optional
+      The number of bootstrap resamples, or 0 for no bootstrap.
+    seed : int, optional
+      The seed of the bootstrap.
+    processes : int, optional
+      The number of processes that draw bootstrap resamples.
+
+    Returns
+    -------
+    dict
+      For each response, its number of samples, moments, t interval of
+      the mean, quantiles and exceedance probabilities, with Wilson
+      intervals, and, with a bootstrap, the interval and standard
+      error of every statistic.
+
+    """
+    values = as_columns(values)
+    n, columns = values.shape
+    if descriptors is None:
+        descriptors = ['response_{}'.format(i + 1) for i in range(columns)]
+    levels, probabilities = list(levels), list(probabilities)
+
+    summary = moments(values)
+    t_lower, t_upper = t_interval(values, confidence=confidence)
+    levels_at = quantiles(values, probabilities) if probabilities else None
+    exceeds = exceedance(values, levels) if levels else None
+    if exceeds is not None:
+        wilson_lower, wilson_upper = wilson_interval(exceeds, n,
+                                                     confidence=confidence)
+
+    names = (['mean', 'std_dev', 'median'] +
+             ['quantile={!r}'.format(p) for p in probabilities] +
+             ['exceedance={!r}'.format(level) for level in levels])
+    if resamples:
+        boot_lower, boot_upper, boot_error = bootstrap(
+            values, names, resamples=resamples, confidence=confidence,
+            seed=seed, processes=processes)
+
+    report = {}
+    for j, descriptor in enumerate(descriptors):
+        column = {
+            'samples': n,
+            'mean': float(summary['mean'][j]),
+            'std_dev': float(summary['std_dev'][j]),
+            'skewness': float(summary['skewness'][j]),
+            'kurtosis': float(summary['kurtosis'][j]),
+            'median': float(np.median(values[:, j])),
+            'ci_mean': [float(t_lower[j]), float(t_upper[j])],
+            'quantiles': [[p, float(levels_at[i, j])]
+                          for i, p in enumerate(probabilities)],
+            'exceedance': [[level, float(exceeds[i, j]),
+                            [float(wilson_lower[i, j]),
+                             float(wilson_upper[i, j])]]
+                           for i, level in enumerate(levels)],
+            }
+        if resamples:
+            column['bootstrap'] = dict(
+                (name, {'ci': [float(boot_lower[i, j]),
+                               float(boot_upper[i, j])],
+                        'std_error': float(boot_error[i, j])})
+                for i, name in enumerate(names))
+        report[descriptor] = column
+    return report
+
+
+def tabular_statistics(dat_file, input_file=None, **kwds):
+    """Summarize every response column of a Dakota tabular file.
+
+    Keywords are passed to `describe`.
+
+    """
+    dat = read_dat_file(dat_file)
+    names = response_descriptors(dat_file, input_file=input_file)
+    return describe(dat.values(names), descriptors=names, **kwds)
+
+
+def store_statistics(store, study=None, responses=None, where=(), **kwds):
+    """Summarize responses read from a results store.
+
+    Parameters
+    ----------
+    store : ResultsStore
+      The store (see `agu2016.store`).
+    study : str, optional
+      The study whose evaluations to summarize (default is every
+      study's).
+    responses : list of str, optional
+      The response columns (default is the study's responses).
+    where : list, optional
+      Conditions the evaluations must meet, as for `ResultsStore.read`.
+
+    Keywords are passed to `describe`.
+
+    """
+    where = list(where)
+    if study is not None:
+        where.append(('study', '==', study))
+        if responses is None:
+            responses = store.studies[study]['responses']
+    if not responses:
+        raise ValueError('give the responses, or a study')
+    columns = store.read(responses, where=where)
+    values = np.column_stack([columns[name] for name in responses])
+    return describe(values, descriptors=responses, **kwds)
+
+
+def format_report(report):
+    """Format a summary from `describe` for the console."""
+    lines = []
+    for descriptor, column in report.items():
+        boot = column.get('bootstrap', {})
+
+        def interval(name, default=None):
+            bounds = boot.get(name, {}).get('ci', default)
+            if bounds is None:
+                return ''
+            return '  [{:.6g}, {:.6g}]'.format(*bounds)
+
+        lines += ['{} ({} samples)'.format(descriptor, column['samples']),
+                  '  mean      {:<12.6g}{}'.format(
+                      column['mean'], interval('mean', column['ci_mean'])),
+                  '  std_dev   {:<12.6g}{}'.format(
+                      column['std_dev'], interval('std_dev')),
+                  '  skewness  {:<12.6g}'.format(column['skewness']),
+                  '  kurtosis  {:<12.6g}'.format(column['kurtosis']),
+                  '  median    {:<12.6g}{}'.format(
+                      column['median'], interval('median'))]
+        for p, level in column['quantiles']:
+            lines.append('  q({:<5g})  {:<12.6g}{}'.format(
+                p, level, interval('quantile={!r}'.format(p))))
+        for level, p, wilson in column['exceedance']:
+            lines.append('  P(>{:g})  {:<12.6g}{}'.format(
+                level, p, interval('exceedance={!r}'.format(level),
+                                   wilson)))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compute the statistics of the responses of a study.')
+    parser.add_argument('dat_file', nargs='?', default=None,
+                        help='Dakota tabular data file')
+    parser.add_argument('--store', default=None,
+                        help='read the responses from a results store '
+                             'instead')
+    parser.add_argument('--study', default=None,
+                        help='the study in the store')
+    parser.add_argument('--responses', nargs='*', default=None,
+                        help='the responses in the store (default: the '
+                             "study's)")
+    parser.add_argument('--where', nargs='*', default=[],
+                        help="conditions on the evaluations in the store, "
+                             "e.g. 'max > 40'")
+    parser.add_argument('--levels', nargs='*', type=float, default=[],
+                        help='response levels of exceedance probabilities')
+    parser.add_argument('--probabilities', nargs='*', type=float,
+                        default=list(PROBABILITY_LEVELS),
+                        help='probability levels of quantiles')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='confidence level (default: 0.95)')
+    parser.add_argument('--bootstrap', type=int, default=0,
+                        metavar='RESAMPLES',
+                        help='bootstrap resamples (default: no bootstrap)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the bootstrap')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='processes that draw bootstrap resamples')
+    parser.add_argument('--json', action='store_true',
+                        help='print the statistics as JSON')
+    args = parser.parse_args()
+
+    kwds = dict(levels=args.levels, probabilities=args.probabilities,
+                confidence=args.confidence, resamples=args.bootstrap,
+                seed=args.seed, processes=args.processes)
+    if args.store:
+        report = store_statistics(ResultsStore(args.store), study=args.study,
+                                  responses=args.responses, where=args.where,
+                                  **kwds)
+    elif args.dat_file:
+        report = tabular_statistics(args.dat_file, **kwds)
+    else:
+        parser.error('give a tabular file or a store')
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_report(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,540 @@
+"""An append-only, columnar store of the evaluations of every study.
+
+The results of a study are otherwise spread over its `dakota.dat` and
+its ``run.N`` directories, so a question about every campaign, such as
+which evaluations had a starting temperature above 15 and a maximum
+concentration above 40, means parsing each of them. A `ResultsStore`
+keeps one row per evaluation of any study: the study, the evaluation
+id, the values of its variables and responses, the time of each phase
+of the evaluation (see `agu2016.monitor`), and its run directory. The
+store is a directory, usually shared by the studies::
+
+  <store>/manifest.json
+  <store>/chunk-000001.npz
+  <store>/chunk-000002.npz
+  ...
+
+Rows are appended in chunks, each a NumPy archive with an array per
+column, and never rewritten. The manifest lists the chunks, with the
+least and greatest value of each of their columns, and the variables
+and responses of each study. A read loads only the columns it asks
+for, and only from the chunks whose ranges of values can match its
+conditions, e.g.::
+
+  >>> store = ResultsStore('results')  # doctest: +SKIP
+  >>> rows = store.read(['study', 'channel_exit_water_sediment~'
+  ...                    'suspended__mass_concentration:max'],
+  ...                   where=['starting_mean_annual_temperature > 15'])
+  ... # doctest: +SKIP
+
+A study with a single response function names it by its descriptor
+alone, so the same column of two studies' tabular files may hold, say,
+the maximum concentration in one and a count of days above a threshold
+in the other. The responses of a study are stored, instead, under
+their labels as response functions (see `agu2016.responses`), such as
+``...concentration:max`` or ``...concentration:threshold_count=40``,
+with the statistics of the study's `dakota.yaml`.
+
+Chunks and the manifest are written to temporary names and renamed
+into place, under a lock, so that the experiments of several studies
+can append to the store at once. With the ``results_store`` option of
+an experiment, its finished evaluations are appended as it runs, at
+each progress report, and when it's done. The results of studies run
+earlier are added with::
+
+  $ python -m agu2016.store results --ingest hydrotrend-*-study
+
+"""
+import os
+import re
+import json
+import argparse
+import tempfile
+
+import numpy as np
+
+from .evaluations import list_run_directories, RESULTS_FILE
+from .locking import FileLock
+from .monitor import PHASES, read_timing
+from .params import read_params_file, read_results_file
+from .tabular import read_dat_file, response_descriptors
+
+
+MANIFEST_FILE = 'manifest.json'
+STUDY_CONFIG_FILE = 'dakota.yaml'
+LOCK_FILE = '.lock'
+STRING_COLUMNS = ('study', 'run_directory')
+TIMING_COLUMNS = tuple('time_' + name for name in PHASES) + (
+    'wall_time', 'peak_memory')
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+_CONDITION = re.compile(r'^\s*(.+?)\s*(<=|>=|==|!=|<|>)\s*(.+?)\s*$')
+
+
+def parse_condition(condition):
+    """Parse a condition on a column, like ``'max > 40'``.
+
+    Returns
+    -------
+    tuple
+      The column, operator and value, a float if it's a number.
+
+    Examples
+    --------
+    >>> parse_condition('study == hydrotrend-Cs-sampling-study')
+    ('study', '==', 'hydrotrend-Cs-sampling-study')
+    >>> parse_condition('starting_mean_annual_temperature>15')
+    ('starting_mean_annual_temperature', '>', 15.0)
+
+    """
+    if not isinstance(condition, str):
+        return tuple(condition)
+    match = _CONDITION.match(condition)
+    if match is None:
+        raise ValueError('not a condition: {}'.format(condition))
+    column, operator, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return column, operator, value
+
+
+def _as_column(name, values):
+    if name in STRING_COLUMNS:
+        return np.asarray(values, dtype=str)
+    return np.asarray(values, dtype=float)
+
+
+def _missing(name, rows):
+    if name in STRING_COLUMNS:
+        return np.full(rows, '', dtype=str)
+    return np.full(rows, np.nan)
+
+
+def zone_map(values):
+    """Get the least and greatest value of a column, for the manifest."""
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return None
+        return [float(values.min()), float(values.max())]
+    if len(values) == 0:
+        return None
+    values = np.sort(values)
+    return [str(values[0]), str(values[-1])]
+
+
+def may_match(zone, operator, value):
+    """Check whether a chunk may have rows that meet a condition.
+
+    Parameters
+    ----------
+    zone : list or None
+      The least and greatest value of the column in the chunk, or None
+      if it has no values.
+    operator : str
+      The comparison.
+    value : float or str
+      The value compared with.
+
+    """
+    if zone is None:
+        return operator == '!='
+    lower, upper = zone
+    if isinstance(value, str) != isinstance(lower, str):
+        return operator == '!='
+    return {
+        '<': lower < value,
+        '<=': lower <= value,
+        '>': upper > value,
+        '>=': upper >= value,
+        '==': lower <= value <= upper,
+        '!=': not lower == upper == value,
+    }[operator]
+
+
+class ResultsStore(object):
+
+    """An append-only, columnar store of evaluations.
+
+    Parameters
+    ----------
+    path : str
+      The directory of the store; it's created if needed.
+
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    @property
+    def manifest(self):
+        """The chunks of the store and the columns of each study."""
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), 'r') as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {'chunks': [], 'studies': {}}
+
+    def _write_manifest(self, manifest):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(manifest, fp, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST_FILE))
+
+    def __len__(self):
+        return sum(chunk['rows'] for chunk in self.manifest['chunks'])
+
+    @property
+    def columns(self):
+        """The names of the columns, in the order they were added."""
+        names = []
+        for chunk in self.manifest['chunks']:
+            names.extend(name for name in chunk['columns']
+                         if name not in names)
+        return names
+
+    @property
+    def studies(self):
+        """The studies in the store, with their variables and responses."""
+        return self.manifest['studies']
+
+    def append(self, columns, studies=None):
+        """Append a chunk of rows.
+
+        Parameters
+        ----------
+        columns : dict
+          The values of each column, with one value per row.
+        studies : dict, optional
+          The ``variables`` and ``responses`` of each study in the
+          chunk, recorded in the manifest.
+
+        Returns
+        -------
+        int
+          The number of rows appended.
+
+        """
+        columns = dict((name, _as_column(name, values))
+                       for name, values in columns.items())
+        lengths = set(len(values) for values in columns.values())
+        if len(lengths) > 1:
+            raise ValueError('columns have different lengths')
+        rows = lengths.pop() if lengths else 0
+        if rows == 0:
+            return 0
+
+        zones = dict((name, zone_map(values))
+                     for name, values in columns.items())
+        with FileLock(os.path.join(self.path, LOCK_FILE)):
+            manifest = self.manifest
+            name = 'chunk-{:06d}.npz'.format(len(manifest['chunks']) + 1)
+            fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fp:
+                np.savez(fp, **columns)
+            os.replace(tmp, os.path.join(self.path, name))
+
+            manifest['chunks'].append({'file': name, 'rows': rows,
+                                       'columns': zones})
+            for study, roles in (studies or {}).items():
+                manifest['studies'][study] = roles
+            self._write_manifest(manifest)
+        return rows
+
+    def read(self, columns=None, where=()):
+        """Read the rows that meet conditions.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+          The columns to read (default is every column).
+        where : list, optional
+          Conditions that rows must all meet, each a string like
+          ``'max > 40'`` or a ``(column, operator, value)`` tuple.
+
+        Returns
+        -------
+        dict
+          The values of each column, as arrays. Rows of chunks without
+          a column have NaN, or an empty string, for it.
+
+        """
+        conditions = [parse_condition(condition) for condition in where]
+        for _, operator, _ in conditions:
+            if operator not in OPERATORS:
+                raise ValueError('unknown operator: {}'.format(operator))
+        if columns is None:
+            columns = self.columns
+        columns = list(columns)
+
+        parts = dict((name, []) for name in columns)
+        for chunk in self.manifest['chunks']:
+            zones = chunk['columns']
+            if not all(may_match(zones.get(column), operator, value)
+                       for column, operator, value in conditions):
+                continue
+            with np.load(os.path.join(self.path, chunk['file'])) as data:
+                mask = np.ones(chunk['rows'], dtype=bool)
+                for column, operator, value in conditions:
+                    if column in zones:
+                        values = data[column]
+                    else:
+                        values = _missing(column, chunk['rows'])
+                    mask &= OPERATORS[operator](values, value)
+                if not mask.any():
+                    continue
+                for name in columns:
+                    if name in zones:
+                        values = data[name]
+                    else:
+                        values = _missing(name, chunk['rows'])
+                    parts[name].append(values[mask])
+
+        return dict((name, np.concatenate(parts[name]) if parts[name]
+                     else _missing(name, 0)) for name in columns)
+
+    def eval_ids(self, study):
+        """Get the evaluation ids of a study that are in the store."""
+        ids = self.read(['eval_id'], where=[('study', '==', study)])
+        return set(int(eval_id) for eval_id in ids['eval_id'])
+
+
+def evaluation_rows(run_directory, study, skip=(), timed=False):
+    """Gather the finished evaluations of a study from its run directories.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota was run.
+    study : str
+      The name of the study.
+    skip : set of int, optional
+      Evaluation ids to leave out, such as those already stored.
+    timed : bool, optional
+      If True, leave out evaluations that haven't written their timing
+      file yet, as while the study runs.
+
+    Returns
+    -------
+    tuple
+      The columns of the rows, as for `ResultsStore.append`, and the
+      variables and responses of the study.
+
+    """
+    rows, variables, responses = [], [], []
+    for eval_id, path in list_run_directories(run_directory):
+        results_file = os.path.join(path, RESULTS_FILE)
+        if eval_id in skip or not os.path.isfile(results_file):
+            continue
+        params = read_params_file(os.path.join(path, 'params.in'))
+        values = read_results_file(results_file)
+        row = {'study': study, 'eval_id': eval_id,
+               'run_directory': os.path.abspath(path)}
+        row.update(params['variables'])
+        row.update(zip(params['response_descriptors'], values))
+        timing = read_timing(path)
+        if timing is None and timed:
+            continue
+        if timing is not None:
+            for name in PHASES:
+                row['time_' + name] = timing['phases'].get(name, np.nan)
+            row['wall_time'] = (timing['finished'] - timing['started'] +
+                                timing['phases'].get('fork', 0.))
+            row['peak_memory'] = timing['peak_memory']
+        variables = list(params['variables'])
+        responses = params['response_descriptors']
+        rows.append(row)
+
+    names = ['study', 'eval_id', 'run_directory'] + variables + responses
+    names += [name for name in TIMING_COLUMNS
+              if any(name in row for row in rows)]
+    columns = dict((name, [row.get(name, np.nan) for row in rows])
+                   for name in names)
+    return columns, {'variables': variables, 'responses': responses}
+
+
+def tabular_rows(dat_file, study, responses=1, skip=()):
+    """Gather the evaluations of a study from its Dakota tabular file.
+
+    For studies whose evaluations have no run directories, such as
+    those with a vectorized driver.
+
+    Parameters
+    ----------
+    dat_file : str
+      The tabular file.
+    study : str
+      The name of the study.
+    responses : int, optional
+      The number of responses, the last columns of the file.
+    skip : set of int, optional
+      Evaluation ids to leave out.
+
+    """
+    dat = read_dat_file(dat_file)
+    keep = np.array([int(eval_id) not in skip for eval_id in dat.eval_ids],
+                    dtype=bool)
+    variables = dat.descriptors[:-responses]
+    columns = {'study': [study] * int(keep.sum()),
+               'eval_id': dat.eval_ids[keep],
+               'run_directory': [''] * int(keep.sum())}
+    for name in dat.descriptors:
+        columns[name] = dat[name][keep]
+    return columns, {'variables': variables,
+                     'responses': dat.descriptors[-responses:]}
+
+
+def response_labels(run_directory, responses,
+                    config_file=STUDY_CONFIG_FILE):
+    """Label the responses of a study with their statistics.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota was run.
+    responses : list of str
+      The Dakota response descriptors of the study.
+    config_file : str, optional
+      The Dakotathon configuration of the study, with its
+      ``response_statistics``.
+
+    Returns
+    -------
+    list of str
+      The response descriptors, with the statistic of each that's a
+      bare output variable appended, as ``<descriptor>:<statistic>``.
+      A ``threshold_count`` without a level is given the first of the
+      study's ``response_levels``.
+
+    """
+    # Import here, as only studies run with Dakotathon have a config.
+    import yaml
+
+    try:
+        with open(os.path.join(run_directory, config_file), 'r') as fp:
+            config = yaml.safe_load(fp) or {}
+    except (IOError, OSError):
+        return list(responses)
+    if not config.get('component'):
+        # Without a model, responses aren't statistics of its output.
+        return list(responses)
+    descriptors = config.get('response_descriptors') or []
+    statistics = config.get('response_statistics') or []
+    if isinstance(descriptors, str):
+        descriptors = [descriptors]
+    if isinstance(statistics, str):
+        statistics = [statistics]
+    levels = config.get('response_levels') or []
+    if not isinstance(levels, (list, tuple)):
+        levels = [levels]
+    statistics = dict(zip(descriptors, statistics))
+
+    labels = []
+    for name in responses:
+        statistic = statistics.get(name)
+        if ':' in name or not statistic:
+            labels.append(name)
+            continue
+        if statistic == 'threshold_count' and levels:
+            statistic = 'threshold_count={:g}'.format(float(levels[0]))
+        labels.append('{}:{}'.format(name, statistic))
+    return labels
+
+
+def ingest_study(store, run_directory, study=None, input_file='dakota.in',
+                 tabular_file='dakota.dat', timed=False):
+    """Append the evaluations of a study that aren't in a store yet.
+
+    The evaluations are read from the study's run directories or, if
+    it has none, from its tabular file once it's done. Their responses
+    are labelled with their statistics by `response_labels`.
+
+    Parameters
+    ----------
+    store : ResultsStore
+      The store.
+    run_directory : str
+      The directory where Dakota was run.
+    study : str, optional
+      The name of the study (default is the name of the run
+      directory).
+    input_file : str, optional
+      The Dakota input file, for the number of responses.
+    tabular_file : str, optional
+      The Dakota tabular file.
+    timed : bool, optional
+      If True, leave out evaluations that haven't written their timing
+      file yet, as while the study runs.
+
+    Returns
+    -------
+    int
+      The number of rows appended.
+
+    """
+    study = study or os.path.basename(os.path.abspath(run_directory))
+    skip = store.eval_ids(study)
+    if list_run_directories(run_directory):
+        columns, roles = evaluation_rows(run_directory, study, skip=skip,
+                                         timed=timed)
+    else:
+        # The tabular file is only complete when the study is done.
+        dat_file = os.path.join(run_directory, tabular_file)
+        if timed or not os.path.isfile(dat_file):
+            return 0
+        count = len(response_descriptors(
+            dat_file, os.path.join(run_directory, input_file)))
+        columns, roles = tabular_rows(dat_file, study, responses=count,
+                                      skip=skip)
+
+    labels = response_labels(run_directory, roles['responses'])
+    for name, label in zip(roles['responses'], labels):
+        columns[label] = columns.pop(name)
+    roles['responses'] = labels
+    return store.append(columns, studies={study: roles})
+
+
+def format_rows(columns):
+    """Format the rows read from a store as a table."""
+    names = list(columns)
+    lines = [' '.join('{:>14}'.format(name) for name in names)]
+    for row in zip(*[columns[name] for name in names]):
+        lines.append(' '.join(
+            '{:>14}'.format(value) if isinstance(value, str)
+            else '{:>14.6g}'.format(value) for value in row))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Query, or add studies to, a store of evaluations.')
+    parser.add_argument('store', help='the store directory')
+    parser.add_argument('--ingest', nargs='*', default=[],
+                        metavar='RUN_DIRECTORY',
+                        help='studies to add to the store')
+    parser.add_argument('--columns', nargs='*', default=None,
+                        help='columns to print (default: all)')
+    parser.add_argument('--where', nargs='*', default=[],
+                        help="conditions, e.g. 'max > 40'")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    for run_directory in args.ingest:
+        rows = ingest_study(store, run_directory)
+        print('{}: {} evaluations added'.format(run_directory, rows))
+    if not args.ingest or args.columns is not None or args.where:
+        print(format_rows(store.read(args.columns, where=args.where)))
+
+
+if __name__ == '__main__':
+    main()
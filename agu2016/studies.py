@@ -0,0 +1,177 @@
+"""Run several studies at once, sharing one pool of workers.
+
+Each study of the repository is a directory with a script that
+describes its experiment: the Dakotathon method, the model and the
+experiment dict, run one after another with `run_experiment`. The
+Cs, RI10 and RI25 campaigns, say, would then run back to back, each
+waiting on its own slowest evaluations. Here, a study is instead given
+declaratively, as a dict of:
+
+directory
+  The study directory, where the experiment is run, as its script is.
+method
+  The name of the Dakotathon method component, e.g. 'Sampling'.
+model
+  The name of the model component, e.g. 'Hydrotrend', if any.
+experiment
+  The experiment dict (see `agu2016.experiment`).
+
+`load_study` gets one from a study script. All of the studies are run
+at once, each in its own process, and the evaluations of every study
+are run by one `WorkerPool` (see `agu2016.workers`), so the
+evaluations of the studies interleave in the pool's queue as their
+Dakota runs ask for them, and the workers stay busy until the last
+study is done. Each study's Dakota run is otherwise its own, and writes
+its `dakota.dat` and `dakota.out` as if it had run alone.
+
+Example
+-------
+Run the Hydrotrend concentration studies on 16 workers with::
+
+  $ python -m agu2016.studies hydrotrend-Cs-sampling-study \\
+      hydrotrend-RI10-sampling-study hydrotrend-RI25-sampling-study \\
+      --processes 16
+
+"""
+import os
+import glob
+import time
+import argparse
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+
+from .models import load_component
+from .workers import WorkerPool, WORKERS_ENVIRON
+
+
+STUDY_SCRIPTS = '*study*.py'
+
+
+def find_study_script(directory):
+    """Find the script of a study directory."""
+    scripts = glob.glob(os.path.join(directory, STUDY_SCRIPTS))
+    if len(scripts) != 1:
+        raise ValueError('expected one study script in {}, found {}'.format(
+            directory, len(scripts)))
+    return scripts[0]
+
+
+def load_study(directory):
+    """Describe a study from its script, without running it.
+
+    The script is imported, so its method and model components are
+    created, but its experiment is run only when it's run as a script.
+
+    Parameters
+    ----------
+    directory : str
+      The study directory.
+
+    Returns
+    -------
+    dict
+      The study, as taken by `run_studies`.
+
+    """
+    script = find_study_script(directory)
+    spec = importlib.util.spec_from_file_location('_study', script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    model = getattr(module, 'model', None)
+    return {
+        'directory': os.path.abspath(directory),
+        'method': type(module.dakota).__name__,
+        'model': model and type(model).__name__,
+        'experiment': module.experiment,
+        }
+
+
+def _run_study(study):
+    # Import here, so loading a study doesn't need Dakotathon.
+    from .experiment import run_experiment
+
+    os.chdir(study['directory'])
+    experiment = dict(study['experiment'])
+    model = None
+    if study.get('model'):
+        model = load_component(study['model'])()
+        experiment.setdefault('workers', True)
+    run_experiment(load_component(study['method'])(), experiment,
+                   model=model)
+
+
+def run_studies(studies, processes=None, run_directory='.'):
+    """Run studies at once, with their evaluations in one pool.
+
+    Parameters
+    ----------
+    studies : list of dict
+      The studies, as described in the module docstring.
+    processes : int, optional
+      The number of evaluations to run at once, over all of the studies
+      (default is the number of cores).
+    run_directory : str, optional
+      The directory where the pool's workers file is written.
+
+    Returns
+    -------
+    dict
+      The wall time of each study, in seconds, by directory.
+
+    Raises
+    ------
+    RuntimeError
+      If any of the studies failed.
+
+    """
+    components = sorted(set(study['model'] for study in studies
+                            if study.get('model')))
+    elapsed, failed = {}, []
+    with WorkerPool(run_directory, processes=processes,
+                    components=components) as pool:
+        previous = os.environ.get(WORKERS_ENVIRON)
+        os.environ[WORKERS_ENVIRON] = pool.workers_file
+        try:
+            start = time.time()
+            running = {}
+            for study in studies:
+                process = multiprocessing.Process(target=_run_study,
+                                                  args=(study,))
+                process.start()
+                running[process.sentinel] = (process, study['directory'])
+            while running:
+                for sentinel in wait(list(running)):
+                    process, directory = running.pop(sentinel)
+                    process.join()
+                    elapsed[directory] = time.time() - start
+                    if process.exitcode != 0:
+                        failed.append(directory)
+        finally:
+            if previous is None:
+                del os.environ[WORKERS_ENVIRON]
+            else:
+                os.environ[WORKERS_ENVIRON] = previous
+    if failed:
+        raise RuntimeError('studies failed: {}'.format(', '.join(failed)))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run studies at once, '
+                                                 'sharing one worker pool.')
+    parser.add_argument('directories', nargs='+', help='study directories')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='evaluations to run at once (default: one per '
+                             'core)')
+    args = parser.parse_args()
+
+    studies = [load_study(directory) for directory in args.directories]
+    elapsed = run_studies(studies, processes=args.processes)
+    for directory in sorted(elapsed, key=elapsed.get):
+        print('{}: {:.1f} s'.format(os.path.relpath(directory),
+                                    elapsed[directory]))
+
+
+if __name__ == '__main__':
+    main()
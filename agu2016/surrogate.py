@@ -0,0 +1,303 @@
+"""Estimate threshold exceedance with a surrogate of the model.
+
+The Cs and RI studies estimate the probability that Cs exceeds a
+threshold, 40 kg/m^3 (Kettner et al., 2007), and the recurrence
+interval of such events. The tails of the response distribution need
+many 1000-year Hydrotrend runs to resolve by sampling the model. A
+surrogate run instead
+
+1. runs the model at a small Latin hypercube design;
+2. fits a polynomial chaos expansion, in Legendre polynomials of the
+   uniform variables, to the responses by least squares, as in the
+   Qs polynomial chaos study;
+3. evaluates the expansion at a million or more Monte Carlo samples,
+   vectorized, to estimate the exceedance probability of the response
+   level and, for threshold counts, the recurrence interval;
+4. refines the fit with model runs at samples whose predicted
+   response is nearest the level, where the estimate is most sensitive
+   to the surrogate's error, and repeats from 2.
+
+The model runs go through a batch scheduler (see `agu2016.batch`), and
+Dakota computes the statistics of the model runs with ``-post_run``.
+The surrogate estimates are written to `surrogate.json`.
+
+"""
+import os
+import json
+import itertools
+
+import numpy as np
+
+from .adaptive import latin_hypercube, uniform_variables
+from .batch import make_jobs, collect_results, post_run
+from .dakota_input import get_keyword_values, set_keyword_values
+from .tabular import write_tabular_file
+
+
+SURROGATE_FILE = 'surrogate.json'
+
+
+def total_degree_indices(dimensions, order):
+    """Get the multi-indices of a total-degree polynomial basis."""
+    return np.array([index for index in
+                     itertools.product(range(order + 1), repeat=dimensions)
+                     if sum(index) <= order])
+
+
+def legendre_basis(x, indices):
+    """Evaluate a basis of Legendre polynomial products.
+
+    Parameters
+    ----------
+    x : ndarray
+      Points in ``[-1, 1]^d``, with shape ``(n, d)``.
+    indices : ndarray
+      The multi-index of each basis function, with shape ``(m, d)``.
+
+    Returns
+    -------
+    ndarray
+      The basis functions at the points, with shape ``(n, m)``.
+
+    """
+    order = indices.max()
+    # Tabulate P_0..P_order of each variable with Bonnet's recursion.
+    table = np.empty((order + 1,) + x.shape)
+    table[0] = 1.
+    if order > 0:
+        table[1] = x
+    for k in range(1, order):
+        table[k + 1] = ((2 * k + 1) * x * table[k] -
+                        k * table[k - 1]) / (k + 1)
+
+    basis = np.ones((x.shape[0], len(indices)))
+    for j in range(x.shape[1]):
+        basis *= table[indices[:, j], :, j].T
+    return basis
+
+
+class PolynomialChaos(object):
+
+    """A polynomial chaos expansion of uniform variables.
+
+    Parameters
+    ----------
+    lower, upper : array_like
+      The bounds of the variables.
+    order : int, optional
+      The total degree of the expansion.
+
+    """
+
+    def __init__(self, lower, upper, order=3):
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        self.order = order
+        self.indices = total_degree_indices(len(self.lower), order)
+        self.coefficients = None
+        self.loo_error = None
+
+    def _scale(self, x):
+        x = np.asarray(x)
+        return 2. * (x - self.lower) / (self.upper - self.lower) - 1.
+
+    def fit(self, x, y):
+        """Fit the expansion to responses by least squares.
+
+        The leave-one-out error, relative to the variance of the
+        responses, is computed from the residuals and the leverages of
+        the fit, without refitting.
+
+        """
+        basis = legendre_basis(self._scale(x), self.indices)
+        if basis.shape[0] < basis.shape[1]:
+            raise ValueError('need at least {} runs to fit an order {} '
+                             'expansion'.format(basis.shape[1], self.order))
+        self.coefficients = np.linalg.lstsq(basis, y, rcond=None)[0]
+
+        q, _ = np.linalg.qr(basis)
+        leverage = np.minimum((q ** 2).sum(axis=1), 1. - 1e-12)
+        residuals = (y - basis.dot(self.coefficients)) / (1. - leverage)
+        self.loo_error = float(np.mean(residuals ** 2) / np.var(y)) \
+            if np.var(y) > 0 else 0.
+        return self
+
+    def predict(self, x, chunk_size=1 << 18):
+        """Evaluate the expansion at points, in chunks to bound memory."""
+        x = np.asarray(x, dtype=float)
+        y = np.empty(len(x))
+        for start in range(0, len(x), chunk_size):
+            chunk = self._scale(x[start:start + chunk_size])
+            y[start:start + chunk_size] = legendre_basis(
+                chunk, self.indices).dot(self.coefficients)
+        return y
+
+    def mean(self):
+        """The mean of the expansion, its constant coefficient."""
+        return float(self.coefficients[0])
+
+
+def exceedance(predictions, level):
+    """Estimate an exceedance probability and its standard error."""
+    p = float(np.mean(predictions > level))
+    return p, float(np.sqrt(p * (1. - p) / len(predictions)))
+
+
+def recurrence_interval(counts, run_duration):
+    """Get the median recurrence interval of threshold exceedances.
+
+    Parameters
+    ----------
+    counts : ndarray
+      The number of days the threshold is exceeded in each run.
+    run_duration : float
+      The length of a run, in years.
+
+    Returns
+    -------
+    float
+      The recurrence interval of the median run, in years, as in the
+      RI studies.
+
+    """
+    median = np.median(np.maximum(counts, 0.))
+    return (run_duration + 1.) / median if median > 0 else float('inf')
+
+
+def _run(input_path, descriptors, points, first_id, scheduler, run_directory):
+    eval_ids = np.arange(len(points)) + first_id
+    jobs = make_jobs(input_path, eval_ids, descriptors, points,
+                     run_directory=run_directory)
+    scheduler.run(jobs)
+    return collect_results(jobs)
+
+
+def run_surrogate(input_file, scheduler, run_directory='.',
+                  output_file='dakota.out', tabular_file='dakota.dat',
+                  initial_samples=30, order=3, surrogate_samples=1000000,
+                  refinements=2, refinement_samples=10, response=0,
+                  run_duration=None):
+    """Estimate threshold exceedance with a refined surrogate.
+
+    Parameters
+    ----------
+    input_file : str
+      The Dakota input file, relative to the run directory.
+    scheduler : LocalScheduler or QueueScheduler
+      The scheduler that runs the model.
+    run_directory : str, optional
+      The directory where Dakota is run.
+    output_file : str, optional
+      The Dakota output file with the statistics of the model runs.
+    tabular_file : str, optional
+      The tabular file of the model runs.
+    initial_samples : int, optional
+      The number of model runs in the initial design.
+    order : int, optional
+      The total degree of the polynomial chaos expansion.
+    surrogate_samples : int, optional
+      The number of samples of the surrogate.
+    refinements : int, optional
+      The number of refinement rounds.
+    refinement_samples : int, optional
+      The number of model runs in each refinement round.
+    response : int, optional
+      The index of the response function to estimate.
+    run_duration : float, optional
+      The run duration, in years, of a threshold count response, to
+      compute its recurrence interval.
+
+    Returns
+    -------
+    dict
+      The estimates of each round: the number of model runs, the
+      surrogate's mean and leave-one-out error, and the exceedance
+      probability of the first response level with its standard error
+      and, with a run duration, the recurrence interval.
+
+    """
+    input_path = os.path.join(run_directory, input_file)
+    levels = get_keyword_values(input_path, 'method', 'response_levels')
+    if not levels:
+        raise ValueError('a surrogate run needs a response level')
+    level = float(levels[0])
+    seed = get_keyword_values(input_path, 'method', 'seed')
+    rng = np.random.RandomState(int(seed[0]) if seed else None)
+    descriptors, lower, upper = uniform_variables(input_path)
+    dimensions = len(descriptors)
+
+    x = lower + latin_hypercube(int(initial_samples), dimensions, rng) * (
+        upper - lower)
+    y = _run(input_path, descriptors, x, 1, scheduler, run_directory)
+    samples = lower + rng.uniform(size=(int(surrogate_samples),
+                                        dimensions)) * (upper - lower)
+
+    rounds = []
+    for i in range(refinements + 1):
+        expansion = PolynomialChaos(lower, upper, order=order).fit(
+            x, y[:, response])
+        predictions = expansion.predict(samples)
+        p, error = exceedance(predictions, level)
+        estimate = {
+            'model_runs': len(x),
+            'mean': expansion.mean(),
+            'loo_error': expansion.loo_error,
+            'exceedance': p,
+            'exceedance_std_error': error,
+            }
+        if run_duration is not None:
+            estimate['recurrence_interval'] = recurrence_interval(
+                predictions, run_duration)
+        rounds.append(estimate)
+        if i == refinements:
+            break
+
+        # Run the model where the surrogate is nearest the level, spread
+        # over a band of candidates rather than clustered at one point.
+        band = np.argsort(np.abs(predictions - level))[
+            :10 * int(refinement_samples)]
+        picks = rng.choice(band, size=min(int(refinement_samples), len(band)),
+                           replace=False)
+        new_x = samples[picks]
+        new_y = _run(input_path, descriptors, new_x, len(x) + 1, scheduler,
+                     run_directory)
+        x, y = np.vstack([x, new_x]), np.vstack([y, new_y])
+
+    eval_ids = np.arange(len(x)) + 1
+    response_descriptors = get_keyword_values(input_path, 'responses',
+                                              'response_descriptors')
+    table = np.hstack([x, y])
+    set_keyword_values(input_path, 'method', 'samples', [len(x)],
+                       quote=False)
+    evaluations_file = 'evaluations.dat'
+    write_tabular_file(os.path.join(run_directory, evaluations_file),
+                       eval_ids, descriptors + response_descriptors, table)
+    post_run(input_file, evaluations_file, output_file=output_file,
+             run_directory=run_directory)
+    write_tabular_file(os.path.join(run_directory, tabular_file),
+                       eval_ids, descriptors + response_descriptors, table)
+
+    report = {
+        'response': response_descriptors[response],
+        'response_level': level,
+        'surrogate_samples': int(surrogate_samples),
+        'order': order,
+        'rounds': rounds,
+        }
+    with open(os.path.join(run_directory, SURROGATE_FILE), 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    return report
+
+
+def format_surrogate_report(report):
+    """Format the report of a surrogate run for the console."""
+    lines = ['P({response} > {response_level:g}) from {surrogate_samples} '
+             'surrogate samples:'.format(**report)]
+    for estimate in report['rounds']:
+        line = ('{model_runs:>6} model runs: P = {exceedance:.4g} '
+                '+/- {exceedance_std_error:.1g} '
+                '(LOO error {loo_error:.2g})').format(**estimate)
+        if 'recurrence_interval' in estimate:
+            line += ', RI = {:.3g} yr'.format(estimate['recurrence_interval'])
+        lines.append(line)
+    return '\n'.join(lines)
@@ -0,0 +1,261 @@
+"""Read and write Dakota tabular data files.
+
+Dakota writes the variables and responses of every evaluation to an
+annotated tabular data file, `dakota.dat`, with a header line of
+descriptors starting with ``%eval_id interface``, followed by one
+line per evaluation.
+
+"""
+import os
+
+import numpy as np
+
+from .dakota_input import get_keyword_values
+
+
+def read_tabular_header(tabular_file):
+    """Get the column names of a Dakota tabular data file."""
+    with open(tabular_file, 'r') as fp:
+        header = fp.readline()
+    if not header.startswith('%'):
+        raise ValueError('{}: not an annotated tabular file'.format(
+            tabular_file))
+    return header[1:].split()
+
+
+class TabularData(object):
+
+    """The columns of a Dakota tabular data file.
+
+    The table is held in a structured array, with a field for each
+    column named by its descriptor. The interface column is stored as
+    a categorical: each row holds an index into `interfaces`.
+
+    Parameters
+    ----------
+    data : ndarray
+      A structured array with the columns of the table.
+    interfaces : list of str, optional
+      The interface names indexed by the interface column.
+
+    """
+
+    def __init__(self, data, interfaces=()):
+        self.data = data
+        self.interfaces = list(interfaces)
+
+    @property
+    def names(self):
+        """The names of all of the columns."""
+        return list(self.data.dtype.names)
+
+    @property
+    def descriptors(self):
+        """The names of the variable and response columns."""
+        return [name for name in self.data.dtype.names
+                if name not in ('eval_id', 'interface')]
+
+    @property
+    def eval_ids(self):
+        if 'eval_id' in self.data.dtype.names:
+            return self.data['eval_id']
+        return np.arange(1, len(self) + 1)
+
+    def interface_names(self):
+        """Get the interface of each row, as an array of str."""
+        return np.array(self.interfaces)[self.data['interface']]
+
+    def values(self, names=None):
+        """Get columns as a 2-D float array, with one row per evaluation."""
+        names = names or self.descriptors
+        return np.column_stack([self.data[name] for name in names]).astype(
+            float, copy=False) if len(self) else np.empty((0, len(names)))
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _sidecar_file(tabular_file):
+    head, tail = os.path.split(tabular_file)
+    return os.path.join(head, '.' + tail + '.npz')
+
+
+def _source_stamp(tabular_file):
+    stat = os.stat(tabular_file)
+    return np.array([stat.st_size, stat.st_mtime])
+
+
+def _read_sidecar(tabular_file):
+    sidecar = _sidecar_file(tabular_file)
+    try:
+        with np.load(sidecar, allow_pickle=False) as npz:
+            if np.array_equal(npz['stamp'], _source_stamp(tabular_file)):
+                return TabularData(npz['data'], list(npz['interfaces']))
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+def _write_sidecar(tabular_file, table):
+    sidecar = _sidecar_file(tabular_file)
+    tmp = sidecar + '.tmp.npz'
+    try:
+        np.savez(tmp, data=table.data, stamp=_source_stamp(tabular_file),
+                 interfaces=np.array(table.interfaces, dtype=str))
+        os.rename(tmp, sidecar)
+    except (IOError, OSError):
+        pass
+
+
+def parse_tabular_file(tabular_file, names=None):
+    """Parse a Dakota tabular data file into a `TabularData` table.
+
+    The numeric columns, and then the interface column, are read by
+    NumPy's C text reader, so large tables, such as sample dumps from a
+    surrogate, are read quickly; mixing text and numbers in one pass of
+    the reader is several times slower.
+
+    Parameters
+    ----------
+    tabular_file : str
+      Path to the tabular file.
+    names : list of str, optional
+      Column names for a file without a header line.
+
+    Returns
+    -------
+    TabularData
+      The table.
+
+    """
+    if names is None:
+        names = read_tabular_header(tabular_file)
+        skiprows = 1
+    else:
+        skiprows = 0
+
+    fields = [(name, np.int32 if name == 'interface' else
+               np.int64 if name == 'eval_id' else np.float64)
+              for name in names]
+    numeric = [i for i, name in enumerate(names) if name != 'interface']
+    values = np.loadtxt(tabular_file, skiprows=skiprows, usecols=numeric,
+                        ndmin=2)
+
+    data = np.empty(len(values), dtype=fields)
+    for column, i in enumerate(numeric):
+        data[names[i]] = values[:, column]
+
+    interfaces = []
+    if 'interface' in names:
+        labels = np.loadtxt(tabular_file, skiprows=skiprows, dtype=str,
+                            usecols=[names.index('interface')], ndmin=1)
+        interfaces, data['interface'] = np.unique(labels, return_inverse=True)
+        interfaces = [str(name) for name in interfaces]
+    return TabularData(data, interfaces)
+
+
+def read_dat_file(dat_file, cache=True):
+    """Read a Dakota tabular data file, such as `dakota.dat`.
+
+    Parameters
+    ----------
+    dat_file : str
+      Path to the tabular file.
+    cache : bool, optional
+      If True, keep a binary copy of the parsed table next to the file,
+      `.<name>.npz`, and read it instead of parsing the text file when
+      the text file hasn't changed since.
+
+    Returns
+    -------
+    TabularData
+      The table.
+
+    Examples
+    --------
+    >>> dat = read_dat_file('dakota.dat')  # doctest: +SKIP
+    >>> T = dat['starting_mean_annual_temperature']  # doctest: +SKIP
+
+    """
+    if cache:
+        table = _read_sidecar(dat_file)
+        if table is not None:
+            return table
+    table = parse_tabular_file(dat_file)
+    if cache:
+        _write_sidecar(dat_file, table)
+    return table
+
+
+def response_descriptors(dat_file, input_file=None):
+    """Get the response columns of a Dakota tabular file.
+
+    The responses are the last columns of the file; their number is
+    read from the study's Dakota input file, `dakota.in` next to the
+    tabular file by default, or taken to be one.
+
+    """
+    descriptors = read_dat_file(dat_file).descriptors
+    if input_file is None:
+        input_file = os.path.join(os.path.dirname(dat_file), 'dakota.in')
+    count = 1
+    try:
+        values = get_keyword_values(input_file, 'responses',
+                                    'response_functions')
+        count = int(values[0]) if values else 1
+    except (IOError, OSError, KeyError):
+        pass
+    return descriptors[-count:]
+
+
+def read_samples(tabular_file):
+    """Read the evaluation ids and values from a Dakota tabular file.
+
+    Parameters
+    ----------
+    tabular_file : str
+      Path to an annotated tabular file, such as the output of
+      ``dakota -pre_run`` or `dakota.dat`.
+
+    Returns
+    -------
+    tuple
+      The evaluation ids (an array of int), the descriptors of the
+      numeric columns (a list of str) and their values (a 2-D array
+      with one row per evaluation).
+
+    """
+    table = parse_tabular_file(tabular_file)
+    return table.eval_ids, table.descriptors, table.values()
+
+
+def write_tabular_file(tabular_file, eval_ids, descriptors, values,
+                       interface='CSDMS'):
+    """Write an annotated Dakota tabular file.
+
+    Parameters
+    ----------
+    tabular_file : str
+      Path to the output file.
+    eval_ids : array_like of int
+      The evaluation ids.
+    descriptors : list of str
+      The names of the variables and responses.
+    values : array_like
+      The values of the variables and responses, with one row per
+      evaluation.
+    interface : str, optional
+      The interface id written to each row.
+
+    """
+    with open(tabular_file, 'w') as fp:
+        fp.write('%eval_id interface ')
+        fp.write(''.join(['{:>14} '.format(name) for name in descriptors]))
+        fp.write('\n')
+        for eval_id, row in zip(eval_ids, np.atleast_2d(values)):
+            fp.write('{:>8} {:>9} '.format(eval_id, interface))
+            fp.write(''.join(['{:>14.10g} '.format(value) for value in row]))
+            fp.write('\n')
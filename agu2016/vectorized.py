@@ -0,0 +1,128 @@
+"""Evaluate an experiment in process with a vectorized analysis driver.
+
+When the analysis driver is a cheap Python function, such as the
+Rosenbrock function of the vector parameter study, forking a process
+for every evaluation costs far more than the evaluation itself. A
+vectorized driver is instead a Python callable that takes the whole
+matrix of parameter points, one row per evaluation, as a NumPy array,
+and returns the responses of every point at once.
+
+Dakota writes the points of the method with ``-pre_run``, the driver
+evaluates them in this process, and Dakota reads them back with
+``-post_run`` to finish the method, as for a batch run (see
+`agu2016.batch`).
+
+A driver is given by name, for the drivers in `VECTORIZED_DRIVERS`, or
+as ``'module:function'``.
+
+"""
+import os
+import importlib
+
+import numpy as np
+
+from .batch import pre_run, post_run
+from .dakota_input import get_keyword_values
+from .tabular import write_tabular_file
+
+
+def rosenbrock(x):
+    """The Rosenbrock function of each row of a matrix of points.
+
+    Parameters
+    ----------
+    x : ndarray
+      The points, with shape ``(n, d)``.
+
+    Returns
+    -------
+    ndarray
+      The value of the function at each point.
+
+    Examples
+    --------
+    >>> rosenbrock(np.array([[-0.3, 0.2], [1., 1.]]))
+    array([2.9, 0. ])
+
+    """
+    x = np.asarray(x, dtype=float)
+    return (100. * (x[:, 1:] - x[:, :-1] ** 2) ** 2 +
+            (1. - x[:, :-1]) ** 2).sum(axis=1)
+
+
+VECTORIZED_DRIVERS = {
+    'rosenbrock': rosenbrock,
+}
+
+
+def get_vectorized_driver(spec):
+    """Get a vectorized driver by name or ``'module:function'`` path."""
+    if callable(spec):
+        return spec
+    if spec in VECTORIZED_DRIVERS:
+        return VECTORIZED_DRIVERS[spec]
+    module, _, name = spec.partition(':')
+    if not name:
+        raise ValueError('unknown vectorized driver: {}'.format(spec))
+    return getattr(importlib.import_module(module), name)
+
+
+def evaluate(driver, points, n_responses=1):
+    """Evaluate a vectorized driver at a matrix of points.
+
+    Returns
+    -------
+    ndarray
+      The responses, with one row per point.
+
+    """
+    responses = np.asarray(driver(np.asarray(points, dtype=float)),
+                           dtype=float)
+    responses = responses.reshape((len(points), -1))
+    if responses.shape[1] != n_responses:
+        raise ValueError('driver returned {} responses, expected {}'.format(
+            responses.shape[1], n_responses))
+    return responses
+
+
+def run_vectorized(input_file, driver, run_directory='.',
+                   output_file='dakota.out', tabular_file='dakota.dat'):
+    """Run a Dakota experiment with a vectorized driver.
+
+    Parameters
+    ----------
+    input_file : str
+      The Dakota input file, relative to the run directory.
+    driver : callable or str
+      The vectorized driver, or its name.
+    run_directory : str, optional
+      The directory where Dakota is run.
+    output_file : str, optional
+      The Dakota output file.
+    tabular_file : str, optional
+      The tabular file of points and responses.
+
+    Returns
+    -------
+    ndarray
+      The response values, with one row per evaluation.
+
+    """
+    eval_ids, descriptors, points = pre_run(input_file,
+                                            run_directory=run_directory)
+    input_path = os.path.join(run_directory, input_file)
+    response_descriptors = get_keyword_values(input_path, 'responses',
+                                              'response_descriptors')
+    responses = evaluate(get_vectorized_driver(driver), points,
+                         n_responses=len(response_descriptors))
+
+    descriptors = descriptors + response_descriptors
+    values = np.hstack([points, responses])
+    evaluations_file = 'evaluations.dat'
+    write_tabular_file(os.path.join(run_directory, evaluations_file),
+                       eval_ids, descriptors, values)
+    post_run(input_file, evaluations_file, output_file=output_file,
+             run_directory=run_directory)
+    write_tabular_file(os.path.join(run_directory, tabular_file),
+                       eval_ids, descriptors, values)
+    return responses
@@ -0,0 +1,395 @@
+"""Warm-start evaluations from a shared spin-up state.
+
+Every evaluation of a Hydrotrend study starts from year 0 with the same
+initial conditions and hypsometry, and differs only in its starting
+temperature and precipitation. With a warm start, an evaluation instead
+restores the state of the model after a spin-up period from a snapshot,
+and runs only the rest of its run duration. Snapshots are kept in a
+store, usually shared by the evaluations of a study:
+
+  <store>/index.json
+  <store>/<snapshot id>.pkl
+
+Each snapshot holds the model state at the end of the spin-up and the
+output series of the spin-up years, taken from a cold run at some
+point of the variables. An evaluation uses the snapshot nearest its own
+point, measured by the largest relative difference of the variables,
+if it's within ``max_distance`` (`MAX_DISTANCE` by default); otherwise
+it spins up cold and adds its own snapshot to the store. The output of
+the spin-up years of a warm-started evaluation is that of the
+snapshot's point, so its responses, such as a maximum over the whole
+run, include them. With a ``max_distance`` of None, any snapshot of the
+same model setup will do, so all evaluations share one spin-up.
+
+An evaluation started from another point's snapshot is an
+approximation of a cold run, so its output isn't added to the
+evaluation cache, and `validate_warm_start` compares the responses of
+warm-started evaluations against cold runs of the same points.
+
+The model component must be able to save and restore its state, with
+``get_state`` and ``set_state`` methods, which `check_component` checks
+before an experiment starts. Whether each evaluation was warm started,
+and from how far, is recorded in its `timing.json`, so that only warm
+started evaluations are validated.
+
+"""
+import os
+import json
+import time
+import pickle
+import random
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+from .evaluations import (list_run_directories, PARAMETERS_FILE,
+                          RESULTS_FILE)
+from .models import ModelRun, load_component
+from .monitor import read_timing
+from .params import read_params_file, read_results_file, write_params_file
+
+
+INDEX_FILE = 'index.json'
+VALIDATION_FILE = 'warm_start_validation.json'
+MAX_DISTANCE = 0.05
+TIME_UNITS_PER_YEAR = {'d': 365., 'day': 365., 'days': 365., 'y': 1.,
+                       'yr': 1., 'year': 1., 'years': 1.}
+
+
+def setup_digest(component, template_file, auxiliary_files, spinup_years):
+    """Compute a digest of the model setup that snapshots depend on."""
+    digest = hashlib.sha256('{} {}\n'.format(
+        component, spinup_years).encode('utf-8'))
+    for path in [template_file] + sorted(auxiliary_files):
+        with open(path, 'rb') as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+def check_component(component):
+    """Check that a model component can be warm started.
+
+    Parameters
+    ----------
+    component : str
+      The name of the component, as given to `load_component`.
+
+    Raises
+    ------
+    ValueError
+      If the component can't save or restore its state.
+
+    """
+    missing = [name for name in ('get_state', 'set_state')
+               if not hasattr(load_component(component), name)]
+    if missing:
+        raise ValueError('{} has no {} method, so it cannot be warm '
+                         'started'.format(component, ' or '.join(missing)))
+
+
+def relative_distance(a, b):
+    """The largest relative difference of the values of two points."""
+    return max(abs(a[name] - b[name]) / max(abs(b[name]), 1e-12)
+               for name in b)
+
+
+class SnapshotStore(object):
+
+    """A store of model states after spin-up.
+
+    Parameters
+    ----------
+    path : str
+      The directory of the store; it's created if needed.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def index(self):
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), 'r') as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return []
+
+    def nearest(self, setup, variables, max_distance=None):
+        """Find the snapshot nearest a point.
+
+        Returns
+        -------
+        tuple or None
+          The snapshot entry and its distance from the point, or None if
+          there's none for the setup within `max_distance`.
+
+        """
+        candidates = [(relative_distance(variables, entry['variables']),
+                       entry) for entry in self.index()
+                      if entry['setup'] == setup]
+        if not candidates:
+            return None
+        distance, entry = min(candidates, key=lambda item: item[0])
+        if max_distance is not None and distance > max_distance:
+            return None
+        return entry, distance
+
+    def load(self, entry):
+        with open(os.path.join(self.path, entry['file']), 'rb') as fp:
+            return pickle.load(fp)
+
+    def save(self, setup, variables, state, series):
+        """Add a snapshot to the store.
+
+        Parameters
+        ----------
+        setup : str
+          The digest of the model setup, from `setup_digest`.
+        variables : dict
+          The point the spin-up was run at.
+        state : object
+          The model state at the end of the spin-up.
+        series : dict
+          The output series of the spin-up.
+
+        """
+        snapshot_id = hashlib.sha256(json.dumps(
+            [setup, sorted(variables.items())]).encode('utf-8')).hexdigest()
+        name = snapshot_id + '.pkl'
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump({'state': state, 'series': series}, fp,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, os.path.join(self.path, name))
+
+        # Evaluations may add snapshots at the same time, so merge with
+        # the index on disk just before replacing it.
+        index = [entry for entry in self.index() if entry['file'] != name]
+        index.append({'file': name, 'setup': setup,
+                      'variables': dict(variables)})
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(index, fp, indent=2, sort_keys=True)
+        os.rename(tmp, os.path.join(self.path, INDEX_FILE))
+
+
+def spinup_time(run, spinup_years):
+    """Convert a spin-up period to the time units of a model."""
+    try:
+        return spinup_years * TIME_UNITS_PER_YEAR[run.time_units]
+    except KeyError:
+        raise ValueError('unknown time units: {}'.format(run.time_units))
+
+
+class WarmStart(object):
+
+    """Run a model from a spin-up snapshot.
+
+    Parameters
+    ----------
+    config : dict
+      The driver configuration, with its ``warm_start`` settings.
+    variables : dict
+      The variables of the evaluation.
+    names : list of str
+      The output variables to get.
+
+    Attributes
+    ----------
+    exact : bool
+      Whether the run spun up cold, from its own point, after `steps`
+      has been iterated.
+    distance : float
+      The distance to the point of the snapshot that was used.
+    details : dict
+      The ``exact`` and ``distance`` of the run, to record in its
+      timing file.
+
+    """
+
+    def __init__(self, config, variables, names):
+        settings = config['warm_start']
+        self.store = SnapshotStore(settings['store'])
+        self.spinup_years = settings['spinup_years']
+        self.max_distance = settings.get('max_distance', MAX_DISTANCE)
+        self.config = config
+        self.variables = dict(variables)
+        self.names = list(names)
+        self.exact = False
+        self.distance = None
+        run_directory = config['run_directory']
+        self.setup = setup_digest(
+            config['component'],
+            os.path.join(run_directory, config['template_file']),
+            [os.path.join(run_directory, name)
+             for name in config['auxiliary_files']], self.spinup_years)
+
+    def steps(self):
+        """Run the model, yielding output at each step.
+
+        The output of the spin-up years comes from the snapshot.
+
+        """
+        run = ModelRun(self.config['component'], self.config['config_file'],
+                       os.getcwd())
+        found = self.store.nearest(self.setup, self.variables,
+                                   max_distance=self.max_distance)
+        if found is None:
+            rows = list(run.steps(self.names,
+                                  until=spinup_time(run, self.spinup_years)))
+            series = dict((name, np.array([row[i] for row in rows]))
+                          for i, name in enumerate(self.names))
+            self.store.save(self.setup, self.variables, run.get_state(),
+                            series)
+            self.exact, self.distance = True, 0.
+        else:
+            entry, self.distance = found
+            snapshot = self.store.load(entry)
+            missing = set(self.names) - set(snapshot['series'])
+            if missing:
+                raise ValueError('snapshot has no series for {}'.format(
+                    ', '.join(sorted(missing))))
+            run.set_state(snapshot['state'])
+            self.exact = self.distance == 0.
+            columns = [snapshot['series'][name] for name in self.names]
+            rows = zip(*columns)
+
+        for row in rows:
+            yield list(row)
+        for row in run.steps(self.names):
+            yield row
+
+    @property
+    def details(self):
+        return {'exact': self.exact, 'distance': self.distance}
+
+
+def is_warm_started(eval_directory):
+    """Check whether an evaluation was started from another's snapshot."""
+    details = (read_timing(eval_directory) or {}).get('warm_start')
+    return bool(details) and not details['exact']
+
+
+def _cold_config(config_file, directory):
+    """Write a copy of a driver configuration for a cold, isolated run."""
+    with open(config_file, 'r') as fp:
+        config = json.load(fp)
+    config.update({'warm_start': None, 'evaluation_cache': None,
+                   'retention': None})
+    path = os.path.join(directory, 'driver.json')
+    with open(path, 'w') as fp:
+        json.dump(config, fp)
+    return path
+
+
+def validate_warm_start(run_directory, samples=5, seed=17):
+    """Compare warm-started evaluations with cold runs of their points.
+
+    A sample of the experiment's finished, warm started evaluations is
+    run again, cold, in temporary directories, and their responses are
+    compared. Evaluations that spun up cold, or restored a snapshot of
+    their own point, would match themselves, so they aren't sampled.
+
+    Parameters
+    ----------
+    run_directory : str
+      The directory where Dakota was run.
+    samples : int, optional
+      The number of evaluations to check.
+    seed : int, optional
+      The seed of the sample of evaluations.
+
+    Returns
+    -------
+    dict
+      For each response, the largest absolute and relative differences,
+      and for each evaluation checked, its responses, its cold
+      responses and the wall times of the warm and cold runs.
+
+    """
+    # Import here, as the driver imports this module.
+    from .driver import run_evaluation
+
+    finished = [(eval_id, path) for eval_id, path in
+                list_run_directories(run_directory)
+                if os.path.isfile(os.path.join(path, RESULTS_FILE)) and
+                is_warm_started(path)]
+    chosen = sorted(random.Random(seed).sample(finished,
+                                               min(samples, len(finished))))
+
+    evaluations = []
+    for eval_id, path in chosen:
+        params = read_params_file(os.path.join(path, PARAMETERS_FILE))
+        warm = read_results_file(os.path.join(path, RESULTS_FILE))
+        timing = read_timing(path)
+
+        directory = tempfile.mkdtemp(prefix='cold.{}.'.format(eval_id))
+        try:
+            config_file = _cold_config(params['analysis_components'][0],
+                                       directory)
+            write_params_file(os.path.join(directory, PARAMETERS_FILE),
+                              list(params['variables']),
+                              list(params['variables'].values()),
+                              params['response_descriptors'],
+                              analysis_components=[config_file],
+                              eval_id=eval_id)
+            cwd = os.getcwd()
+            start = time.time()
+            os.chdir(directory)
+            try:
+                run_evaluation(PARAMETERS_FILE, RESULTS_FILE)
+            finally:
+                os.chdir(cwd)
+            cold_time = time.time() - start
+            cold = read_results_file(os.path.join(directory, RESULTS_FILE))
+        finally:
+            shutil.rmtree(directory)
+
+        evaluations.append({
+            'eval_id': eval_id,
+            'variables': dict(params['variables']),
+            'warm': [float(value) for value in warm],
+            'cold': [float(value) for value in cold],
+            'warm_time': (timing['finished'] - timing['started']
+                          if timing else None),
+            'cold_time': cold_time,
+            })
+
+    responses = {}
+    if evaluations:
+        warm = np.array([evaluation['warm'] for evaluation in evaluations])
+        cold = np.array([evaluation['cold'] for evaluation in evaluations])
+        error = np.abs(warm - cold)
+        relative = error / np.maximum(np.abs(cold), 1e-12)
+        for i, name in enumerate(params['response_descriptors']):
+            responses[name] = {
+                'max_abs_error': float(error[:, i].max()),
+                'max_rel_error': float(relative[:, i].max()),
+                }
+
+    report = {'responses': responses, 'evaluations': evaluations}
+    with open(os.path.join(run_directory, VALIDATION_FILE), 'w') as fp:
+        json.dump(report, fp, indent=2, sort_keys=True)
+    return report
+
+
+def format_validation_report(report):
+    """Format a warm start validation report for the console."""
+    lines = ['Warm start vs cold start, {} evaluations:'.format(
+        len(report['evaluations']))]
+    for name, errors in sorted(report['responses'].items()):
+        lines.append('  {}: max abs error {:.4g}, max rel error '
+                     '{:.2%}'.format(name, errors['max_abs_error'],
+                                     errors['max_rel_error']))
+    times = [(evaluation['warm_time'], evaluation['cold_time'])
+             for evaluation in report['evaluations']
+             if evaluation['warm_time']]
+    if times:
+        warm, cold = np.sum(times, axis=0)
+        lines.append('  run time: warm {:.2f} s, cold {:.2f} s '
+                     '({:.1f}x)'.format(warm, cold, cold / warm))
+    return '\n'.join(lines)
@@ -0,0 +1,286 @@
+"""Run evaluations in a pool of long-lived, pre-warmed worker processes.
+
+Dakota forks the analysis driver for every evaluation, and each fork
+imports NumPy, SciPy and PyMT, and loads the Hydrotrend component,
+before the model takes its first step. For short runs, such as the
+10-year Qs studies, that start-up costs more than the model. With the
+``workers`` option of an experiment, a `WorkerPool` is started in the
+experiment's process instead: its worker processes import the driver
+and load the model component once, then run evaluation after
+evaluation. Dakota forks a thin client in its place::
+
+  $ python -m agu2016.workers params.in results.out
+
+which imports only the standard library, asks the pool to run the
+evaluation in its directory, and waits for it to finish. The pool
+listens on a local socket, or a named pipe on Windows, and its address
+and a random key that clients must know to connect are written, for
+the owner only, to `workers.json` in the experiment's run directory.
+
+A pool may also be shared by several studies run at once (see
+`agu2016.studies`): the path of its workers file is then given by the
+``AGU2016_WORKERS`` environment variable, which clients look at before
+the run directory.
+
+If no pool is running, or it can't be reached, as from the compute
+nodes of a batch queue, the client runs the evaluation itself, just as
+`agu2016.driver` would. If a worker dies while running an evaluation,
+say from a crash in the model library, the evaluations it took with it
+fail, and the pool starts new workers for the rest.
+
+"""
+import os
+import sys
+import json
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+from .params import read_params_file
+
+
+WORKERS_FILE = 'workers.json'
+WORKERS_ENVIRON = 'AGU2016_WORKERS'
+
+
+def client_command():
+    """Get the command Dakota uses to run the thin client."""
+    return '{} -m {}'.format(sys.executable, __name__)
+
+
+def _warm_up(components):
+    # Importing the driver imports everything an evaluation needs, and
+    # the first instance of a component loads its model library.
+    # A component that fails to load is left for the evaluations to
+    # report, rather than stopping the pool from starting.
+    from .models import load_component
+    from . import driver
+    for name in components:
+        try:
+            load_component(name)()
+        except Exception:
+            pass
+
+
+def _run_evaluation(directory, params_file, results_file):
+    from .driver import run_evaluation
+    try:
+        os.chdir(directory)
+        run_evaluation(params_file, results_file)
+    except (Exception, SystemExit):
+        return traceback.format_exc()
+    return None
+
+
+class WorkerPool(object):
+
+    """A pool of worker processes that run evaluations for clients.
+
+    Parameters
+    ----------
+    run_directory : str
+      The run directory of the experiment, where the pool's address is
+      written.
+    processes : int, optional
+      The number of evaluations to run at once (default is the number
+      of cores).
+    components : list of str, optional
+      The model components the workers load when they start.
+
+    """
+
+    def __init__(self, run_directory, processes=None, components=()):
+        self.run_directory = os.path.abspath(run_directory)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.components = list(components)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._listener = None
+        self._closing = False
+
+    @property
+    def workers_file(self):
+        return os.path.join(self.run_directory, WORKERS_FILE)
+
+    def _start_workers(self):
+        return ProcessPoolExecutor(self.processes, initializer=_warm_up,
+                                   initargs=(self.components,))
+
+    def start(self):
+        """Start the workers and listen for clients."""
+        self._pool = self._start_workers()
+        self._authkey = os.urandom(32)
+        self._listener = Listener(authkey=self._authkey)
+
+        if os.path.exists(self.workers_file):
+            os.remove(self.workers_file)
+        fd = os.open(self.workers_file,
+                     os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as fp:
+            json.dump({'address': self._listener.address,
+                       'authkey': self._authkey.hex(),
+                       'pid': os.getpid()}, fp)
+
+        thread = threading.Thread(target=self._serve)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def _serve(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                return
+            if self._closing:
+                connection.close()
+                return
+            thread = threading.Thread(target=self._handle,
+                                      args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, connection):
+        try:
+            directory, params_file, results_file = connection.recv()
+            connection.send(self._run(directory, params_file,
+                                      results_file))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _run(self, directory, params_file, results_file):
+        """Run an evaluation, returning its traceback if it failed."""
+        pool = self._pool
+        try:
+            return pool.submit(_run_evaluation, directory, params_file,
+                               results_file).result()
+        except BrokenProcessPool:
+            # A worker died, and the pool can't tell which of the
+            # evaluations it was running; fail them, rather than wait
+            # forever, and start new workers for the others.
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = self._start_workers()
+                    pool.shutdown(wait=False)
+            return ('a worker process died while running the evaluation '
+                    'in {}'.format(directory))
+
+    def close(self):
+        """Stop listening, and stop the workers."""
+        if self._listener is None:
+            return
+        try:
+            os.remove(self.workers_file)
+        except OSError:
+            pass
+        # Wake the thread waiting for a client, so that it stops.
+        self._closing = True
+        try:
+            Client(self._listener.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+        self._listener.close()
+        self._listener = None
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def shared_workers_file():
+    """Get the workers file of a pool shared by studies, if there is one."""
+    return os.environ.get(WORKERS_ENVIRON) or None
+
+
+def read_workers_file(path):
+    """Get the address and key of a pool from its workers file, if any."""
+    try:
+        with open(path, 'r') as fp:
+            workers = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+    address = workers['address']
+    if isinstance(address, list):
+        address = tuple(address)
+    return address, bytes.fromhex(workers['authkey'])
+
+
+def submit(address, authkey, directory, params_file, results_file):
+    """Have a pool run an evaluation, and wait for it to finish.
+
+    Returns
+    -------
+    str or None
+      The traceback of the evaluation, if it failed.
+
+    Raises
+    ------
+    OSError
+      If the pool can't be reached, or stops before the evaluation
+      finishes.
+
+    """
+    try:
+        connection = Client(address, authkey=authkey)
+    except AuthenticationError as error:
+        raise OSError(str(error))
+    try:
+        connection.send((directory, params_file, results_file))
+        return connection.recv()
+    except EOFError:
+        raise OSError('the worker pool stopped')
+    finally:
+        connection.close()
+
+
+def run_client(params_file, results_file):
+    """Run an evaluation in the current directory, in a pool if possible.
+
+    Parameters
+    ----------
+    params_file : str
+      The Dakota parameters file.
+    results_file : str
+      The results file to write.
+
+    """
+    params = read_params_file(params_file)
+    with open(params['analysis_components'][0], 'r') as fp:
+        run_directory = json.load(fp)['run_directory']
+
+    workers = read_workers_file(shared_workers_file() or
+                                os.path.join(run_directory, WORKERS_FILE))
+    if workers is not None:
+        try:
+            error = submit(workers[0], workers[1], os.getcwd(),
+                           params_file, results_file)
+        except OSError:
+            pass
+        else:
+            if error:
+                sys.exit(error)
+            return
+
+    from .driver import run_evaluation
+    run_evaluation(params_file, results_file)
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m {} params_file results_file'.format(
+            __name__))
+    run_client(sys.argv[1], sys.argv[2])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Compare ASCII and binary output of a 1000-year Hydrotrend run.
+
+A synthetic daily series is written for each output variable, both as
+ASCII files laid out like Hydrotrend's HYDRO_OUTPUT (a short header and
+one value per line) and as a single memory-mapped series file (see
+`agu2016.series`). The benchmark reports the time to write each format,
+the time to read a variable back and reduce it to its maximum, and the
+disk footprint.
+
+Example
+-------
+Run the benchmark with::
+
+  $ python benchmarks/bench_output_format.py --years 1000 --variables 4
+
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from agu2016.series import SeriesFile, SeriesWriter
+
+
+ASCII_HEADER = 3
+
+
+def synthetic_series(n_days, n_variables, seed=17):
+    """Make daily series with a seasonal cycle and lognormal noise."""
+    rng = np.random.RandomState(seed)
+    days = np.arange(n_days)
+    season = 1. + .5 * np.sin(2. * np.pi * days / 365.)
+    return season[:, np.newaxis] * rng.lognormal(2., 1., (n_days, n_variables))
+
+
+def write_ascii(directory, names, data):
+    for i, name in enumerate(names):
+        path = os.path.join(directory, 'HYDROASCII.{}'.format(name))
+        header = '\n'.join(['Hydrotrend ASCII output', name,
+                            '{} daily values'.format(len(data))])
+        np.savetxt(path, data[:, i], fmt='%14.6e', header=header,
+                   comments='')
+
+
+def read_ascii(directory, name):
+    path = os.path.join(directory, 'HYDROASCII.{}'.format(name))
+    return np.loadtxt(path, skiprows=ASCII_HEADER)
+
+
+def write_binary(directory, names, data):
+    with SeriesWriter(os.path.join(directory, 'hydrotrend.bin'),
+                      names) as writer:
+        for row in data.tolist():
+            writer.append(row)
+
+
+def read_binary(directory, name):
+    return SeriesFile(os.path.join(directory, 'hydrotrend.bin'))[name]
+
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for name in os.listdir(directory))
+
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        result = func(*args)
+        times.append(time.time() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--years', type=int, default=1000,
+                        help='length of the run (default: 1000)')
+    parser.add_argument('--variables', type=int, default=4,
+                        help='number of output variables (default: 4)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='best of this many reads (default: 3)')
+    args = parser.parse_args()
+
+    names = ['var{}'.format(i) for i in range(args.variables)]
+    data = synthetic_series(365 * args.years, args.variables)
+
+    print('{} years, {} variables, {} daily values each'.format(
+        args.years, args.variables, len(data)))
+    print('{:>8} {:>12} {:>16} {:>12}'.format(
+        'format', 'write [s]', 'read+max [s]', 'disk [MB]'))
+    for fmt, write, read in [('ascii', write_ascii, read_ascii),
+                             ('binary', write_binary, read_binary)]:
+        directory = tempfile.mkdtemp()
+        try:
+            write_time, _ = best_of(1, write, directory, names, data)
+            read_time, value = best_of(
+                args.repeat, lambda: read(directory, names[0]).max())
+            assert np.isclose(value, data[:, 0].max(), rtol=1e-6)
+            print('{:>8} {:>12.3f} {:>16.4f} {:>12.2f}'.format(
+                fmt, write_time, read_time, disk_usage(directory) / 1e6))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compare forked and vectorized evaluation of the Rosenbrock study.
+
+The points of a vector parameter study, from the study's initial point
+to its final point, are evaluated two ways: as Dakota's fork interface
+does, by writing a parameters file and running the analysis driver in
+a new process for each point, and in process, by passing the matrix of
+points to the vectorized driver (see `agu2016.vectorized`). The
+benchmark reports evaluations per second for each, and checks that
+they agree.
+
+Example
+-------
+Run the benchmark with::
+
+  $ python benchmarks/bench_rosenbrock.py --steps 100
+
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from agu2016.params import write_params_file, read_results_file
+from agu2016.vectorized import rosenbrock
+
+
+INITIAL_POINT = [-0.3, 0.2]
+FINAL_POINT = [1.1, 1.3]
+
+# A fork driver like the study's 'rosenbrock': read the parameters file,
+# evaluate one point, write the results file.
+FORK_DRIVER = """
+import sys
+import numpy as np
+from agu2016.params import read_params_file, write_results_file
+from agu2016.vectorized import rosenbrock
+params = read_params_file(sys.argv[1])
+x = np.array([list(params['variables'].values())])
+write_results_file(sys.argv[2], rosenbrock(x), params['response_descriptors'])
+"""
+
+
+def vector_path(initial_point, final_point, num_steps):
+    """Get the points of a vector parameter study."""
+    initial_point = np.asarray(initial_point, dtype=float)
+    step = (np.asarray(final_point, dtype=float) - initial_point) / num_steps
+    return initial_point + np.arange(num_steps + 1)[:, np.newaxis] * step
+
+
+def run_forked(points, directory):
+    package_root = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir)
+    env = dict(os.environ)
+    path = env.get('PYTHONPATH')
+    env['PYTHONPATH'] = (package_root + os.pathsep + path if path
+                         else package_root)
+    driver = os.path.join(directory, 'rosenbrock_driver.py')
+    with open(driver, 'w') as fp:
+        fp.write(FORK_DRIVER)
+
+    values = []
+    for eval_id, point in enumerate(points, start=1):
+        run_dir = os.path.join(directory, 'run.{}'.format(eval_id))
+        os.mkdir(run_dir)
+        write_params_file(os.path.join(run_dir, 'params.in'), ['x1', 'x2'],
+                          point, ['y1'], eval_id=eval_id)
+        subprocess.check_call([sys.executable, driver, 'params.in',
+                               'results.out'], cwd=run_dir, env=env)
+        values.append(read_results_file(os.path.join(run_dir,
+                                                     'results.out'))[0])
+    return np.array(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--steps', type=int, default=100,
+                        help='steps of the forked path (default: 100)')
+    parser.add_argument('--vectorized-steps', type=int, default=1000000,
+                        help='steps of the vectorized path '
+                             '(default: 1000000)')
+    args = parser.parse_args()
+
+    print('{:>12} {:>12} {:>12} {:>16}'.format(
+        'interface', 'points', 'time [s]', 'evaluations/s'))
+
+    points = vector_path(INITIAL_POINT, FINAL_POINT, args.steps)
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        forked = run_forked(points, directory)
+        fork_time = time.time() - start
+    finally:
+        shutil.rmtree(directory)
+    print('{:>12} {:>12} {:>12.3f} {:>16.1f}'.format(
+        'fork', len(points), fork_time, len(points) / fork_time))
+
+    assert np.allclose(forked, rosenbrock(points))
+
+    points = vector_path(INITIAL_POINT, FINAL_POINT, args.vectorized_steps)
+    start = time.time()
+    rosenbrock(points)
+    vector_time = time.time() - start
+    print('{:>12} {:>12} {:>12.3f} {:>16.1f}'.format(
+        'vectorized', len(points), vector_time, len(points) / vector_time))
+
+
+if __name__ == '__main__':
+    main()
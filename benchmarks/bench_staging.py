@@ -0,0 +1,122 @@
+"""Compare ways of staging the run directories of evaluations.
+
+A batch of evaluation directories is staged, as for a Hydrotrend study,
+with a rendered configuration file and an auxiliary file each: first
+one directory at a time, reading and formatting the template and
+copying the auxiliary file as the driver used to, then all at once
+with a compiled template and links to the shared, read-only inputs
+(see `agu2016.staging`). The benchmark reports directories staged per
+second. Run it in a directory on the file system of interest, such as
+the NAS that holds the studies, with ``--directory``.
+
+Example
+-------
+Run the benchmark with::
+
+  $ python benchmarks/bench_staging.py --evaluations 10000
+
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from agu2016.staging import share_inputs, stage_evaluations
+from hydrotrend_standin import write_template
+
+
+DESCRIPTORS = ['starting_mean_annual_temperature',
+               'total_annual_precipitation']
+
+
+def make_experiment(directory, hyps_size):
+    """Write a template and an auxiliary file, and a driver config."""
+    write_template(os.path.join(directory, 'HYDRO.IN.dtmpl'), 1000)
+    with open(os.path.join(directory, 'HYDRO0.HYPS'), 'wb') as fp:
+        fp.write(os.urandom(hyps_size))
+    return {
+        'run_directory': directory,
+        'template_file': 'HYDRO.IN.dtmpl',
+        'config_file': 'HYDRO.IN',
+        'auxiliary_files': ['HYDRO0.HYPS'],
+        'streaming_responses': False,
+        'output_format': 'ascii',
+        }
+
+
+def make_directories(directory, n, prefix):
+    directories = [os.path.join(directory, '{}.{}'.format(prefix, i))
+                   for i in range(1, n + 1)]
+    for path in directories:
+        os.mkdir(path)
+    return directories
+
+
+def stage_one_at_a_time(config, directories, points):
+    run_directory = config['run_directory']
+    for path, point in zip(directories, points):
+        with open(os.path.join(run_directory,
+                               config['template_file']), 'r') as fp:
+            template = fp.read()
+        text = template.format(**dict(zip(DESCRIPTORS, point)))
+        with open(os.path.join(path, config['config_file']), 'w') as fp:
+            fp.write(text)
+        for name in config['auxiliary_files']:
+            shutil.copy(os.path.join(run_directory, name), path)
+
+
+def stage_batch(config, directories, points, mode):
+    config = dict(config, staging=mode)
+    config['shared_inputs'] = share_inputs(config['run_directory'],
+                                           config['auxiliary_files'])
+    stage_evaluations(config, directories, DESCRIPTORS, points)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--evaluations', type=int, default=2000,
+                        help='directories to stage (default: 2000)')
+    parser.add_argument('--hyps-size', type=int, default=64 * 1024,
+                        help='size of the auxiliary file, in bytes '
+                             '(default: 65536)')
+    parser.add_argument('--directory', default=None,
+                        help='where to stage (default: a temporary '
+                             'directory)')
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(17)
+    points = np.column_stack([rng.uniform(12.8, 15.8, args.evaluations),
+                              rng.uniform(1.4, 1.8, args.evaluations)])
+
+    print('{:>20} {:>12} {:>12} {:>16}'.format(
+        'staging', 'directories', 'time [s]', 'directories/s'))
+    directory = tempfile.mkdtemp(dir=args.directory)
+    try:
+        config = make_experiment(directory, args.hyps_size)
+        for label, mode in [('one at a time, copy', None),
+                            ('batch, copy', 'copy'),
+                            ('batch, link', 'link')]:
+            directories = make_directories(directory, args.evaluations,
+                                           label.replace(', ', '-').replace(
+                                               ' ', '_'))
+            start = time.time()
+            if mode is None:
+                stage_one_at_a_time(config, directories, points)
+            else:
+                stage_batch(config, directories, points, mode)
+            elapsed = time.time() - start
+            print('{:>20} {:>12} {:>12.3f} {:>16.1f}'.format(
+                label, len(directories), elapsed,
+                len(directories) / elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
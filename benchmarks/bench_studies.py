@@ -0,0 +1,419 @@
+"""Benchmark shrunken versions of the studies end to end.
+
+Each study of the repository is run in a temporary directory at a size
+that takes seconds rather than hours: a few samples of short runs of a
+stand-in Hydrotrend (see `hydrotrend_standin.py`), so neither Dakota
+nor PyMT is needed. The study's points are chosen here as Dakota would
+choose them (a Latin hypercube, the quadrature points of a polynomial
+chaos expansion or a vector parameter path), and each evaluation is run
+by forking the analysis driver, as Dakota's fork interface does, in its
+own ``run.N`` directory. The benchmark records the time spent in each
+phase of a study:
+
+setup
+  Writing the model template and the driver configuration.
+fork, render, stage, model, responses
+  The phases of the evaluations, summed from each evaluation's
+  `timing.json` (see `agu2016.monitor`).
+evaluation
+  The wall time of running every evaluation.
+statistics
+  Computing the moments, confidence intervals and level mappings of
+  the responses, as Dakota would.
+plotting
+  Drawing the response histogram and samples, as `make_plots.py` does.
+
+with the peak memory of the evaluations and of the benchmark, and the
+disk used by the study's run directories. Results are written to
+``benchmarks/results/<label>.json``; compare a run with an earlier one
+to find regressions.
+
+Example
+-------
+Run the suite, and compare it with an earlier run::
+
+  $ python benchmarks/bench_studies.py --label baseline
+  $ python benchmarks/bench_studies.py \
+      --compare benchmarks/results/baseline.json
+
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+PACKAGE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                            os.pardir))
+sys.path.insert(0, PACKAGE_ROOT)
+from agu2016.adaptive import latin_hypercube
+from agu2016.driver import driver_command, write_driver_config
+from agu2016.monitor import (PHASES, peak_memory, read_timing,
+                             reset_peak_memory)
+from agu2016.params import write_params_file, read_results_file
+from agu2016.responses import response_functions
+from agu2016.retention import directory_size
+from agu2016.statistics import (PROBABILITY_LEVELS, exceedance, moments,
+                                quantiles, t_interval)
+from agu2016.vectorized import get_vectorized_driver
+from agu2016.workers import WorkerPool, client_command
+from benchmarks.hydrotrend_standin import (write_template, SEDIMENT_FLUX,
+                                           CONCENTRATION)
+
+
+STANDIN = 'benchmarks.hydrotrend_standin:Hydrotrend'
+RESULTS_DIR = os.path.join(PACKAGE_ROOT, 'benchmarks', 'results')
+
+STUDIES = {
+    'rosenbrock-vector-parameter-study': {
+        'design': 'vector',
+        'descriptors': ['x1', 'x2'],
+        'initial_point': [-0.3, 0.2],
+        'final_point': [1.1, 1.3],
+        'num_steps': 5,
+        'vectorized_driver': 'rosenbrock',
+        'response_descriptors': ['y1'],
+        },
+    'hydrotrend-Qs-sampling-study': {
+        'design': 'lhs',
+        'samples': 8,
+        'run_duration': 10,
+        'lower_bounds': [12.8, 1.4],
+        'upper_bounds': [15.8, 1.8],
+        'response_descriptors': SEDIMENT_FLUX,
+        'response_statistics': 'median',
+        'response_levels': [5.0],
+        },
+    'hydrotrend-Qs-polynomial-chaos-study': {
+        'design': 'quadrature',
+        'quadrature_order': 3,
+        'run_duration': 10,
+        'lower_bounds': [12.8, 1.4],
+        'upper_bounds': [15.8, 1.8],
+        'response_descriptors': SEDIMENT_FLUX,
+        'response_statistics': 'median',
+        'response_levels': [5.0],
+        },
+    'hydrotrend-Cs-sampling-study': {
+        'design': 'lhs',
+        'samples': 8,
+        'run_duration': 20,
+        'lower_bounds': [10., 1.],
+        'upper_bounds': [20., 2.],
+        'response_descriptors': CONCENTRATION,
+        'response_statistics': ['max', 'median', 'threshold_count=40'],
+        'response_levels': [40.0],
+        'streaming_responses': True,
+        'retention': {'keep_extreme': 2},
+        },
+    'hydrotrend-RI10-sampling-study': {
+        'design': 'lhs',
+        'samples': 8,
+        'run_duration': 20,
+        'lower_bounds': [12.8, 1.4],
+        'upper_bounds': [15.8, 1.8],
+        'response_descriptors': CONCENTRATION,
+        'response_statistics': ['threshold_count=40', 'max', 'median'],
+        'response_levels': [40.0],
+        'streaming_responses': True,
+        'retention': {'keep_extreme': 2},
+        },
+    'hydrotrend-RI25-sampling-study': {
+        'design': 'lhs',
+        'samples': 8,
+        'run_duration': 20,
+        'lower_bounds': [10., 1.],
+        'upper_bounds': [20., 2.],
+        'response_descriptors': CONCENTRATION,
+        'response_statistics': ['threshold_count=40', 'max', 'median'],
+        'response_levels': [40.0],
+        'streaming_responses': True,
+        'retention': {'keep_extreme': 2},
+        },
+    }
+HYDROTREND_DESCRIPTORS = ['starting_mean_annual_temperature',
+                          'total_annual_precipitation']
+
+
+def design_points(study, seed=17):
+    """Choose the points of a study as its Dakota method would."""
+    if study['design'] == 'vector':
+        initial = np.array(study['initial_point'])
+        step = (np.array(study['final_point']) - initial) / study['num_steps']
+        steps = np.arange(study['num_steps'] + 1)[:, np.newaxis]
+        return initial + steps * step
+
+    lower = np.array(study['lower_bounds'])
+    upper = np.array(study['upper_bounds'])
+    if study['design'] == 'lhs':
+        unit = latin_hypercube(study['samples'], len(lower),
+                               np.random.RandomState(seed))
+    else:
+        nodes, _ = np.polynomial.legendre.leggauss(study['quadrature_order'])
+        grid = np.meshgrid(*[nodes] * len(lower), indexing='ij')
+        unit = (np.column_stack([axis.ravel() for axis in grid]) + 1.) / 2.
+    return lower + unit * (upper - lower)
+
+
+def response_statistics(values, response_levels=()):
+    """Compute the statistics Dakota reports for a sampling study."""
+    summary = moments(values)
+    lower, upper = t_interval(values)
+    cdf = 1. - exceedance(values, response_levels)
+    return {
+        'mean': float(summary['mean']),
+        'std_dev': float(summary['std_dev']),
+        'ci_mean': [float(lower), float(upper)],
+        'response_levels': [[level, float(p)]
+                            for level, p in zip(response_levels, cdf)],
+        'probability_levels': [
+            [float(value), p] for value, p in zip(
+                quantiles(values, PROBABILITY_LEVELS), PROBABILITY_LEVELS)],
+        }
+
+
+def plot_responses(points, values, outfile):
+    """Plot the samples and the distribution of a response."""
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
+    ax1.scatter(points[:, 0], points[:, 1], c=values, s=15)
+    ax2.hist(values, bins=21, density=True)
+    fig.savefig(outfile, dpi=150)
+    plt.close(fig)
+
+
+def fork_evaluations(directory, driver_config, points, descriptors, labels,
+                     command=None):
+    """Run the driver for each point, as Dakota's fork interface does."""
+    env = dict(os.environ)
+    path = env.get('PYTHONPATH')
+    env['PYTHONPATH'] = (PACKAGE_ROOT + os.pathsep + path if path
+                         else PACKAGE_ROOT)
+    command = (command or driver_command()).split()
+
+    values = []
+    for eval_id, point in enumerate(points, start=1):
+        eval_directory = os.path.join(directory, 'run.{}'.format(eval_id))
+        os.mkdir(eval_directory)
+        write_params_file(os.path.join(eval_directory, 'params.in'),
+                          descriptors, point, labels,
+                          analysis_components=[driver_config],
+                          eval_id=eval_id)
+        subprocess.check_call(command + ['params.in', 'results.out'],
+                              cwd=eval_directory, env=env)
+        values.append(read_results_file(os.path.join(eval_directory,
+                                                     'results.out')))
+    return np.array(values)
+
+
+def run_study(study, directory, workers=0):
+    """Run a shrunken study, timing its phases.
+
+    With workers, the evaluations are run by a pool of that many worker
+    processes, which is started in the setup phase, and the driver is
+    forked as its thin client (see `agu2016.workers`).
+
+    Returns
+    -------
+    dict
+      The time of each phase, the number of evaluations, the peak
+      memory of the evaluations and of the benchmark, in bytes, the
+      disk used by the study, in bytes, and the response statistics.
+
+    """
+    phases = dict((name, 0.) for name in PHASES)
+    record = {'phases': phases}
+
+    start = time.time()
+    points = design_points(study)
+    if study['design'] == 'vector':
+        labels = study['response_descriptors']
+        phases['setup'] = time.time() - start
+
+        reset_peak_memory()
+        start = time.time()
+        driver = get_vectorized_driver(study['vectorized_driver'])
+        values = np.asarray(driver(points)).reshape((len(points), -1))
+        phases['evaluation'] = time.time() - start
+        record['evaluation_peak_memory'] = peak_memory()
+    else:
+        template_file = 'HYDRO.IN.dtmpl'
+        write_template(os.path.join(directory, template_file),
+                       study['run_duration'])
+        with open(os.path.join(directory, 'HYDRO0.HYPS'), 'w') as fp:
+            fp.write('stand-in hypsometry\n')
+        functions = response_functions(study['response_descriptors'],
+                                       study['response_statistics'],
+                                       study['response_levels'])
+        labels = [label for _, _, label in functions]
+        dakota_parameters = {
+            'component': STANDIN,
+            'template_file': template_file,
+            'auxiliary_files': ['HYDRO0.HYPS'],
+            'response_levels': study['response_levels'],
+            }
+        driver_config = write_driver_config(
+            directory, dakota_parameters,
+            {'run_duration': study['run_duration']}, study, functions)
+        pool = None
+        if workers:
+            pool = WorkerPool(directory, processes=workers,
+                              components=[STANDIN]).start()
+        phases['setup'] = time.time() - start
+
+        start = time.time()
+        try:
+            values = fork_evaluations(
+                directory, driver_config, points, HYDROTREND_DESCRIPTORS,
+                labels, command=client_command() if pool else None)
+        finally:
+            if pool is not None:
+                pool.close()
+        phases['evaluation'] = time.time() - start
+
+        timings = [read_timing(os.path.join(directory, 'run.{}'.format(i)))
+                   for i in range(1, len(points) + 1)]
+        for timing in timings:
+            for name in PHASES:
+                phases[name] += timing['phases'].get(name, 0.)
+        record['evaluation_peak_memory'] = max(timing['peak_memory']
+                                               for timing in timings)
+
+    start = time.time()
+    record['statistics'] = dict(
+        (label, response_statistics(values[:, i],
+                                    study.get('response_levels', ())))
+        for i, label in enumerate(labels))
+    phases['statistics'] = time.time() - start
+
+    start = time.time()
+    plot_responses(points, values[:, 0],
+                   os.path.join(directory, 'histogram.png'))
+    phases['plotting'] = time.time() - start
+
+    record['evaluations'] = len(points)
+    record['peak_memory'] = peak_memory()
+    record['disk_usage'] = directory_size(directory)
+    return record
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PACKAGE_ROOT,
+            stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline, tolerance=0.2, min_time=0.05):
+    """Find the phases that got slower than in a baseline run.
+
+    A phase has regressed if it took more than `tolerance` longer, as a
+    fraction, and at least `min_time` seconds longer than in the
+    baseline, so very short phases don't report noise.
+
+    Returns
+    -------
+    list of tuple
+      The study, phase, baseline time and new time of each regression.
+
+    """
+    regressions = []
+    for name, record in sorted(results['studies'].items()):
+        before = baseline['studies'].get(name)
+        if before is None:
+            continue
+        for phase, seconds in sorted(record['phases'].items()):
+            old = before['phases'].get(phase)
+            if (old is not None and seconds > old * (1. + tolerance) and
+                    seconds - old >= min_time):
+                regressions.append((name, phase, old, seconds))
+    return regressions
+
+
+def format_results(results):
+    columns = ['setup', 'evaluation', 'model', 'responses', 'statistics',
+               'plotting']
+    lines = ['{:<38}'.format('study') +
+             ''.join('{:>11}'.format(name) for name in columns) +
+             '{:>10}{:>10}'.format('mem [MB]', 'disk [MB]')]
+    for name, record in sorted(results['studies'].items()):
+        lines.append(
+            '{:<38}'.format(name) +
+            ''.join('{:>11.3f}'.format(record['phases'].get(phase, 0.))
+                    for phase in columns) +
+            '{:>10.1f}{:>10.2f}'.format(
+                record['evaluation_peak_memory'] / 1e6,
+                record['disk_usage'] / 1e6))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--studies', nargs='*', default=sorted(STUDIES),
+                        help='the studies to run (default: all)')
+    parser.add_argument('--label', default=None,
+                        help='name of the results file (default: the git '
+                             'revision, or the time)')
+    parser.add_argument('--compare', metavar='RESULTS_FILE',
+                        help='report regressions against earlier results')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='slowdown that counts as a regression '
+                             '(default: 0.2)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='run the evaluations in a pool of this many '
+                             'worker processes (default: fork the driver '
+                             'for each)')
+    args = parser.parse_args()
+
+    revision = git_revision()
+    results = {
+        'label': args.label or revision or time.strftime('%Y%m%d-%H%M%S'),
+        'revision': revision,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'workers': args.workers,
+        'studies': {},
+        }
+    for name in args.studies:
+        directory = tempfile.mkdtemp(prefix=name + '-')
+        try:
+            results['studies'][name] = run_study(STUDIES[name], directory,
+                                                 workers=args.workers)
+        finally:
+            shutil.rmtree(directory)
+    print(format_results(results))
+
+    if not os.path.isdir(RESULTS_DIR):
+        os.makedirs(RESULTS_DIR)
+    path = os.path.join(RESULTS_DIR, '{}.json'.format(results['label']))
+    with open(path, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+    print('Results written to {}'.format(path))
+
+    if args.compare:
+        with open(args.compare, 'r') as fp:
+            baseline = json.load(fp)
+        regressions = compare_results(results, baseline,
+                                      tolerance=args.tolerance)
+        for name, phase, old, new in regressions:
+            print('Regression: {} {}: {:.3f} s -> {:.3f} s'.format(
+                name, phase, old, new))
+        if regressions:
+            sys.exit(1)
+        print('No regressions against {}'.format(baseline['label']))
+
+
+if __name__ == '__main__':
+    main()
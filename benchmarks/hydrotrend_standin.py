@@ -0,0 +1,127 @@
+"""A stand-in for the Hydrotrend component, for benchmarks.
+
+The stand-in has the parts of the PyMT component interface used by
+`agu2016.models`, so the driver runs it just as it runs Hydrotrend,
+given the component ``'benchmarks.hydrotrend_standin:Hydrotrend'``. It
+produces daily discharge, suspended sediment flux and concentration
+from its starting mean annual temperature and total annual
+precipitation: rain fills a groundwater store that drains to the
+river, and sediment is rated on discharge. Its output is deterministic
+in its inputs, and it costs a little per day, so runs of a few decades
+stand in for Hydrotrend's 1000-year runs. Unlike Hydrotrend, its state
+can be saved and restored, for warm starts (see `agu2016.warmstart`).
+
+Its configuration file, rendered from `TEMPLATE` by the driver, has
+one ``name = value`` line per parameter.
+
+"""
+import os
+import hashlib
+
+import numpy as np
+
+
+TEMPLATE = """Hydrotrend stand-in configuration
+Write output to ASCII files: ON
+run_duration = {run_duration}
+starting_mean_annual_temperature = {{starting_mean_annual_temperature}}
+total_annual_precipitation = {{total_annual_precipitation}}
+"""
+
+DISCHARGE = 'channel_exit_water__volume_flow_rate'
+SEDIMENT_FLUX = 'channel_exit_water_sediment~suspended__mass_flow_rate'
+CONCENTRATION = 'channel_exit_water_sediment~suspended__mass_concentration'
+UNITS = {DISCHARGE: 'm^3 / s', SEDIMENT_FLUX: 'kg / s',
+         CONCENTRATION: 'kg / m^3'}
+
+DAYS_PER_YEAR = 365
+AREA = 2.2e9  # m^2, about the Waipaoa basin
+QUICKFLOW = 0.4  # the fraction of rain that runs off the same day
+DRAINAGE = 0.02  # the fraction of the groundwater store drained daily
+
+
+def write_template(path, run_duration):
+    """Write a model configuration template for a run duration, in years."""
+    with open(path, 'w') as fp:
+        fp.write(TEMPLATE.format(run_duration=run_duration))
+
+
+def read_config(config_file):
+    config = {}
+    with open(config_file, 'r') as fp:
+        for line in fp:
+            name, sep, value = line.partition('=')
+            if sep:
+                config[name.strip()] = float(value)
+    return config
+
+
+class Hydrotrend(object):
+
+    """A stand-in for the PyMT Hydrotrend component."""
+
+    def initialize(self, config_file, run_directory=None):
+        if run_directory is not None:
+            config_file = os.path.join(run_directory, config_file)
+        config = read_config(config_file)
+        self.temperature = config['starting_mean_annual_temperature']
+        self.precipitation = config['total_annual_precipitation']
+        self.end_time = config['run_duration'] * DAYS_PER_YEAR
+
+        seed = hashlib.sha256('{!r} {!r}'.format(
+            self.temperature, self.precipitation).encode('utf-8')).digest()
+        self.rng = np.random.RandomState(
+            np.frombuffer(seed[:4], dtype=np.uint32)[0])
+        self.time = 0.
+        self.storage = 0.
+        self.values = dict((name, 0.) for name in UNITS)
+
+    def update(self):
+        day = self.time % DAYS_PER_YEAR
+        season = 1. + .8 * np.sin(2. * np.pi * day / DAYS_PER_YEAR)
+        rain = (self.precipitation / DAYS_PER_YEAR * season *
+                self.rng.lognormal(0., 1.5))
+        baseflow = DRAINAGE * self.storage
+        self.storage += (1. - QUICKFLOW) * rain - baseflow
+        runoff = QUICKFLOW * rain + baseflow
+
+        discharge = runoff * AREA / 86400.
+        rating = .25 * np.exp(.1 * (self.temperature - 14.))
+        flux = rating * discharge ** 1.5
+        self.values[DISCHARGE] = discharge
+        self.values[SEDIMENT_FLUX] = flux
+        self.values[CONCENTRATION] = flux / discharge if discharge > 0 else 0.
+        self.time += 1.
+
+    def get_state(self):
+        return {'time': self.time, 'storage': self.storage,
+                'rng': self.rng.get_state()}
+
+    def set_state(self, state):
+        self.time = state['time']
+        self.storage = state['storage']
+        self.rng.set_state(state['rng'])
+
+    def get_value(self, name):
+        return np.array([self.values[name]])
+
+    def get_var_units(self, name):
+        return UNITS[name]
+
+    def get_output_var_names(self):
+        return tuple(sorted(UNITS))
+
+    def get_current_time(self):
+        return self.time
+
+    def get_end_time(self):
+        return self.end_time
+
+    def get_time_step(self):
+        return 1.
+
+    def get_time_units(self):
+        return 'd'
+
+    def finalize(self):
+        pass
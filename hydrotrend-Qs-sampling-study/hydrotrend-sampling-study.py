@@ -34,8 +34,12 @@ Notes
 
 """
 import os
+import sys
 from pymt.components import Sampling, Hydrotrend
-from dakotathon.utils import configure_parameters
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from agu2016.experiment import run_experiment
 
 
 model, dakota = Hydrotrend(), Sampling()
@@ -56,18 +60,8 @@ experiment = {
     'upper_bounds': [15.8, 1.8],
     'response_descriptors': 'channel_exit_water_sediment~suspended__mass_flow_rate',
     'response_statistics': 'median',
+    'evaluation_concurrency': 'auto',  # one evaluation per core
     }
-dakota_parameters, model_parameters = configure_parameters(experiment)
-
-dakota_parameters['run_directory'] = model.setup(os.getcwd(), **model_parameters)
-
-cfg_file = 'HYDRO.IN'  # get from pymt eventually
-dakota_tmpl_file = cfg_file + '.dtmpl'
-os.rename(cfg_file, dakota_tmpl_file)
-dakota_parameters['template_file'] = dakota_tmpl_file
-
-dakota.setup(dakota_parameters['run_directory'], **dakota_parameters)
 
-dakota.initialize('dakota.yaml')
-dakota.update()
-dakota.finalize()
+if __name__ == '__main__':
+    run_experiment(dakota, experiment, model=model)
@@ -35,8 +35,12 @@ Notes
 
 """
 import os
+import sys
 from pymt.components import Sampling, Hydrotrend
-from dakotathon.utils import configure_parameters
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from agu2016.experiment import run_experiment
 
 
 model, dakota = Hydrotrend(), Sampling()
@@ -59,19 +63,12 @@ experiment = {
     'lower_bounds': [10., 1.],
     'upper_bounds': [20., 2.],
     'response_descriptors': 'channel_exit_water_sediment~suspended__mass_concentration',
-    'response_statistics': 'threshold_count',
+    'response_statistics': ['threshold_count=40', 'max', 'median'],
+    'evaluation_concurrency': 'auto',  # one evaluation per core
+    'evaluation_cache': os.path.join(os.pardir, 'hydrotrend-cache'),
+    'streaming_responses': True,
+    'retention': {'keep_extreme': 5, 'compress': True, 'disk_budget': '1 GB'},
     }
-dakota_parameters, model_parameters = configure_parameters(experiment)
-
-dakota_parameters['run_directory'] = model.setup(os.getcwd(), **model_parameters)
-
-cfg_file = 'HYDRO.IN'  # get from pymt eventually
-dakota_tmpl_file = cfg_file + '.dtmpl'
-os.rename(cfg_file, dakota_tmpl_file)
-dakota_parameters['template_file'] = dakota_tmpl_file
-
-dakota.setup(dakota_parameters['run_directory'], **dakota_parameters)
 
-dakota.initialize('dakota.yaml')
-dakota.update()
-dakota.finalize()
+if __name__ == '__main__':
+    run_experiment(dakota, experiment, model=model)
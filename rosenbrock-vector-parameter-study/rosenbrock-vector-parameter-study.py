@@ -1,5 +1,10 @@
+import os
+import sys
 from pymt.components import VectorParameterStudy
-from dakotathon.utils import configure_parameters
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from agu2016.experiment import run_experiment
 
 
 dakota = VectorParameterStudy()
@@ -10,11 +15,9 @@ experiment = {
     'descriptors': ['x1', 'x2'],
     'initial_point': [-0.3, 0.2],
     'final_point': [1.1, 1.3],
-    'response_descriptors': 'y1'}
-
-dakota_parameters, _ = configure_parameters(experiment)
-dakota.setup('.', **dakota_parameters)
+    'response_descriptors': 'y1',
+    'vectorized_driver': 'rosenbrock',  # evaluate the path in process
+    }
 
-dakota.initialize('dakota.yaml')
-dakota.update()
-dakota.finalize()
+if __name__ == '__main__':
+    run_experiment(dakota, experiment)